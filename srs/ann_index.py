@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/ann_index.py
+
+Selectable nearest-neighbour backends for the dense retrievers
+(inner product over L2-normalized embeddings, i.e. cosine):
+
+  flat   exact search; NumPy matrix product (no faiss needed)
+  hnsw   faiss.IndexHNSWFlat    (--hnsw-m, --hnsw-ef-construction, --hnsw-ef-search)
+  ivfpq  faiss.IndexIVFPQ       (--ivf-nlist, --ivf-nprobe, --pq-m, --pq-nbits)
+  int8   per-dimension scalar-quantized int8 codes (4x smaller than float32)
+  binary sign bits packed 8 per byte (32x smaller)
+
+int8 / binary are pure NumPy: the first pass scores the float query
+against the compact codes, then the top --rescore-n candidates are
+rescored exactly against the float matrix. With the embedding store that
+matrix is the store's memory-mapped embs.npy, addressed through a row
+mapping (the store may hold other corpora, another order, or float16), so
+only the codes stay resident and candidate rows are read on demand.
+
+Built faiss indexes are persisted under --index-dir as
+  <index-dir>/<model-slug>__<kind>__<params-hash>.faiss  (+ .json meta)
+and reused while the embedding matrix fingerprint matches.
+
+Benchmark (recall@k vs flat and its delta, first-pass recall of the
+quantized backends, p50/p95 single-query latency, index memory):
+
+  python srs/ann_index.py \
+    --passages data/passages_full.jsonl \
+    --test-json outputs/final_dataset/DPEL/test.jsonl \
+    --model e5 \
+    --indexes flat,hnsw,ivfpq,int8,binary \
+    --k 10 \
+    --out-json outputs/rag/ann_bench_e5.json
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq", "int8", "binary")
+FAISS_TYPES = ("hnsw", "ivfpq")
+QUANTIZED_TYPES = ("int8", "binary")
+DEFAULT_INDEX_DIR = "indexes/ann"
+
+
+def _faiss():
+    try:
+        import faiss
+    except ImportError as e:
+        raise ImportError(
+            "faiss is required for --index hnsw/ivfpq. Run `pip install faiss-cpu` or use --index flat."
+        ) from e
+    return faiss
+
+
+def default_params() -> Dict[str, Any]:
+    return {
+        "hnsw_m": 32,
+        "hnsw_ef_construction": 200,
+        "hnsw_ef_search": 128,
+        "ivf_nlist": 0,      # 0 = 4 * sqrt(N)
+        "ivf_nprobe": 16,
+        "pq_m": 0,           # 0 = dim / 8 (rounded down to a divisor of dim)
+        "pq_nbits": 8,
+        "rescore_n": 100,    # int8 / binary: candidates rescored with float vectors
+    }
+
+
+def add_index_args(ap) -> None:
+    """Add --index and its build/search parameters to an argparse parser."""
+    d = default_params()
+    ap.add_argument("--index", choices=INDEX_TYPES, default="flat",
+                    help="Dense index backend: flat (exact) | hnsw | ivfpq | int8 | binary (default: flat).")
+    ap.add_argument("--index-dir", default=DEFAULT_INDEX_DIR,
+                    help=f"Where built hnsw/ivfpq indexes are persisted (default: {DEFAULT_INDEX_DIR}).")
+    ap.add_argument("--hnsw-m", type=int, default=d["hnsw_m"], help="HNSW graph degree M.")
+    ap.add_argument("--hnsw-ef-construction", type=int, default=d["hnsw_ef_construction"])
+    ap.add_argument("--hnsw-ef-search", type=int, default=d["hnsw_ef_search"])
+    ap.add_argument("--ivf-nlist", type=int, default=d["ivf_nlist"], help="IVF lists (0 = 4*sqrt(N)).")
+    ap.add_argument("--ivf-nprobe", type=int, default=d["ivf_nprobe"], help="IVF lists probed per query.")
+    ap.add_argument("--pq-m", type=int, default=d["pq_m"], help="PQ sub-quantizers (0 = dim/8).")
+    ap.add_argument("--pq-nbits", type=int, default=d["pq_nbits"], help="Bits per PQ code.")
+    ap.add_argument("--rescore-n", type=int, default=d["rescore_n"],
+                    help="int8/binary: first-pass candidates rescored exactly (0 = no rescoring).")
+
+
+def index_params_from_args(args) -> Dict[str, Any]:
+    return {
+        "hnsw_m": args.hnsw_m,
+        "hnsw_ef_construction": args.hnsw_ef_construction,
+        "hnsw_ef_search": args.hnsw_ef_search,
+        "ivf_nlist": args.ivf_nlist,
+        "ivf_nprobe": args.ivf_nprobe,
+        "pq_m": args.pq_m,
+        "pq_nbits": args.pq_nbits,
+        "rescore_n": args.rescore_n,
+    }
+
+
+def build_params(kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """The subset of params that changes the built index (search-time knobs excluded)."""
+    if kind == "hnsw":
+        return {"m": params["hnsw_m"], "ef_construction": params["hnsw_ef_construction"]}
+    if kind == "ivfpq":
+        return {"nlist": params["ivf_nlist"], "pq_m": params["pq_m"], "pq_nbits": params["pq_nbits"]}
+    if kind in QUANTIZED_TYPES:
+        return {"rescore_n": params["rescore_n"]}
+    return {}
+
+
+def matrix_fingerprint(embs: np.ndarray) -> str:
+    h = hashlib.sha256()
+    h.update(f"{embs.shape}".encode("utf-8"))
+    # Hash in row blocks so a memmap is never copied whole
+    for start in range(0, embs.shape[0], 65536):
+        h.update(np.ascontiguousarray(embs[start : start + 65536], dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+
+def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise top-k (scores, columns) of a (Q, N) matrix, best first."""
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+
+def _row_block(embs: np.ndarray, rows: Optional[np.ndarray], start: int, block: int) -> np.ndarray:
+    """float32 rows start..start+block of `embs`, or of embs[rows] without gathering it whole."""
+    if rows is None:
+        return np.asarray(embs[start : start + block], dtype=np.float32)
+    return np.asarray(embs[rows[start : start + block]], dtype=np.float32)
+
+
+def quantize_int8(
+    embs: np.ndarray, block: int = 65536, rows: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-dimension int8 codes and float32 scales (x ~= codes * scales)."""
+    n = embs.shape[0] if rows is None else len(rows)
+    max_abs = np.zeros(embs.shape[1], dtype=np.float32)
+    for start in range(0, n, block):
+        np.maximum(max_abs, np.abs(_row_block(embs, rows, start, block)).max(axis=0), out=max_abs)
+    scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    codes = np.empty((n, embs.shape[1]), dtype=np.int8)
+    for start in range(0, n, block):
+        x = _row_block(embs, rows, start, block) / scales
+        codes[start : start + block] = np.clip(np.rint(x), -127, 127)
+    return codes, scales
+
+
+def quantize_binary(embs: np.ndarray, block: int = 65536, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """Sign bits packed 8 per byte: (N, ceil(dim / 8)) uint8."""
+    n = embs.shape[0] if rows is None else len(rows)
+    codes = np.empty((n, (embs.shape[1] + 7) // 8), dtype=np.uint8)
+    for start in range(0, n, block):
+        codes[start : start + block] = np.packbits(_row_block(embs, rows, start, block) > 0, axis=1)
+    return codes
+
+
+class DenseIndex:
+    """
+    Inner-product top-k index over a (N, dim) float32 matrix.
+
+    search() returns (scores, rows) arrays of shape (Q, k); rows are -1 where
+    an approximate index found fewer than k neighbours.
+
+    `rows` (optional) maps index positions to rows of `embs`: position i is
+    embs[rows[i]]. For int8 / binary, `embs` and `rows` are kept by reference
+    (not copied) and only the rescored candidates are gathered, so pass the
+    embedding store's memmap and EmbeddingStore.get_rows() to keep the float
+    matrix off-heap. flat / hnsw / ivfpq gather embs[rows] into float32 once.
+    """
+
+    def __init__(
+        self,
+        embs: np.ndarray,
+        kind: str = "flat",
+        params: Optional[Dict[str, Any]] = None,
+        rows: Optional[np.ndarray] = None,
+    ):
+        if kind not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {kind} (choose from {INDEX_TYPES})")
+        self.kind = kind
+        self.params = {**default_params(), **(params or {})}
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            if kind not in QUANTIZED_TYPES:
+                embs, rows = gather_rows(embs, rows), None
+        self.n = int(embs.shape[0] if rows is None else len(rows))
+        self.dim = int(embs.shape[1])
+        self.embs = embs if kind == "flat" or kind in QUANTIZED_TYPES else None
+        self.rows = rows
+        self.index = None
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        if kind in FAISS_TYPES:
+            self.index = self._build(np.ascontiguousarray(embs, dtype=np.float32))
+            self._set_search_params()
+        elif kind in QUANTIZED_TYPES:
+            if self.params["rescore_n"] and not isinstance(embs, np.memmap):
+                print(f"[ann] warning: {kind} rescoring keeps the {embs.nbytes / 2**20:.0f} MB float matrix "
+                      f"in memory next to the codes; use the embedding store or --rescore-n 0 to avoid it")
+            t0 = time.time()
+            if kind == "int8":
+                self.codes, self.scales = quantize_int8(embs, rows=rows)
+            else:
+                self.codes = quantize_binary(embs, rows=rows)
+            print(f"[ann] quantized {self.n} vectors to {kind} in {time.time() - t0:.1f}s")
+
+    # ------------------------------------------------------------------
+    # Build
+    # ------------------------------------------------------------------
+    def _build(self, x: np.ndarray):
+        faiss = _faiss()
+        p = self.params
+        t0 = time.time()
+        if self.kind == "hnsw":
+            index = faiss.IndexHNSWFlat(self.dim, p["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = p["hnsw_ef_construction"]
+            index.add(x)
+        else:
+            nlist = p["ivf_nlist"] or int(4 * math.sqrt(self.n))
+            # k-means wants ~39 training points per centroid
+            nlist = max(1, min(nlist, self.n // 39 or 1))
+            pq_m = p["pq_m"] or max(1, self.dim // 8)
+            while self.dim % pq_m:
+                pq_m -= 1
+            # PQ codebooks need at least 2**nbits training points
+            nbits = max(1, min(p["pq_nbits"], int(math.log2(max(2, self.n)))))
+            quantizer = faiss.IndexFlatIP(self.dim)
+            index = faiss.IndexIVFPQ(quantizer, self.dim, nlist, pq_m, nbits, faiss.METRIC_INNER_PRODUCT)
+            index.train(x)
+            index.add(x)
+            self.params.update({"ivf_nlist": nlist, "pq_m": pq_m, "pq_nbits": nbits})
+        print(f"[ann] built {self.kind} index over {self.n} vectors in {time.time() - t0:.1f}s")
+        return index
+
+    def _set_search_params(self) -> None:
+        if self.kind == "hnsw":
+            self.index.hnsw.efSearch = self.params["hnsw_ef_search"]
+        elif self.kind == "ivfpq":
+            self.index.nprobe = self.params["ivf_nprobe"]
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+    def search(self, q_embs: np.ndarray, k: int, chunk_size: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, self.n)
+        q_embs = np.ascontiguousarray(q_embs, dtype=np.float32)
+        if k <= 0 or len(q_embs) == 0:
+            k = max(k, 0)
+            return np.zeros((len(q_embs), k), np.float32), np.zeros((len(q_embs), k), np.int64)
+        if self.index is not None:
+            scores, rows = self.index.search(q_embs, k)
+            return scores, rows.astype(np.int64, copy=False)
+        if self.codes is not None:
+            return self._search_quantized(q_embs, k, self.params["rescore_n"], chunk_size)
+
+        # Exact: chunked (chunk, dim) x (dim, N) products so the score
+        # matrix never exceeds chunk_size x N.
+        all_scores, all_rows = [], []
+        for start in range(0, len(q_embs), chunk_size):
+            top_scores, top = _top_k(q_embs[start : start + chunk_size] @ self.embs.T, k)
+            all_rows.append(top)
+            all_scores.append(top_scores)
+        return np.vstack(all_scores), np.vstack(all_rows)
+
+    def _code_scores(self, q: np.ndarray, block: int = 16384) -> np.ndarray:
+        """(Q, N) first-pass scores of float queries against the codes."""
+        out = np.empty((len(q), self.n), dtype=np.float32)
+        # int8: fold the per-dimension scales into the query once
+        qs = q * self.scales if self.kind == "int8" else q
+        for start in range(0, self.n, block):
+            codes = self.codes[start : start + block]
+            if self.kind == "int8":
+                vecs = codes.astype(np.float32)
+            else:
+                vecs = np.unpackbits(codes, axis=1, count=self.dim).astype(np.float32) * 2.0 - 1.0
+            out[:, start : start + block] = qs @ vecs.T
+        return out
+
+    def _search_quantized(
+        self, q_embs: np.ndarray, k: int, rescore_n: int, chunk_size: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        n_cand = min(self.n, max(k, rescore_n)) if rescore_n else k
+        all_scores, all_rows = [], []
+        for start in range(0, len(q_embs), chunk_size):
+            q = q_embs[start : start + chunk_size]
+            cand_scores, cand = _top_k(self._code_scores(q), n_cand)
+            if rescore_n:
+                # Exact float scores for the candidates only; each distinct
+                # row is read from the (memory-mapped) float matrix once
+                uniq, inv = np.unique(cand, return_inverse=True)
+                vecs = np.asarray(self.embs[uniq if self.rows is None else self.rows[uniq]], dtype=np.float32)
+                inv = inv.reshape(cand.shape)
+                cand_scores = np.empty(cand.shape, dtype=np.float32)
+                for i in range(0, len(q), 64):
+                    cand_scores[i : i + 64] = np.einsum("qd,qcd->qc", q[i : i + 64], vecs[inv[i : i + 64]])
+            top_scores, top = _top_k(cand_scores, k)
+            all_rows.append(np.take_along_axis(cand, top, axis=1))
+            all_scores.append(top_scores)
+        return np.vstack(all_scores), np.vstack(all_rows).astype(np.int64, copy=False)
+
+    def memory_bytes(self) -> int:
+        """Resident index size (codes only for int8 / binary; the float rescoring matrix is excluded)."""
+        if self.codes is not None:
+            return int(self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+        if self.index is None:
+            return int(self.n * self.dim * 4)
+        return int(_faiss().serialize_index(self.index).nbytes)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def save(self, path: str, fingerprint: str) -> None:
+        if self.index is None:
+            return
+        faiss = _faiss()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}"
+        faiss.write_index(self.index, tmp)
+        os.replace(tmp, path)
+        meta = {"kind": self.kind, "n": self.n, "dim": self.dim,
+                "params": self.params, "fingerprint": fingerprint}
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str, fingerprint: str, params: Dict[str, Any]) -> Optional["DenseIndex"]:
+        """Load a persisted index if it was built from the same matrix, else None."""
+        meta_path = path + ".json"
+        if not (os.path.isfile(path) and os.path.isfile(meta_path)):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("fingerprint") != fingerprint:
+            print(f"[ann] ignoring stale index {path}")
+            return None
+        self = cls.__new__(cls)
+        self.kind = meta["kind"]
+        self.n, self.dim = int(meta["n"]), int(meta["dim"])
+        # Build-time params come from the file; search-time ones from the caller
+        self.params = {**default_params(), **meta.get("params", {}),
+                       "hnsw_ef_search": params.get("hnsw_ef_search", default_params()["hnsw_ef_search"]),
+                       "ivf_nprobe": params.get("ivf_nprobe", default_params()["ivf_nprobe"])}
+        self.embs = None
+        self.rows = None
+        self.codes = None
+        self.scales = None
+        self.index = _faiss().read_index(path)
+        self._set_search_params()
+        print(f"[ann] loaded {self.kind} index from {path}")
+        return self
+
+
+def index_path(index_dir: str, model_name: str, kind: str, params: Dict[str, Any]) -> str:
+    slug = "".join(c if c.isalnum() or c in "._-" else "_" for c in model_name).strip("_")
+    p_hash = hashlib.sha256(json.dumps(build_params(kind, params), sort_keys=True).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(index_dir, f"{slug}__{kind}__{p_hash}.faiss")
+
+
+def gather_rows(embs: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+    """embs[rows] as float32; `embs` itself (no copy) when that is the same matrix."""
+    if rows is None or (
+        embs.dtype == np.float32 and len(rows) == embs.shape[0] and np.array_equal(rows, np.arange(len(rows)))
+    ):
+        return embs
+    return np.asarray(embs[rows], dtype=np.float32)
+
+
+def load_or_build_index(
+    embs: np.ndarray,
+    kind: str = "flat",
+    params: Optional[Dict[str, Any]] = None,
+    index_dir: Optional[str] = None,
+    model_name: str = "",
+    rows: Optional[np.ndarray] = None,
+) -> DenseIndex:
+    """DenseIndex for `embs` (or embs[rows]); hnsw/ivfpq indexes are cached under index_dir."""
+    params = {**default_params(), **(params or {})}
+    # Quantizing is a single pass over the matrix, about the cost of hashing it
+    if kind not in FAISS_TYPES or not index_dir:
+        return DenseIndex(embs, kind, params, rows=rows)
+    embs = gather_rows(embs, rows)
+    path = index_path(index_dir, model_name, kind, params)
+    fingerprint = matrix_fingerprint(embs)
+    index = DenseIndex.load(path, fingerprint, params)
+    if index is None:
+        index = DenseIndex(embs, kind, params)
+        index.save(path, fingerprint)
+        print(f"[ann] saved {kind} index to {path}")
+    return index
+
+
+# ------------------------------------------------------------------
+# Benchmark
+# ------------------------------------------------------------------
+def recall_at_k(approx_rows: np.ndarray, exact_rows: np.ndarray) -> float:
+    """Mean fraction of the exact top-k found by the approximate top-k."""
+    if exact_rows.size == 0:
+        return 0.0
+    hits = 0
+    for a, e in zip(approx_rows, exact_rows):
+        hits += len(set(a[a >= 0].tolist()) & set(e.tolist()))
+    return hits / exact_rows.size
+
+
+def benchmark(
+    embs: np.ndarray,
+    q_embs: np.ndarray,
+    kinds: List[str],
+    k: int = 10,
+    params: Optional[Dict[str, Any]] = None,
+    index_dir: Optional[str] = None,
+    model_name: str = "",
+    max_latency_queries: int = 1000,
+) -> List[Dict[str, Any]]:
+    """
+    recall@k vs flat (and its delta), p50/p95 single-query latency, batch QPS
+    and memory per backend. Quantized backends also report first-pass
+    recall@k without rescoring, to show what the float rescoring recovers.
+    """
+    exact = DenseIndex(embs, "flat")
+    _, exact_rows = exact.search(q_embs, k)
+
+    results = []
+    for kind in kinds:
+        t0 = time.time()
+        index = load_or_build_index(embs, kind, params, index_dir, model_name)
+        load_s = time.time() - t0
+
+        t0 = time.perf_counter()
+        _, rows = index.search(q_embs, k)
+        batch_s = time.perf_counter() - t0
+
+        lat = []
+        for q in q_embs[:max_latency_queries]:
+            t0 = time.perf_counter()
+            index.search(q[None, :], k)
+            lat.append((time.perf_counter() - t0) * 1000.0)
+
+        recall = recall_at_k(rows, exact_rows)
+        first_pass = None
+        if kind in QUANTIZED_TYPES:
+            _, fp_rows = index._search_quantized(q_embs, k, 0, 1024)
+            first_pass = round(recall_at_k(fp_rows, exact_rows), 4)
+
+        results.append({
+            "index": kind,
+            "params": build_params(kind, index.params) if kind != "flat" else {},
+            "n_passages": int(embs.shape[0]),
+            "n_queries": int(q_embs.shape[0]),
+            "k": k,
+            f"recall@{k}": round(recall, 4),
+            f"recall@{k}_delta": round(recall - 1.0, 4),
+            f"recall@{k}_first_pass": first_pass,
+            "latency_ms_p50": round(float(np.percentile(lat, 50)), 3) if lat else None,
+            "latency_ms_p95": round(float(np.percentile(lat, 95)), 3) if lat else None,
+            "batch_qps": round(len(q_embs) / batch_s, 1) if batch_s > 0 else None,
+            "memory_mb": round(index.memory_bytes() / (1024 * 1024), 2),
+            "build_or_load_s": round(load_s, 2),
+        })
+        print(f"[bench] {json.dumps(results[-1])}")
+    return results
+
+
+def main():
+    # Imported here so the library part above only needs NumPy (+ faiss)
+    from embedding_store import EmbeddingStore
+    from encoder_backend import add_encoder_args, load_encoder_from_args, store_model_key
+    from rag_step1_retrieve import DENSE_MODELS, load_passages, load_test_items
+
+    ap = argparse.ArgumentParser(description="Benchmark dense index backends against exact search.")
+    ap.add_argument("--passages", required=True, help="passages_full.jsonl")
+    ap.add_argument("--test-json", required=True, help="JSONL with questions used as benchmark queries.")
+    ap.add_argument("--model", choices=sorted(DENSE_MODELS), default="e5")
+    ap.add_argument("--indexes", default="flat,hnsw,ivfpq", help="Comma-separated backends to compare.")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--max-queries", type=int, default=1000, help="Cap on queries timed one by one.")
+    ap.add_argument("--emb-cache-dir", default="indexes/emb_cache")
+    ap.add_argument("--out-json", default=None)
+    add_index_args(ap)
+    add_encoder_args(ap)
+    args = ap.parse_args()
+
+    kinds = [x.strip() for x in args.indexes.split(",") if x.strip()]
+    bad = [x for x in kinds if x not in INDEX_TYPES]
+    if bad:
+        raise SystemExit(f"Unknown index type(s): {bad} (choose from {INDEX_TYPES})")
+
+    model_name, query_prefix, passage_prefix = DENSE_MODELS[args.model]
+    passages = load_passages(args.passages)
+    questions = [it["question"] for it in load_test_items(args.test_json)]
+    model = load_encoder_from_args(model_name, args)
+    store_key = store_model_key(model_name, args.encoder_backend, args.onnx_quant_config)
+
+    def encode(texts: List[str]) -> np.ndarray:
+        return model.encode(texts, batch_size=64, show_progress_bar=True,
+                            convert_to_numpy=True, normalize_embeddings=True)
+
+    pids = list(passages.keys())
+    store = EmbeddingStore(args.emb_cache_dir, store_key, passage_prefix)
+    embs = store.get_or_encode(pids, [passages[p] for p in pids], encode)
+    q_embs = np.asarray(encode([query_prefix + q for q in questions]), dtype=np.float32)
+
+    results = benchmark(
+        embs, q_embs, kinds, k=args.k,
+        params=index_params_from_args(args),
+        index_dir=args.index_dir,
+        model_name=store_key,
+        max_latency_queries=args.max_queries,
+    )
+    if args.out_json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out_json)), exist_ok=True)
+        with open(args.out_json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[bench] wrote {args.out_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/bm25_sparse.py
+
+Pure-Python BM25 (NumPy + SciPy), a drop-in for the Pyserini/Lucene BM25
+runs that needs no JVM and no separately built Lucene index.
+
+- Analyzer mirrors Anserini's DefaultEnglishAnalyzer: UAX#29-style word
+  tokenization -> possessive 's removal -> lowercase -> Lucene English stop
+  words -> Porter stemming.
+- Scoring mirrors Lucene's BM25Similarity (k1=0.9, b=0.4 by default):
+  idf = ln(1 + (N - df + 0.5) / (df + 0.5)), tf / (tf + k1 * (1 - b + b * dl / avgdl)),
+  with document lengths quantized like Lucene's 1-byte norms and repeated
+  query terms weighted by their count (Anserini's bag-of-words query).
+- The corpus is a CSR term-frequency matrix persisted to one .npz; BM25
+  weights are derived at load time, so k1/b can change without a rebuild.
+- A whole query batch is scored with one sparse product Q (nq x V) @ W (V x N).
+
+Build / search / parity vs. a Lucene run:
+
+  python srs/bm25_sparse.py build --passages data/passages_full.jsonl \
+    --index indexes/bm25_sparse.npz
+
+  python srs/bm25_sparse.py search --index indexes/bm25_sparse.npz \
+    --queries inputs/ir/queries_kept.tsv --hits 100 --output runs_full/kept/bm25_sparse.txt
+
+  python srs/bm25_sparse.py parity --index indexes/bm25_sparse.npz \
+    --queries inputs/ir/queries_kept.tsv --lucene-run runs_full/kept/bm25.txt --hits 100
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from corpus_registry import load_corpus
+
+ANALYZER_VERSION = "anserini-default-english-1"
+DEFAULT_SPARSE_INDEX = "indexes/bm25_sparse.npz"
+
+# Lucene EnglishAnalyzer.ENGLISH_STOP_WORDS_SET
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for if in into is it no not of on or such "
+    "that the their then there these they this to was will with".split()
+)
+
+# Letters join across . ' ’ : ·, digits across . ' ’ , ; (UAX#29 MidLetter /
+# MidNum / MidNumLet); letters, digits and "_" join directly.
+TOKEN_PAT = re.compile(
+    r"\w+(?:(?:(?<=[^\W\d_])[.'’:·](?=[^\W\d_])|(?<=\d)[.'’,;](?=\d))\w+)*"
+)
+HAS_ALNUM_PAT = re.compile(r"[^\W_]")
+
+
+# ------------------------------------------------------------------
+# Porter stemmer (Lucene's PorterStemmer / Porter's reference version)
+# ------------------------------------------------------------------
+class _Porter:
+    __slots__ = ("b", "k", "j")
+
+    def _cons(self, i: int) -> bool:
+        ch = self.b[i]
+        if ch in "aeiou":
+            return False
+        if ch == "y":
+            return i == 0 or not self._cons(i - 1)
+        return True
+
+    def _m(self) -> int:
+        n, i, j = 0, 0, self.j
+        while True:
+            if i > j:
+                return n
+            if not self._cons(i):
+                break
+            i += 1
+        i += 1
+        while True:
+            while True:
+                if i > j:
+                    return n
+                if self._cons(i):
+                    break
+                i += 1
+            i += 1
+            n += 1
+            while True:
+                if i > j:
+                    return n
+                if not self._cons(i):
+                    break
+                i += 1
+            i += 1
+
+    def _vowel_in_stem(self) -> bool:
+        return any(not self._cons(i) for i in range(self.j + 1))
+
+    def _doublec(self, j: int) -> bool:
+        return j >= 1 and self.b[j] == self.b[j - 1] and self._cons(j)
+
+    def _cvc(self, i: int) -> bool:
+        if i < 2 or not self._cons(i) or self._cons(i - 1) or not self._cons(i - 2):
+            return False
+        return self.b[i] not in "wxy"
+
+    def _ends(self, s: str) -> bool:
+        n = len(s)
+        if n > self.k + 1 or self.b[self.k - n + 1 : self.k + 1] != s:
+            return False
+        self.j = self.k - n
+        return True
+
+    def _setto(self, s: str) -> None:
+        self.b = self.b[: self.j + 1] + s + self.b[self.k + 1 :]
+        self.k = self.j + len(s)
+
+    def _r(self, s: str) -> None:
+        if self._m() > 0:
+            self._setto(s)
+
+    def _step1ab(self) -> None:
+        if self.b[self.k] == "s":
+            if self._ends("sses"):
+                self.k -= 2
+            elif self._ends("ies"):
+                self._setto("i")
+            elif self.b[self.k - 1] != "s":
+                self.k -= 1
+        if self._ends("eed"):
+            if self._m() > 0:
+                self.k -= 1
+        elif (self._ends("ed") or self._ends("ing")) and self._vowel_in_stem():
+            self.k = self.j
+            if self._ends("at"):
+                self._setto("ate")
+            elif self._ends("bl"):
+                self._setto("ble")
+            elif self._ends("iz"):
+                self._setto("ize")
+            elif self._doublec(self.k):
+                self.k -= 1
+                if self.b[self.k] in "lsz":
+                    self.k += 1
+            elif self._m() == 1 and self._cvc(self.k):
+                self._setto("e")
+
+    def _step1c(self) -> None:
+        if self._ends("y") and self._vowel_in_stem():
+            self.b = self.b[: self.k] + "i" + self.b[self.k + 1 :]
+
+    _STEP2 = {
+        "a": (("ational", "ate"), ("tional", "tion")),
+        "c": (("enci", "ence"), ("anci", "ance")),
+        "e": (("izer", "ize"),),
+        "l": (("bli", "ble"), ("alli", "al"), ("entli", "ent"), ("eli", "e"), ("ousli", "ous")),
+        "o": (("ization", "ize"), ("ation", "ate"), ("ator", "ate")),
+        "s": (("alism", "al"), ("iveness", "ive"), ("fulness", "ful"), ("ousness", "ous")),
+        "t": (("aliti", "al"), ("iviti", "ive"), ("biliti", "ble")),
+        "g": (("logi", "log"),),
+    }
+    _STEP3 = {
+        "e": (("icate", "ic"), ("ative", ""), ("alize", "al")),
+        "i": (("iciti", "ic"),),
+        "l": (("ical", "ic"), ("ful", "")),
+        "s": (("ness", ""),),
+    }
+    _STEP4 = {
+        "a": ("al",), "c": ("ance", "ence"), "e": ("er",), "i": ("ic",),
+        "l": ("able", "ible"), "n": ("ant", "ement", "ment", "ent"), "o": ("ion", "ou"),
+        "s": ("ism",), "t": ("ate", "iti"), "u": ("ous",), "v": ("ive",), "z": ("ize",),
+    }
+
+    def _step_table(self, table, ch: str) -> None:
+        for suffix, repl in table.get(ch, ()):
+            if self._ends(suffix):
+                self._r(repl)
+                return
+
+    def _step4(self) -> None:
+        for suffix in self._STEP4.get(self.b[self.k - 1], ()):
+            if self._ends(suffix):
+                if suffix == "ion" and not (self.j >= 0 and self.b[self.j] in "st"):
+                    continue
+                if self._m() > 1:
+                    self.k = self.j
+                return
+
+    def _step5(self) -> None:
+        self.j = self.k
+        if self.b[self.k] == "e":
+            a = self._m()
+            if a > 1 or (a == 1 and not self._cvc(self.k - 1)):
+                self.k -= 1
+        if self.b[self.k] == "l" and self._doublec(self.k) and self._m() > 1:
+            self.k -= 1
+
+    def stem(self, word: str) -> str:
+        if len(word) <= 2:
+            return word
+        self.b, self.k, self.j = word, len(word) - 1, 0
+        self._step1ab()
+        if self.k > 0:
+            self._step1c()
+            self._step_table(self._STEP2, self.b[self.k - 1])
+            self._step_table(self._STEP3, self.b[self.k])
+            self._step4()
+            self._step5()
+        return self.b[: self.k + 1]
+
+
+_PORTER = _Porter()
+
+
+@lru_cache(maxsize=1 << 18)
+def porter_stem(word: str) -> str:
+    return _PORTER.stem(word)
+
+
+def analyze(text: str) -> List[str]:
+    """Tokens as Anserini's DefaultEnglishAnalyzer would index them."""
+    out = []
+    for tok in TOKEN_PAT.findall(text or ""):
+        if not HAS_ALNUM_PAT.search(tok):
+            continue
+        # EnglishPossessiveFilter
+        if len(tok) >= 2 and tok[-1] in "sS" and tok[-2] in "'’＇":
+            tok = tok[:-2]
+        tok = tok.lower()
+        if not tok or tok in STOP_WORDS:
+            continue
+        out.append(porter_stem(tok))
+    return out
+
+
+# ------------------------------------------------------------------
+# Lucene norm quantization (SmallFloat.intToByte4 / byte4ToInt)
+# ------------------------------------------------------------------
+def _long_to_int4(i: int) -> int:
+    num_bits = i.bit_length()
+    if num_bits < 4:
+        return i
+    shift = num_bits - 4
+    return ((i >> shift) & 0x07) | ((shift + 1) << 3)
+
+
+def _int4_to_long(i: int) -> int:
+    bits = i & 0x07
+    shift = (i >> 3) - 1
+    return bits if shift == -1 else (bits | 0x08) << shift
+
+
+_NUM_FREE_VALUES = 255 - _long_to_int4(2**31 - 1)
+# Decoded length for each of the 256 norm bytes
+_LENGTH_TABLE = np.array(
+    [i if i < _NUM_FREE_VALUES else _NUM_FREE_VALUES + _int4_to_long(i - _NUM_FREE_VALUES) for i in range(256)],
+    dtype=np.float64,
+)
+
+
+def quantize_lengths(lengths: np.ndarray) -> np.ndarray:
+    """Document lengths as Lucene sees them after the 1-byte norm round trip."""
+    out = np.empty(len(lengths), dtype=np.float64)
+    for i, n in enumerate(lengths.tolist()):
+        b = n if n < _NUM_FREE_VALUES else _NUM_FREE_VALUES + _long_to_int4(n - _NUM_FREE_VALUES)
+        out[i] = _LENGTH_TABLE[b]
+    return out
+
+
+def corpus_fingerprint(pids: List[str], texts: List[str]) -> str:
+    h = hashlib.sha256(ANALYZER_VERSION.encode("utf-8"))
+    for pid, text in zip(pids, texts):
+        h.update(f"{pid}\x00{text}\x01".encode("utf-8"))
+    return h.hexdigest()
+
+
+# ------------------------------------------------------------------
+# Engine
+# ------------------------------------------------------------------
+class SparseBM25:
+    """
+    BM25 over a CSR term-frequency matrix (docs x terms).
+
+    Usage:
+        bm25 = SparseBM25.build(pids, texts)      # or SparseBM25.load(path)
+        bm25.save("indexes/bm25_sparse.npz")
+        hits = bm25.search_batch(queries, k=100)  # [[(pid, score), ...], ...]
+    """
+
+    def __init__(
+        self,
+        pids: List[str],
+        vocab: List[str],
+        tf: sparse.csr_matrix,
+        doc_len: np.ndarray,
+        fingerprint: str = "",
+        k1: float = 0.9,
+        b: float = 0.4,
+    ):
+        self.pids = pids
+        self.vocab = vocab
+        self.term_id: Dict[str, int] = {t: i for i, t in enumerate(vocab)}
+        self.tf = tf
+        self.doc_len = doc_len
+        self.fingerprint = fingerprint
+        self.set_params(k1, b)
+
+    # ------------------------------------------------------------------
+    # Build / persistence
+    # ------------------------------------------------------------------
+    @classmethod
+    def build(cls, pids: List[str], texts: List[str], k1: float = 0.9, b: float = 0.4) -> "SparseBM25":
+        term_id: Dict[str, int] = {}
+        indptr = [0]
+        indices: List[int] = []
+        data: List[int] = []
+        doc_len = np.zeros(len(pids), dtype=np.int64)
+        for d, text in enumerate(texts):
+            toks = analyze(text)
+            doc_len[d] = len(toks)
+            for term, cnt in Counter(toks).items():
+                indices.append(term_id.setdefault(term, len(term_id)))
+                data.append(cnt)
+            indptr.append(len(indices))
+        tf = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(pids), len(term_id)),
+        )
+        tf.sort_indices()
+        vocab = [""] * len(term_id)
+        for t, i in term_id.items():
+            vocab[i] = t
+        return cls(list(pids), vocab, tf, doc_len, corpus_fingerprint(pids, texts), k1, b)
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}.npz"
+        try:
+            np.savez(
+                tmp,
+                tf_data=self.tf.data,
+                tf_indices=self.tf.indices,
+                tf_indptr=self.tf.indptr,
+                shape=np.asarray(self.tf.shape, dtype=np.int64),
+                doc_len=self.doc_len,
+                pids=np.asarray(self.pids, dtype=str),
+                vocab=np.asarray(self.vocab, dtype=str),
+                meta=np.asarray(json.dumps({"analyzer": ANALYZER_VERSION, "fingerprint": self.fingerprint})),
+            )
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str, k1: float = 0.9, b: float = 0.4) -> "SparseBM25":
+        z = np.load(path, allow_pickle=False)
+        meta = json.loads(str(z["meta"]))
+        if meta.get("analyzer") != ANALYZER_VERSION:
+            raise ValueError(f"{path} was built with analyzer {meta.get('analyzer')}, expected {ANALYZER_VERSION}")
+        tf = sparse.csr_matrix((z["tf_data"], z["tf_indices"], z["tf_indptr"]), shape=tuple(z["shape"]))
+        return cls(z["pids"].tolist(), z["vocab"].tolist(), tf, z["doc_len"], meta.get("fingerprint", ""), k1, b)
+
+    @classmethod
+    def load_or_build(
+        cls, path: Optional[str], pids: List[str], texts: List[str], k1: float = 0.9, b: float = 0.4
+    ) -> "SparseBM25":
+        """Load `path` if it indexes exactly this corpus, else build (and save when path is set)."""
+        if path and os.path.isdir(path):
+            # Checked before indexing the corpus: the save at the end would fail
+            raise ValueError(f"{path} is a directory (a Lucene index?); the sparse BM25 index is an .npz file")
+        if path and os.path.isfile(path):
+            t0 = time.time()
+            engine = cls.load(path, k1, b)
+            if engine.fingerprint == corpus_fingerprint(pids, texts):
+                print(f"[bm25-sparse] loaded {path} ({len(engine.pids)} docs, "
+                      f"{len(engine.vocab)} terms) in {time.time() - t0:.2f}s")
+                return engine
+            print(f"[bm25-sparse] {path} was built from a different corpus; rebuilding")
+        t0 = time.time()
+        engine = cls.build(pids, texts, k1, b)
+        print(f"[bm25-sparse] indexed {len(pids)} docs, {len(engine.vocab)} terms in {time.time() - t0:.1f}s")
+        if path:
+            engine.save(path)
+            print(f"[bm25-sparse] saved {path}")
+        return engine
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+    def set_params(self, k1: float = 0.9, b: float = 0.4) -> None:
+        """Derive the term-major BM25 weight matrix W (terms x docs) for k1/b."""
+        self.k1, self.b = float(k1), float(b)
+        n_docs = self.tf.shape[0]
+        df = np.bincount(self.tf.indices, minlength=self.tf.shape[1]).astype(np.float64)
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        avgdl = float(self.doc_len.sum()) / n_docs if n_docs else 1.0
+        norm = self.k1 * ((1.0 - self.b) + self.b * quantize_lengths(self.doc_len) / avgdl)
+
+        tf = self.tf.tocoo()
+        w = idf[tf.col] * tf.data / (tf.data + norm[tf.row])
+        self.W = sparse.csr_matrix(
+            (w.astype(np.float32), (tf.col, tf.row)), shape=(self.tf.shape[1], n_docs)
+        )
+
+    def query_matrix(self, queries: List[str]) -> sparse.csr_matrix:
+        """(nq x V) matrix of query term counts; unknown terms are dropped."""
+        indptr = [0]
+        indices: List[int] = []
+        data: List[float] = []
+        for q in queries:
+            counts: Dict[int, int] = defaultdict(int)
+            for t in analyze(q):
+                tid = self.term_id.get(t)
+                if tid is not None:
+                    counts[tid] += 1
+            for tid, c in sorted(counts.items()):
+                indices.append(tid)
+                data.append(float(c))
+            indptr.append(len(indices))
+        return sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(queries), len(self.vocab)),
+        )
+
+    def search_batch(self, queries: List[str], k: int, chunk_size: int = 4096) -> List[List[Tuple[str, float]]]:
+        """
+        Top-k (pid, score) per query; ties break by corpus order like Lucene.
+        Only documents sharing at least one term with the query are returned.
+        """
+        results: List[List[Tuple[str, float]]] = []
+        for start in range(0, len(queries), chunk_size):
+            scores = (self.query_matrix(queries[start : start + chunk_size]) @ self.W).tocsr()
+            scores.sort_indices()
+            for r in range(scores.shape[0]):
+                lo, hi = scores.indptr[r], scores.indptr[r + 1]
+                docs, vals = scores.indices[lo:hi], scores.data[lo:hi]
+                if len(vals) > k:
+                    keep = np.argpartition(-vals, k - 1)[:k]
+                    # Keep every doc tied with the k-th score so tie-breaking stays exact
+                    kth = vals[keep].min()
+                    keep = np.nonzero(vals >= kth)[0]
+                    docs, vals = docs[keep], vals[keep]
+                order = np.lexsort((docs, -vals))[:k]
+                results.append([(self.pids[d], float(v)) for d, v in zip(docs[order], vals[order])])
+        return results
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        return self.search_batch([query], k)[0]
+
+
+# ------------------------------------------------------------------
+# CLI helpers
+# ------------------------------------------------------------------
+def load_passages_jsonl(path: str) -> Tuple[List[str], List[str]]:
+    """pids / texts of a passages JSONL (or its registry), via the shared corpus registry."""
+    corpus = load_corpus(path)
+    return list(corpus.pids), [corpus.text(i) for i in range(len(corpus))]
+
+
+def load_queries_tsv(path: str) -> Tuple[List[str], List[str]]:
+    qids, queries = [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            qid, q = line.split("\t", 1)
+            qids.append(qid.strip())
+            queries.append(q.strip())
+    return qids, queries
+
+
+def read_trec_run(path: str) -> Dict[str, List[Tuple[str, float]]]:
+    run: Dict[str, List[Tuple[int, str, float]]] = defaultdict(list)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 6:
+                continue
+            qid, _, docid, rank, score = parts[:5]
+            run[qid].append((int(rank), docid, float(score)))
+    return {qid: [(d, s) for _, d, s in sorted(rows)] for qid, rows in run.items()}
+
+
+def parity_report(
+    ours: Dict[str, List[Tuple[str, float]]],
+    lucene: Dict[str, List[Tuple[str, float]]],
+    k: int,
+) -> Dict[str, float]:
+    """Overlap / rank agreement / score error of our run against a Lucene run."""
+    overlaps, top1, identical, score_err = [], [], [], []
+    for qid, ref in lucene.items():
+        ref = ref[:k]
+        got = ours.get(qid, [])[:k]
+        if not ref:
+            continue
+        ref_ids = [d for d, _ in ref]
+        got_ids = [d for d, _ in got]
+        overlaps.append(len(set(ref_ids) & set(got_ids)) / len(ref_ids))
+        top1.append(1.0 if got_ids[:1] == ref_ids[:1] else 0.0)
+        identical.append(1.0 if got_ids == ref_ids else 0.0)
+        got_score = dict(got)
+        score_err.extend(abs(got_score[d] - s) for d, s in ref if d in got_score)
+    n = len(overlaps)
+    return {
+        "n_queries": n,
+        "k": k,
+        "mean_overlap": round(float(np.mean(overlaps)), 4) if n else 0.0,
+        "top1_agreement": round(float(np.mean(top1)), 4) if n else 0.0,
+        "identical_rankings": round(float(np.mean(identical)), 4) if n else 0.0,
+        "mean_abs_score_diff": round(float(np.mean(score_err)), 6) if score_err else 0.0,
+        "max_abs_score_diff": round(float(np.max(score_err)), 6) if score_err else 0.0,
+    }
+
+
+def write_trec_run(path: str, qids: List[str], hits: List[List[Tuple[str, float]]], tag: str = "bm25_sparse") -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as out:
+        for qid, row in zip(qids, hits):
+            for rank, (pid, score) in enumerate(row, start=1):
+                out.write(f"{qid} Q0 {pid} {rank} {score:.6f} {tag}\n")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="NumPy/SciPy BM25 (Lucene-compatible) build / search / parity.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="Index a passages JSONL into an .npz")
+    b.add_argument("--passages", required=True)
+    b.add_argument("--index", required=True, help="Output .npz path")
+
+    for name in ("search", "parity"):
+        p = sub.add_parser(name)
+        p.add_argument("--index", required=True, help=".npz built by `build`")
+        p.add_argument("--queries", required=True, help="TSV: qid \\t query")
+        p.add_argument("--hits", type=int, default=100)
+        p.add_argument("--k1", type=float, default=0.9)
+        p.add_argument("--b", type=float, default=0.4)
+        if name == "search":
+            p.add_argument("--output", required=True, help="TREC run file")
+        else:
+            p.add_argument("--lucene-run", required=True, help="Pyserini/Anserini TREC run to compare against")
+            p.add_argument("--min-overlap", type=float, default=0.99,
+                           help="Exit non-zero if mean top-k overlap falls below this.")
+            p.add_argument("--out-json", default=None)
+
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        pids, texts = load_passages_jsonl(args.passages)
+        t0 = time.time()
+        engine = SparseBM25.build(pids, texts)
+        engine.save(args.index)
+        print(f"[bm25-sparse] indexed {len(pids)} docs, {len(engine.vocab)} terms "
+              f"in {time.time() - t0:.1f}s -> {args.index}")
+        return
+
+    t0 = time.time()
+    engine = SparseBM25.load(args.index, k1=args.k1, b=args.b)
+    print(f"[bm25-sparse] loaded {args.index} in {time.time() - t0:.2f}s")
+    qids, queries = load_queries_tsv(args.queries)
+    t0 = time.time()
+    hits = engine.search_batch(queries, k=args.hits)
+    dt = time.time() - t0
+    print(f"[bm25-sparse] {len(queries)} queries in {dt:.2f}s ({len(queries) / max(dt, 1e-9):.0f} q/s)")
+
+    if args.cmd == "search":
+        write_trec_run(args.output, qids, hits)
+        print(f"[bm25-sparse] wrote {args.output}")
+        return
+
+    report = parity_report(dict(zip(qids, hits)), read_trec_run(args.lucene_run), args.hits)
+    print(json.dumps(report, indent=2))
+    if args.out_json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out_json)), exist_ok=True)
+        with open(args.out_json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if report["mean_overlap"] < args.min_overlap:
+        print(f"[bm25-sparse] PARITY FAIL: mean overlap {report['mean_overlap']} < {args.min_overlap}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
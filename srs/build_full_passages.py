@@ -7,6 +7,7 @@ import argparse
 from collections import OrderedDict
 from pathlib import Path
 
+from corpus_registry import CorpusRegistry, registry_dir_for, source_stamp
 from doc_manifest import DOCUMENTS  # veya projende nasıl import ediyorsan
 
 def iter_items_from_file(path):
@@ -37,6 +38,8 @@ def main():
                     help="Output JSONL with pid, text, document_id, passage_id.")
     ap.add_argument("--out_json_collection", default="passages_json/collection_full.jsonl",
                     help="Output JSONL for Pyserini JsonCollection (id, contents).")
+    ap.add_argument("--out_registry", default=None,
+                    help="Corpus registry dir (default: <out_passages stem>.registry).")
     args = ap.parse_args()
 
     out_passages_path = Path(args.out_passages)
@@ -118,7 +121,15 @@ def main():
             }
             f_col.write(json.dumps(jf_obj, ensure_ascii=False) + "\n")
 
+    # Paylaşılan corpus registry (int32 pid id'leri + mmap metin blob'u)
+    out_registry = args.out_registry or registry_dir_for(str(out_passages_path))
+    registry = CorpusRegistry.build(
+        passages.values(), meta={"source": source_stamp(str(out_passages_path))}
+    )
+    registry.save(out_registry)
+
     print(f"[ok] Wrote full passages to: {out_passages_path}")
+    print(f"[ok] Wrote corpus registry to: {out_registry}")
     print(f"[ok] Wrote JsonCollection to: {out_json_collection_path}")
     print(f"[ok] Total passages: {len(passages)}")
 
@@ -8,6 +8,8 @@ import json
 import os
 from collections import defaultdict
 
+from run_store import BinaryRun, is_binary_run
+
 def load_qrels(path):
     """Load qrels as qid -> set(docid)."""
     qrels = defaultdict(set)
@@ -27,18 +29,22 @@ def load_run(path, k=None):
     We keep only the top-k *unique* docids per query (dedup).
     """
     tmp = defaultdict(list)  # qid -> list of (rank, docid)
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) < 6:
-                continue
-            qid, _, docid, rank_str, score, tag = parts
-            try:
-                rank = int(rank_str)
-            except ValueError:
-                # Fallback if rank is not an int (shouldn't happen with pyserini)
-                rank = 0
-            tmp[qid].append((rank, docid))
+    if is_binary_run(path):
+        for qid, docids, ranks, _ in BinaryRun.open(path).iter_queries():
+            tmp[qid].extend(zip(ranks, docids))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.strip().split()
+                if len(parts) < 6:
+                    continue
+                qid, _, docid, rank_str, score, tag = parts
+                try:
+                    rank = int(rank_str)
+                except ValueError:
+                    # Fallback if rank is not an int (shouldn't happen with pyserini)
+                    rank = 0
+                tmp[qid].append((rank, docid))
 
     run = {}
     for qid, pairs in tmp.items():
@@ -191,7 +197,7 @@ def main():
 
     runs = {}
     for run_path in args.runs:
-        name = os.path.basename(run_path)
+        name = os.path.basename(run_path.rstrip("/"))
         print(f"[info] loading run: {name}")
         runs[name] = load_run(run_path, k=args.k)
 
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/corpus_registry.py
+
+Shared passage corpus: pids interned to dense int32 ids, texts in one
+memory-mapped blob. build_full_passages.py writes it next to
+passages_full.jsonl; every script that used to build its own pid -> text
+dict opens it instead.
+
+  data/passages_full.registry/
+      pids.json              # id -> pid
+      text.bin               # UTF-8 texts, concatenated
+      text_offsets.npy       # (N + 1,) int64, text i = text.bin[off[i]:off[i + 1]]
+      passage_id.bin         # same layout for the human-readable passage_id
+      passage_id_offsets.npy
+      passage_id_missing.npy # (N,) bool
+      document_id.npy        # (N,) int32, -1 = missing or not an int
+      document_id_other.json # [[i, value], ...] document_ids kept as read (strings, ...)
+      meta.json              # {"format", "version", "n", "source": {path, size, mtime_ns}}
+
+load_corpus(path) accepts the registry directory or the JSONL it was built
+from. For a JSONL it opens the sibling <stem>.registry when that was built
+from the file as it is now; otherwise it builds the registry from the JSONL
+and (best effort) saves it for the next run.
+
+Usage:
+    corpus = load_corpus("data/passages_full.jsonl")
+    texts = corpus.texts()            # Mapping pid -> text (read lazily)
+    recs = corpus.records()           # Mapping pid -> {"pid", "text", "document_id", "passage_id"}
+    ids = corpus.ids(pid_list)        # np.int32, -1 for unknown pids
+"""
+
+import json
+import os
+import shutil
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+FORMAT_NAME = "xrefrag-corpus-registry"
+FORMAT_VERSION = 2
+
+
+def registry_dir_for(passages_path: str) -> str:
+    """data/passages_full.jsonl -> data/passages_full.registry"""
+    stem, _ = os.path.splitext(passages_path)
+    return stem + ".registry"
+
+
+def is_registry(path: str) -> bool:
+    return os.path.isdir(path) and os.path.isfile(os.path.join(path, "meta.json"))
+
+
+def source_stamp(path: str) -> Dict[str, Any]:
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def corpus_fingerprint(path: str) -> Dict[str, Any]:
+    """
+    Source stamp of a passages JSONL, or of the JSONL a registry directory
+    was built from, with the path resolved: equal stamps mean the same file
+    as it was when loaded.
+    """
+    if is_registry(path):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            stamp = dict(json.load(f).get("source") or {})
+    else:
+        stamp = source_stamp(path)
+    if stamp.get("path"):
+        stamp["path"] = os.path.realpath(stamp["path"])
+    return stamp
+
+
+def _pack(strings: List[str]):
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return b"".join(encoded), offsets
+
+
+def iter_passage_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Passage records from a JSONL, with the field fallbacks the loaders used."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            pid = obj.get("pid") or obj.get("id") or obj.get("passage_id") or obj.get("PassageID")
+            text = (
+                obj.get("text")
+                or obj.get("contents")
+                or obj.get("passage")
+                or obj.get("passage_text")
+                or obj.get("Passage")
+            )
+            if not pid or not text:
+                continue
+            yield {
+                "pid": str(pid).strip(),
+                "text": str(text),
+                "document_id": obj.get("document_id"),
+                "passage_id": obj.get("passage_id"),
+            }
+
+
+class CorpusRegistry:
+    """Interned pids + column arrays for one passage corpus."""
+
+    def __init__(
+        self,
+        pids: List[str],
+        text_blob,
+        text_offsets: np.ndarray,
+        pid_blob,
+        pid_offsets: np.ndarray,
+        passage_id_missing: np.ndarray,
+        document_ids: np.ndarray,
+        meta: Optional[Dict[str, Any]] = None,
+        document_id_other: Optional[Dict[int, Any]] = None,
+    ):
+        self.pids = pids
+        self.pid_to_id: Dict[str, int] = {pid: i for i, pid in enumerate(pids)}
+        self._text_blob = text_blob
+        self._text_offsets = text_offsets
+        self._pid_blob = pid_blob
+        self._pid_offsets = pid_offsets
+        self._passage_id_missing = passage_id_missing
+        self.document_ids = document_ids
+        self.document_id_other: Dict[int, Any] = document_id_other or {}
+        self.meta = meta or {}
+
+    def __len__(self) -> int:
+        return len(self.pids)
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+    def id_of(self, pid: str) -> int:
+        return self.pid_to_id.get(pid, -1)
+
+    def ids(self, pids: Iterable[str]) -> np.ndarray:
+        """Dense ids for `pids` (-1 where unknown)."""
+        get = self.pid_to_id.get
+        return np.fromiter((get(p, -1) for p in pids), dtype=np.int32)
+
+    def text(self, i: int) -> str:
+        lo, hi = self._text_offsets[i], self._text_offsets[i + 1]
+        return bytes(self._text_blob[lo:hi]).decode("utf-8")
+
+    def passage_id(self, i: int) -> Optional[str]:
+        if self._passage_id_missing[i]:
+            return None
+        lo, hi = self._pid_offsets[i], self._pid_offsets[i + 1]
+        return bytes(self._pid_blob[lo:hi]).decode("utf-8")
+
+    def document_id(self, i: int) -> Any:
+        d = int(self.document_ids[i])
+        if d >= 0:
+            return d
+        return self.document_id_other.get(i)
+
+    def record(self, i: int) -> Dict[str, Any]:
+        return {
+            "pid": self.pids[i],
+            "text": self.text(i),
+            "document_id": self.document_id(i),
+            "passage_id": self.passage_id(i),
+        }
+
+    def texts(self) -> "PassageTexts":
+        return PassageTexts(self)
+
+    def records(self) -> "PassageRecords":
+        return PassageRecords(self)
+
+    # ------------------------------------------------------------------
+    # Build / persistence
+    # ------------------------------------------------------------------
+    @classmethod
+    def build(cls, records: Iterable[Dict[str, Any]], meta: Optional[Dict[str, Any]] = None) -> "CorpusRegistry":
+        """Records with pid / text / document_id / passage_id; a repeated pid keeps its last record."""
+        by_pid: Dict[str, Dict[str, Any]] = {}
+        for rec in records:
+            by_pid[str(rec["pid"])] = rec
+        pids = list(by_pid)
+        recs = list(by_pid.values())
+
+        text_blob, text_offsets = _pack([str(r.get("text") or "") for r in recs])
+        pid_blob, pid_offsets = _pack(["" if r.get("passage_id") is None else str(r["passage_id"]) for r in recs])
+        missing = np.array([r.get("passage_id") is None for r in recs], dtype=bool)
+        # int32 column for the usual non-negative int ids; any other value is
+        # kept unchanged (type included) in a side map
+        document_ids = np.full(len(recs), -1, dtype=np.int32)
+        document_id_other: Dict[int, Any] = {}
+        for i, r in enumerate(recs):
+            d = r.get("document_id")
+            if d is None:
+                continue
+            if isinstance(d, int) and not isinstance(d, bool) and 0 <= d < 2**31:
+                document_ids[i] = d
+            else:
+                document_id_other[i] = d
+        return cls(
+            pids,
+            np.frombuffer(text_blob, dtype=np.uint8),
+            text_offsets,
+            np.frombuffer(pid_blob, dtype=np.uint8),
+            pid_offsets,
+            missing,
+            document_ids,
+            meta,
+            document_id_other,
+        )
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> "CorpusRegistry":
+        return cls.build(iter_passage_records(path), meta={"source": source_stamp(path)})
+
+    def save(self, path: str) -> None:
+        """
+        Write the registry to a sibling temp directory and swap it in, so a
+        process that has the old registry memory-mapped keeps reading the old
+        (unlinked) files instead of ones being rewritten under it.
+        """
+        path = os.path.normpath(path)
+        tmp_dir = f"{path}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        with open(os.path.join(tmp_dir, "pids.json"), "w", encoding="utf-8") as f:
+            json.dump(self.pids, f, ensure_ascii=False)
+        with open(os.path.join(tmp_dir, "text.bin"), "wb") as f:
+            f.write(bytes(self._text_blob))
+        with open(os.path.join(tmp_dir, "passage_id.bin"), "wb") as f:
+            f.write(bytes(self._pid_blob))
+        np.save(os.path.join(tmp_dir, "text_offsets.npy"), self._text_offsets)
+        np.save(os.path.join(tmp_dir, "passage_id_offsets.npy"), self._pid_offsets)
+        np.save(os.path.join(tmp_dir, "passage_id_missing.npy"), self._passage_id_missing)
+        np.save(os.path.join(tmp_dir, "document_id.npy"), self.document_ids)
+        with open(os.path.join(tmp_dir, "document_id_other.json"), "w", encoding="utf-8") as f:
+            json.dump(sorted(self.document_id_other.items()), f, ensure_ascii=False)
+        meta = dict(self.meta, format=FORMAT_NAME, version=FORMAT_VERSION, n=len(self.pids))
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        # A directory cannot be os.replace()d onto a non-empty one: move the
+        # old registry aside, rename the new one in, then drop the old files
+        if os.path.exists(path):
+            old_dir = f"{path}.old{os.getpid()}"
+            shutil.rmtree(old_dir, ignore_errors=True)
+            os.rename(path, old_dir)
+            os.rename(tmp_dir, path)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.rename(tmp_dir, path)
+
+    @classmethod
+    def open(cls, path: str) -> "CorpusRegistry":
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_NAME or meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a {FORMAT_NAME} v{FORMAT_VERSION} directory")
+        with open(os.path.join(path, "pids.json"), "r", encoding="utf-8") as f:
+            pids = json.load(f)
+
+        def blob(name: str):
+            p = os.path.join(path, name)
+            # np.memmap cannot map an empty file
+            return np.memmap(p, dtype=np.uint8, mode="r") if os.path.getsize(p) else np.zeros(0, dtype=np.uint8)
+
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        with open(os.path.join(path, "document_id_other.json"), "r", encoding="utf-8") as f:
+            document_id_other = {int(i): v for i, v in json.load(f)}
+        return cls(
+            pids,
+            blob("text.bin"),
+            load("text_offsets.npy"),
+            blob("passage_id.bin"),
+            load("passage_id_offsets.npy"),
+            load("passage_id_missing.npy"),
+            load("document_id.npy"),
+            meta,
+            document_id_other,
+        )
+
+    def is_fresh_for(self, passages_path: str) -> bool:
+        src = self.meta.get("source") or {}
+        stamp = source_stamp(passages_path)
+        return src.get("size") == stamp["size"] and src.get("mtime_ns") == stamp["mtime_ns"]
+
+
+class PassageTexts(Mapping):
+    """Read-only pid -> text view over a CorpusRegistry."""
+
+    def __init__(self, registry: CorpusRegistry):
+        self.registry = registry
+
+    def __getitem__(self, pid: str) -> str:
+        i = self.registry.pid_to_id.get(pid)
+        if i is None:
+            raise KeyError(pid)
+        return self.registry.text(i)
+
+    def __contains__(self, pid) -> bool:
+        return pid in self.registry.pid_to_id
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.registry.pids)
+
+    def __len__(self) -> int:
+        return len(self.registry.pids)
+
+
+class PassageRecords(PassageTexts):
+    """Read-only pid -> {"pid", "text", "document_id", "passage_id"} view."""
+
+    def __getitem__(self, pid: str) -> Dict[str, Any]:
+        i = self.registry.pid_to_id.get(pid)
+        if i is None:
+            raise KeyError(pid)
+        return self.registry.record(i)
+
+
+def load_corpus(path: str, save: bool = True) -> CorpusRegistry:
+    """Open a registry directory, or the up-to-date registry of a passages JSONL."""
+    if is_registry(path):
+        return CorpusRegistry.open(path)
+    reg_dir = registry_dir_for(path)
+    if is_registry(reg_dir):
+        try:
+            registry = CorpusRegistry.open(reg_dir)
+        except ValueError as e:
+            print(f"[corpus] {e}; rebuilding")
+        else:
+            if registry.is_fresh_for(path):
+                return registry
+            print(f"[corpus] {reg_dir} is older than {path}; rebuilding")
+    registry = CorpusRegistry.from_jsonl(path)
+    if save:
+        try:
+            registry.save(reg_dir)
+            print(f"[corpus] wrote {reg_dir} ({len(registry)} passages)")
+        except OSError as e:
+            print(f"[corpus] could not write {reg_dir}: {e}")
+    return registry
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/embedding_store.py
+
+Persistent on-disk store for passage embeddings.
+
+One store directory per (model_name, passage_prefix):
+
+  <cache_dir>/<model-slug>__<prefix-hash>/
+      embs.npy     # (N, dim) float32 or float16 matrix, opened memory-mapped
+      index.json   # {"model_name", "passage_prefix", "dtype", "dim",
+                   #  "pids": [...], "hashes": [...]}
+
+Each row is keyed by sha256(pid + "\\x00" + text), so a passage whose text
+changes is re-encoded while unchanged passages are read straight from disk.
+New rows are appended; rows for passages that are no longer requested are
+kept, so several corpora (passages.jsonl / passages_full.jsonl) can share
+one store without evicting each other.
+
+Usage:
+    store = EmbeddingStore("indexes/emb_cache", "intfloat/e5-base-v2", "passage: ")
+    embs = store.get_or_encode(pids, texts, encode_fn)   # float32 (len(pids), dim)
+
+    # or, without materializing a copy: passage i is store.embs[rows[i]]
+    rows = store.get_rows(pids, texts, encode_fn)
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+STORE_DTYPES = {"float32": np.float32, "float16": np.float16}
+
+
+def passage_key(pid: str, text: str) -> str:
+    """Content hash of a passage (pid + text)."""
+    return hashlib.sha256(f"{pid}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def store_dirname(model_name: str, passage_prefix: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name).strip("_")
+    prefix_hash = hashlib.sha256(passage_prefix.encode("utf-8")).hexdigest()[:8]
+    return f"{slug}__{prefix_hash}"
+
+
+class EmbeddingStore:
+    """
+    Memory-mapped embedding matrix + pid/hash index for one (model, prefix).
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        model_name: str,
+        passage_prefix: str = "",
+        dtype: str = "float32",
+    ):
+        if dtype not in STORE_DTYPES:
+            raise ValueError(f"Unsupported store dtype: {dtype} (choose from {sorted(STORE_DTYPES)})")
+        self.model_name = model_name
+        self.passage_prefix = passage_prefix
+        self.dtype = dtype
+        self.dir = os.path.join(cache_dir, store_dirname(model_name, passage_prefix))
+        self.embs_path = os.path.join(self.dir, "embs.npy")
+        self.index_path = os.path.join(self.dir, "index.json")
+
+        self.pids: List[str] = []
+        self.hashes: List[str] = []
+        self.embs: Optional[np.ndarray] = None
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Load / save
+    # ------------------------------------------------------------------
+    def _load(self) -> None:
+        if not (os.path.isfile(self.embs_path) and os.path.isfile(self.index_path)):
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model_name") != self.model_name or meta.get("passage_prefix") != self.passage_prefix:
+            print(f"[EmbeddingStore] Ignoring mismatched store at {self.dir}")
+            return
+        embs = np.load(self.embs_path, mmap_mode="r")
+        if embs.shape[0] != len(meta.get("hashes", [])):
+            print(f"[EmbeddingStore] Ignoring inconsistent store at {self.dir}")
+            return
+        self.pids = list(meta.get("pids", []))
+        self.hashes = list(meta["hashes"])
+        self.embs = embs
+
+    def _save(self, embs: np.ndarray) -> None:
+        os.makedirs(self.dir, exist_ok=True)
+        tmp_embs = f"{self.embs_path}.tmp{os.getpid()}.npy"
+        tmp_index = f"{self.index_path}.tmp{os.getpid()}"
+        np.save(tmp_embs, embs.astype(STORE_DTYPES[self.dtype], copy=False))
+        meta = {
+            "model_name": self.model_name,
+            "passage_prefix": self.passage_prefix,
+            "dtype": self.dtype,
+            "dim": int(embs.shape[1]),
+            "pids": self.pids,
+            "hashes": self.hashes,
+        }
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        # Matrix first, then index: a crash in between leaves a store that
+        # _load() rejects as inconsistent rather than one with wrong rows.
+        os.replace(tmp_embs, self.embs_path)
+        os.replace(tmp_index, self.index_path)
+        self.embs = np.load(self.embs_path, mmap_mode="r")
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+    def get_rows(
+        self,
+        pids: List[str],
+        texts: List[str],
+        encode_fn: Callable[[List[str]], np.ndarray],
+    ) -> np.ndarray:
+        """
+        Encode the passages missing from the store and return, for each of
+        `pids`, its row in `self.embs` (int64, len(pids)).
+
+        `texts` are the raw passage texts (without prefix); `encode_fn` gets
+        the prefixed texts that are missing from the store and must return
+        normalized embeddings in the same order.
+        """
+        if len(pids) != len(texts):
+            raise ValueError("pids and texts must have the same length")
+
+        keys = [passage_key(pid, text) for pid, text in zip(pids, texts)]
+        row_of: Dict[str, int] = {h: i for i, h in enumerate(self.hashes)}
+
+        missing = [i for i, h in enumerate(keys) if h not in row_of]
+        if missing:
+            print(
+                f"[EmbeddingStore] {len(keys) - len(missing)}/{len(keys)} cached; "
+                f"encoding {len(missing)} new or changed passages with {self.model_name}..."
+            )
+            new_embs = np.asarray(
+                encode_fn([self.passage_prefix + texts[i] for i in missing]),
+                dtype=np.float32,
+            )
+            seen_new: Dict[str, int] = {}
+            add_rows: List[int] = []
+            for j, i in enumerate(missing):
+                # Duplicate (pid, text) rows inside one request are stored once.
+                if keys[i] in seen_new:
+                    continue
+                seen_new[keys[i]] = len(self.hashes)
+                add_rows.append(j)
+                self.pids.append(pids[i])
+                self.hashes.append(keys[i])
+            old = np.asarray(self.embs, dtype=np.float32) if self.embs is not None else None
+            added = new_embs[add_rows]
+            merged = added if old is None or old.shape[0] == 0 else np.vstack([old, added])
+            self._save(merged)
+            row_of.update(seen_new)
+        else:
+            print(f"[EmbeddingStore] All {len(keys)} passages cached for {self.model_name}")
+
+        return np.fromiter((row_of[h] for h in keys), dtype=np.int64, count=len(keys))
+
+    def get_or_encode(
+        self,
+        pids: List[str],
+        texts: List[str],
+        encode_fn: Callable[[List[str]], np.ndarray],
+    ) -> np.ndarray:
+        """
+        Return a float32 (len(pids), dim) matrix aligned with `pids`: the
+        memmap itself when the store holds exactly these rows in order as
+        float32, else a copy in memory (see get_rows() to avoid it).
+        """
+        rows = self.get_rows(pids, texts, encode_fn)
+        if (
+            self.embs.dtype == np.float32
+            and rows.shape[0] == self.embs.shape[0]
+            and np.array_equal(rows, np.arange(rows.shape[0]))
+        ):
+            # Store order matches the request: hand back the memmap as-is.
+            return self.embs
+        return np.asarray(self.embs[rows], dtype=np.float32)
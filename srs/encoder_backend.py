@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/encoder_backend.py
+
+Selectable CPU inference backend for the SentenceTransformer encoders
+(e5-base-v2, bge-base-en-v1.5):
+
+  torch      PyTorch, as before
+  onnx       ONNX Runtime on an exported copy of the model
+  onnx-int8  the ONNX export with dynamic int8 quantization
+
+Exports live under --onnx-dir (one directory per model) and are created on
+first use; the int8 file is named after its quantization config
+(onnx/model_qint8_<config>.onnx, --onnx-quant-config: avx512_vnni, avx2,
+arm64, ...). Requires sentence-transformers >= 3.2 with the onnx extra
+(`pip install "sentence-transformers[onnx]"`).
+
+Embeddings from onnx / onnx-int8 are close to, but not bit-identical with,
+the torch ones, so persistent stores key them separately (store_model_key;
+onnx-int8 keys also carry the quantization config).
+
+Parity + throughput check against torch (cosine drift per backend,
+recall@k of a search over the sampled passages, passages/s and queries/s):
+
+  python srs/encoder_backend.py \
+    --passages data/passages_full.jsonl \
+    --test-json outputs/final_dataset/DPEL/test.jsonl \
+    --model e5 --backends torch,onnx,onnx-int8 \
+    --max-passages 5000 --k 10 \
+    --out-json outputs/rag/encoder_bench_e5.json
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+ENCODER_BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_ONNX_DIR = "indexes/onnx"
+DEFAULT_QUANT_CONFIG = "avx512_vnni"
+
+
+def add_encoder_args(ap) -> None:
+    """Add --encoder-backend and the ONNX export options to an argparse parser."""
+    ap.add_argument("--encoder-backend", choices=ENCODER_BACKENDS, default="torch",
+                    help="Encoder inference backend: torch | onnx | onnx-int8 (default: torch).")
+    ap.add_argument("--onnx-dir", default=DEFAULT_ONNX_DIR,
+                    help=f"Where ONNX exports are kept (default: {DEFAULT_ONNX_DIR}).")
+    ap.add_argument("--onnx-quant-config", default=DEFAULT_QUANT_CONFIG,
+                    help="onnx-int8 quantization config: avx512_vnni | avx512 | avx2 | arm64.")
+
+
+def store_model_key(model_name: str, backend: str = "torch", quant_config: str = DEFAULT_QUANT_CONFIG) -> str:
+    """Model key for embedding stores / indexes; torch keeps the plain name."""
+    if backend == "torch":
+        return model_name
+    if backend == "onnx-int8":
+        return f"{model_name}@{backend}:{quant_config}"
+    return f"{model_name}@{backend}"
+
+
+def _export_dir(onnx_dir: str, model_name: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name).strip("_")
+    return os.path.join(onnx_dir, slug)
+
+
+def load_encoder(
+    model_name: str,
+    backend: str = "torch",
+    onnx_dir: str = DEFAULT_ONNX_DIR,
+    quant_config: str = DEFAULT_QUANT_CONFIG,
+):
+    """SentenceTransformer for `model_name` running on `backend`."""
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend: {backend} (choose from {ENCODER_BACKENDS})")
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+
+    export_dir = _export_dir(onnx_dir, model_name)
+    if not os.path.isfile(os.path.join(export_dir, "onnx", "model.onnx")):
+        t0 = time.time()
+        print(f"[encoder] exporting {model_name} to ONNX under {export_dir}...")
+        model = SentenceTransformer(model_name, backend="onnx")
+        model.save_pretrained(export_dir)
+        print(f"[encoder] exported in {time.time() - t0:.1f}s")
+    if backend == "onnx":
+        return SentenceTransformer(export_dir, backend="onnx")
+
+    qfile = f"model_qint8_{quant_config}.onnx"
+    if not os.path.isfile(os.path.join(export_dir, "onnx", qfile)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        print(f"[encoder] quantizing {model_name} to int8 ({quant_config})...")
+        # Explicit suffix: by default avx2 (unsigned weights) is saved as model_quint8_avx2.onnx
+        export_dynamic_quantized_onnx_model(
+            SentenceTransformer(export_dir, backend="onnx"), quant_config, export_dir,
+            file_suffix=f"qint8_{quant_config}",
+        )
+    return SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": f"onnx/{qfile}"})
+
+
+def load_encoder_from_args(model_name: str, args):
+    return load_encoder(model_name, args.encoder_backend, args.onnx_dir, args.onnx_quant_config)
+
+
+# ------------------------------------------------------------------
+# Parity / throughput benchmark
+# ------------------------------------------------------------------
+def _encode(model, texts: List[str], batch_size: int) -> np.ndarray:
+    return np.asarray(
+        model.encode(texts, batch_size=batch_size, show_progress_bar=False,
+                     convert_to_numpy=True, normalize_embeddings=True),
+        dtype=np.float32,
+    )
+
+
+def _top_k_rows(q: np.ndarray, p: np.ndarray, k: int) -> np.ndarray:
+    scores = q @ p.T
+    return np.argsort(-scores, axis=1, kind="stable")[:, :k]
+
+
+def benchmark(
+    model_name: str,
+    passages: List[str],
+    queries: List[str],
+    backends: List[str],
+    query_prefix: str = "",
+    passage_prefix: str = "",
+    k: int = 10,
+    batch_size: int = 64,
+    onnx_dir: str = DEFAULT_ONNX_DIR,
+    quant_config: str = DEFAULT_QUANT_CONFIG,
+) -> List[Dict[str, Any]]:
+    """
+    Per backend: passages/s and queries/s, cosine drift of passage and query
+    embeddings vs torch, and recall@k of the top-k over `passages` vs torch.
+    """
+    p_texts = [passage_prefix + t for t in passages]
+    q_texts = [query_prefix + q for q in queries]
+    ref_p = ref_q = ref_top = None
+    results = []
+    for backend in ["torch"] + [b for b in backends if b != "torch"]:
+        t0 = time.time()
+        model = load_encoder(model_name, backend, onnx_dir, quant_config)
+        load_s = time.time() - t0
+        _encode(model, p_texts[:batch_size], batch_size)  # warm-up
+
+        t0 = time.perf_counter()
+        p = _encode(model, p_texts, batch_size)
+        p_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        q = _encode(model, q_texts, batch_size)
+        q_s = time.perf_counter() - t0
+        top = _top_k_rows(q, p, k)
+
+        row: Dict[str, Any] = {
+            "backend": backend,
+            "model": model_name,
+            "n_passages": len(p_texts),
+            "n_queries": len(q_texts),
+            "passages_per_s": round(len(p_texts) / p_s, 1) if p_s > 0 else None,
+            "queries_per_s": round(len(q_texts) / q_s, 1) if q_s > 0 else None,
+            "load_s": round(load_s, 2),
+        }
+        if backend == "torch":
+            ref_p, ref_q, ref_top = p, q, top
+            torch_pps = row["passages_per_s"]
+        else:
+            p_cos = (p * ref_p).sum(axis=1)
+            q_cos = (q * ref_q).sum(axis=1)
+            hits = sum(len(set(a.tolist()) & set(b.tolist())) for a, b in zip(top, ref_top))
+            row.update({
+                "passage_cosine_mean": round(float(p_cos.mean()), 6),
+                "passage_cosine_min": round(float(p_cos.min()), 6),
+                "query_cosine_mean": round(float(q_cos.mean()), 6),
+                "query_cosine_min": round(float(q_cos.min()), 6),
+                f"recall@{k}_vs_torch": round(hits / ref_top.size, 4) if ref_top.size else None,
+                "speedup_vs_torch": round(row["passages_per_s"] / torch_pps, 2) if torch_pps else None,
+            })
+        if backend in backends:
+            results.append(row)
+            print(f"[encoder-bench] {json.dumps(row)}")
+        del model
+    return results
+
+
+def main():
+    from corpus_registry import load_corpus
+    from rag_step1_retrieve import DENSE_MODELS, load_test_items
+
+    ap = argparse.ArgumentParser(description="Encoder backend parity and throughput vs torch.")
+    ap.add_argument("--passages", required=True, help="passages_full.jsonl (or its registry)")
+    ap.add_argument("--test-json", required=True, help="JSONL with questions used as queries.")
+    ap.add_argument("--model", choices=sorted(DENSE_MODELS), default="e5")
+    ap.add_argument("--backends", default="torch,onnx,onnx-int8")
+    ap.add_argument("--max-passages", type=int, default=5000, help="Passages sampled for the check.")
+    ap.add_argument("--max-queries", type=int, default=1000)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--batch-size", type=int, default=64)
+    ap.add_argument("--onnx-dir", default=DEFAULT_ONNX_DIR)
+    ap.add_argument("--onnx-quant-config", default=DEFAULT_QUANT_CONFIG)
+    ap.add_argument("--out-json", default=None)
+    args = ap.parse_args()
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    bad = [b for b in backends if b not in ENCODER_BACKENDS]
+    if bad:
+        raise SystemExit(f"Unknown backend(s): {bad} (choose from {ENCODER_BACKENDS})")
+
+    model_name, query_prefix, passage_prefix = DENSE_MODELS[args.model]
+    corpus = load_corpus(args.passages)
+    rows = np.random.default_rng(0).permutation(len(corpus))[: args.max_passages]
+    passages = [corpus.text(int(i)) for i in sorted(rows)]
+    queries = [it["question"] for it in load_test_items(args.test_json)][: args.max_queries]
+
+    results = benchmark(
+        model_name, passages, queries, backends,
+        query_prefix=query_prefix, passage_prefix=passage_prefix,
+        k=args.k, batch_size=args.batch_size,
+        onnx_dir=args.onnx_dir, quant_config=args.onnx_quant_config,
+    )
+    if args.out_json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out_json)), exist_ok=True)
+        with open(args.out_json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[encoder-bench] wrote {args.out_json}")
+
+
+if __name__ == "__main__":
+    main()
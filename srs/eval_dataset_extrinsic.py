@@ -60,6 +60,8 @@ import sys
 from collections import defaultdict
 from typing import Dict, List, Tuple, Any
 
+from run_store import BinaryRun, is_binary_run
+
 
 # -----------------------------
 # Basic IO helpers
@@ -113,21 +115,25 @@ def load_run(path: str, k: int) -> Dict[str, List[str]]:
     Returns: run[qid] = [docid1, docid2, ...] sorted by ascending rank, truncated at k.
     """
     tmp: Dict[str, List[Tuple[int, str]]] = defaultdict(list)
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            parts = line.split()
-            if len(parts) < 6:
-                continue
-            qid, _, docid, rank_str, _, _ = parts[:6]
-            try:
-                rank = int(rank_str)
-            except Exception:
-                continue
-            if rank <= k:
-                tmp[qid].append((rank, docid))
+    if is_binary_run(path):
+        for qid, docids, ranks, _ in BinaryRun.open(path).iter_queries():
+            tmp[qid].extend((rank, docid) for rank, docid in zip(ranks, docids) if rank <= k)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                parts = line.split()
+                if len(parts) < 6:
+                    continue
+                qid, _, docid, rank_str, _, _ = parts[:6]
+                try:
+                    rank = int(rank_str)
+                except Exception:
+                    continue
+                if rank <= k:
+                    tmp[qid].append((rank, docid))
 
     runs: Dict[str, List[str]] = {}
     for qid, pairs in tmp.items():
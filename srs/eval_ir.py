@@ -7,6 +7,8 @@ from collections import defaultdict
 import math
 import os
 
+from run_store import BinaryRun, is_binary_run
+
 def load_qrels(path):
     qrels = defaultdict(dict)  # qid -> {docid: rel}
     with open(path, "r", encoding="utf-8") as f:
@@ -21,13 +23,17 @@ def load_qrels(path):
 
 def load_run(path, k=None):
     run = defaultdict(list)  # qid -> [(docid, score)]
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) < 6:
-                continue
-            qid, _, docid, rank, score, tag = parts
-            run[qid].append((docid, float(score)))
+    if is_binary_run(path):
+        for qid, docids, _, scores in BinaryRun.open(path).iter_queries():
+            run[qid].extend(zip(docids, scores))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.strip().split()
+                if len(parts) < 6:
+                    continue
+                qid, _, docid, rank, score, tag = parts
+                run[qid].append((docid, float(score)))
     # score’a göre sırala (yüksek → düşük)
     for qid in run:
         run[qid].sort(key=lambda x: x[1], reverse=True)
@@ -104,7 +110,7 @@ def main():
     for run_path in args.runs:
         run = load_run(run_path, k=args.k)
         m = metrics_for_run(qrels, run, k=args.k)
-        name = os.path.basename(run_path)
+        name = os.path.basename(run_path.rstrip("/"))
         print("{:<35} {:>10.4f} {:>10.4f} {:>10.4f}".format(
             name,
             m[f"recall@{args.k}"],
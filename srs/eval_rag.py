@@ -32,6 +32,8 @@ from typing import List, Dict, Any, Tuple
 
 import numpy as np
 
+from llm_cache import add_cache_args, cached_chat, configure_from_args
+
 # -----------------------------
 # Optional imports (NLI)
 # -----------------------------
@@ -298,7 +300,7 @@ RAG_ANSWER:
 \"\"\"{rag_answer}\"\"\"
 """.strip()
 
-    try:
+    def _call() -> str:
         resp = client.chat.completions.create(
             model=model_name,
             messages=[
@@ -309,7 +311,10 @@ RAG_ANSWER:
             temperature=0.0,
             **extra,
         )
-        content = (resp.choices[0].message.content or "").strip()
+        return (resp.choices[0].message.content or "").strip()
+
+    try:
+        content = cached_chat("openai", model_name, system_msg, user_msg, 0.0, seed, 128, _call)
     except Exception as e:
         print(f"[warn] LLM judge call failed: {e}", file=sys.stderr)
         return {}
@@ -619,7 +624,9 @@ def main():
         default="outputs/rag_eval",
         help="Directory to write per-file metrics JSON and per-qa cache.",
     )
+    add_cache_args(ap)
     args = ap.parse_args()
+    configure_from_args(args)
 
     os.makedirs(args.out_dir, exist_ok=True)
 
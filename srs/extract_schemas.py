@@ -26,10 +26,26 @@ OUTPUT FIELDS (per item):
 Policies:
 - If LLM returns no valid answer_spans and target is NOT a title:
   • Provide ONE concise span; prefer a core clause; otherwise truncate to ≤220 chars (FREEFORM).
-- If target looks like a title/heading, keep answer_spans empty.
+- If target looks like a title/heading, keep answer_spans empty. Empty and
+  title-like masks are computed up front for the whole CSV (pair_filter.py,
+  cached by CSV hash); rows that would be skipped anyway get no LLM call.
 - Dedup by a hash of core strings (source_text, target_text, hooks, reference_text).
 - Optional: --drop_title_targets to skip heading-only targets.
 - Default model: gpt-4o-mini (temperature 0.0)
+- Concurrency: rows are extracted by a thread pool whose in-flight requests are
+  gated by an AIMD limiter (llm_pool.AIMDLimiter): starts at --workers, grows by
+  ~1 per window of successful calls up to --max_workers, halves on 429 /
+  overload / timeout (or a call slower than --latency_target_s). Results are
+  consumed in input order, so dedup and the output match a serial run.
+- Pair dedup: --dedup_pairs sends each unique (source_text, target_text) pair
+  to the model once (pair_index.py) and builds every row of the pair from that
+  response (its own ids / reference fields; provenance.shared_llm_row). The
+  post-LLM content-hash dedup still applies.
+- Items are streamed to --output_jsonl as they complete, with one line per
+  consumed row in <output_jsonl>.rows.jsonl (skips, title flag, errors, and
+  the shared LLM response of a --dedup_pairs group). --resume continues a
+  partially written file after its last complete row and restores the report
+  counters and shared responses from that log.
 
 CLI example:
 python src/01_extract_schemas.py \
@@ -37,10 +53,12 @@ python src/01_extract_schemas.py \
   --output_jsonl outputs/items_merged_clean.jsonl \
   --sample_n 30 --sample_seed 13 \
   --model gpt-4o \
-  --drop_title_targets
+  --drop_title_targets \
+  --workers 4 --max_workers 32 --resume
 """
 
 import argparse
+import copy
 import csv
 import hashlib
 import json
@@ -48,11 +66,26 @@ import os
 import random
 import re
 import sys
-import time
 import uuid
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional, Tuple
 
+import pandas as pd
+
+from jsonl_log import read_complete_lines
+from llm_cache import add_cache_args, cached_chat, configure_from_args
+from llm_pool import (
+    AIMDLimiter,
+    Throughput,
+    call_with_backoff,
+    estimate_tokens,
+    get_openai_client,
+    get_rate_limiter,
+    imap_ordered,
+)
+from pair_filter import add_prefilter_args, is_title_like, prefilter_csv
+from pair_index import PairIndex, SharedResults
+
 # ---- OpenAI client (>=1.0.0 style) -------------------------------------------------
 try:
     from openai import OpenAI
@@ -99,63 +132,6 @@ def coerce_item_type(value: Optional[str]) -> str:
             return v
     return "Other"
 
-# ------------------------- Title detector (strict) -----------------------------------
-def is_title_like(s: str) -> bool:
-    """
-    Multi-signal heuristic to drop headings/captions.
-    We err on the side of dropping (strict).
-    """
-    if s is None:
-        return True
-    text = normalize_whitespace(s)
-
-    if len(text) == 0:
-        return True
-
-    # Hard length & token caps for "title-ish"
-    short_titleish = (len(text) <= 80 and text.count(" ") <= 12)
-
-    # No ending punctuation usually suggests a heading
-    no_end_punct = not re.search(r"[.!?]$", text)
-
-    # TitleCase / ALLCAPS tendency
-    tokens = text.split()
-    cap_ratio = 0.0
-    if tokens:
-        cap_like = sum(1 for t in tokens if re.match(r"^[A-Z][a-zA-Z0-9\-]*$", t))
-        cap_ratio = cap_like / max(1, len(tokens))
-
-    # Low stopword share tends to be headings
-    STOP = {
-        "the","and","of","to","in","for","on","by","with",
-        "a","an","or","as","is","are","at","from","that",
-        "its","be","this","these","those","must","shall",
-        "under","rule","section","chapter","part","article"
-    }
-    lower_tokens = [t.lower() for t in re.findall(r"[a-zA-Z]+", text)]
-    stop_share = (sum(1 for t in lower_tokens if t in STOP) / max(1, len(lower_tokens))) if lower_tokens else 0.0
-
-    # Few punctuation marks overall
-    punct_count = len(re.findall(r"[,;:]", text))
-    few_punct = punct_count == 0
-
-    # Common heading cues / structural references
-    heading_cues = bool(re.match(
-        r"^(definitions?|scope|interpretation|glossary|enforcement procedure|financial reports?)$",
-        text.strip(), re.I))
-    looks_like_rule_ref = bool(re.match(r"^(part|chapter|section|rule)\s+\d+([.\-]\d+)*", text.strip(), re.I))
-
-    score = 0
-    score += 2 if short_titleish else 0
-    score += 1 if no_end_punct else 0
-    score += 1 if cap_ratio >= 0.40 else 0
-    score += 1 if stop_share <= 0.18 else 0
-    score += 1 if few_punct else 0
-    score += 2 if heading_cues else 0
-    score += 2 if looks_like_rule_ref else 0
-
-    return score >= 3
-
 # ------------------------- Citation helpers ------------------------------------------
 def looks_like_citation(text: str) -> bool:
     if not text:
@@ -318,10 +294,14 @@ def build_client():
         raise RuntimeError("openai package not installed. `pip install openai` (>=1.0.0)")
     if not os.getenv("OPENAI_API_KEY"):
         raise RuntimeError("OPENAI_API_KEY is not set in the environment.")
-    return OpenAI()
-
-def call_llm(client, model: str, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
-    try:
+    # Shared, thread-safe client with its own connection pool
+    return get_openai_client()
+
+def call_llm(client, model: str, system_prompt: str, user_prompt: str,
+             limiter: Optional[AIMDLimiter] = None,
+             rpm: float = 0, tpm: float = 0, max_retries: int = 0) -> Dict[str, Any]:
+    def _request() -> str:
+        get_rate_limiter(model, rpm, tpm).acquire(estimate_tokens(system_prompt, user_prompt))
         resp = client.chat.completions.create(
             model=model,
             temperature=0.0,
@@ -330,7 +310,21 @@ def call_llm(client, model: str, system_prompt: str, user_prompt: str) -> Dict[s
                 {"role": "user", "content": user_prompt},
             ],
         )
-        content = (resp.choices[0].message.content or "").strip()
+        return (resp.choices[0].message.content or "").strip()
+
+    def _call() -> str:
+        try:
+            if limiter is None:
+                return call_with_backoff(_request, max_retries=max_retries)
+            return call_with_backoff(lambda: limiter.run(_request), max_retries=max_retries)
+        except Exception as e:
+            sys.stderr.write(f"[LLM ERROR] {e}\n")
+            return ""
+
+    content = cached_chat("openai", model, system_prompt, user_prompt, 0.0, None, None, _call)
+    if not content:
+        return {}
+    try:
         # try to isolate the first JSON object
         match = re.search(r"\{.*\}", content, re.S)
         if match:
@@ -350,6 +344,21 @@ def parse_args():
     p.add_argument("--sample_seed", type=int, default=13, help="Seed for sampling")
     p.add_argument("--drop_title_targets", action="store_true",
                    help="If set, skip pairs where the target looks like a title/heading.")
+    p.add_argument("--workers", type=int, default=4, help="Initial number of in-flight requests")
+    p.add_argument("--max_workers", type=int, default=32, help="Upper bound for adaptive concurrency")
+    p.add_argument("--min_workers", type=int, default=1, help="Lower bound for adaptive concurrency")
+    p.add_argument("--latency_target_s", type=float, default=0.0,
+                   help="Back off when a call takes longer than this (0 = only on 429/overload)")
+    p.add_argument("--rpm", type=float, default=0, help="Requests/minute limit (0 = unlimited)")
+    p.add_argument("--tpm", type=float, default=0, help="Tokens/minute limit, estimated from prompt length (0 = unlimited)")
+    p.add_argument("--max_retries", type=int, default=5, help="Retries with backoff on 429/5xx/timeout errors")
+    p.add_argument("--dedup_pairs", action="store_true",
+                   help="One LLM call per unique (source_text, target_text) pair, shared by its rows")
+    p.add_argument("--resume", action="store_true",
+                   help="Keep items already in --output_jsonl and continue after the last row logged")
+    p.add_argument("--verbose", action="store_true")
+    add_prefilter_args(p)
+    add_cache_args(p)
     return p.parse_args()
 
 def read_rows(path: str) -> List[Dict[str, Any]]:
@@ -357,14 +366,21 @@ def read_rows(path: str) -> List[Dict[str, Any]]:
         reader = csv.DictReader(f)
         return list(reader)
 
-def sample_rows(rows: List[Dict[str, Any]], n: Optional[int], seed: int) -> List[Dict[str, Any]]:
-    if not n or n <= 0 or n >= len(rows):
-        return rows
+def sample_row_indices(n_rows: int, n: Optional[int], seed: int) -> List[int]:
+    if not n or n <= 0 or n >= n_rows:
+        return list(range(n_rows))
     rnd = random.Random(seed)
-    idxs = list(range(len(rows)))
+    idxs = list(range(n_rows))
     rnd.shuffle(idxs)
     pick = set(idxs[:n])
-    return [rows[i] for i in range(len(rows)) if i in pick]
+    return [i for i in range(n_rows) if i in pick]
+
+def sample_rows(rows: List[Dict[str, Any]], n: Optional[int], seed: int) -> List[Dict[str, Any]]:
+    return [rows[i] for i in sample_row_indices(len(rows), n, seed)]
+
+def row_log_path(output_jsonl: str) -> str:
+    """Per-row outcome log kept next to the output for --resume."""
+    return output_jsonl + ".rows.jsonl"
 
 def ensure_outdir(path: str):
     d = os.path.dirname(os.path.abspath(path))
@@ -391,7 +407,9 @@ def answer_span_valid(span: Dict[str, Any], text: str) -> bool:
 def build_merged_item(
     row: Dict[str, Any],
     llm_out: Dict[str, Any],
-    model: str
+    model: str,
+    row_idx: Optional[int] = None,
+    target_is_title: Optional[bool] = None
 ) -> Tuple[Optional[Dict[str, Any]], List[str]]:
     errs: List[str] = []
 
@@ -453,8 +471,9 @@ def build_merged_item(
                         continue
                     valid_spans.append(sp)
 
-    # Title detection
-    target_is_title = is_title_like(target_text)
+    # Title detection (precomputed for the whole CSV by main)
+    if target_is_title is None:
+        target_is_title = is_title_like(target_text)
 
     # Fallback spans
     if not valid_spans and not target_is_title:
@@ -502,34 +521,106 @@ def build_merged_item(
 
         "provenance": {"model": model, "ts": now_iso_utc()},
     }
+    if row_idx is not None:
+        item["provenance"]["row"] = row_idx
 
     return item, errs
 
 # ----------------------- Runner -----------------------------------------------------
 def main():
     args = parse_args()
+    configure_from_args(args)
     ensure_outdir(args.output_jsonl)
 
     rows = read_rows(args.input_csv)
 
+    # Empty / title-like target masks for every CSV row (cached by CSV hash)
+    frame = pd.DataFrame({
+        col: [r.get(col) or "" for r in rows] for col in ("SourcePassage", "TargetPassage")
+    })
+    masks = prefilter_csv(frame, args.input_csv, "SourcePassage", "TargetPassage",
+                          cache_dir=args.prefilter_cache_dir or None)
+
     # Optional domain-specific filter example (kept from earlier discussions):
     # rows = [r for r in rows if (r.get("ReferenceType") or "").strip().lower() != "outsource"]
 
     # Sampling if requested
-    if args.sample_n:
-        rows = sample_rows(rows, args.sample_n, args.sample_seed or 13)
+    keep_idx = sample_row_indices(len(rows), args.sample_n, args.sample_seed or 13)
+    rows = [rows[i] for i in keep_idx]
+    empty = masks["empty"].to_numpy()[keep_idx]
+    title_like = masks["title_like_target"].to_numpy()[keep_idx]
+    # Rows build_merged_item would skip anyway need no LLM call
+    no_call = empty | (title_like & bool(args.drop_title_targets))
 
     client = build_client()
-    rng = random.Random(args.sample_seed or 13)
 
-    out_items: List[Dict[str, Any]] = []
     details: List[Dict[str, Any]] = []
     skipped_rows = 0
     title_targets = 0
     errors_found = 0
+    items_emitted = 0
     seen_hashes: set = set()
 
-    for idx, row in enumerate(rows):
+    # Resume: keep complete items, rebuild the dedup set from them and restart
+    # after the last row logged. A row logged as emitted whose item never made
+    # it to the output (killed in between) is redone.
+    start_row = 0
+    resumed_items = 0
+    row_log = row_log_path(args.output_jsonl)
+    logged: Dict[int, Dict[str, Any]] = {}
+    if args.resume:
+        done_items = list(read_complete_lines(args.output_jsonl))
+        item_rows = set()
+        for it in done_items:
+            seen_hashes.add(make_hash_key(it))
+            row_idx = (it.get("provenance") or {}).get("row")
+            if isinstance(row_idx, int):
+                item_rows.add(row_idx)
+                start_row = max(start_row, row_idx + 1)
+        if done_items and not item_rows:
+            raise SystemExit(f"{args.output_jsonl} has no provenance.row; cannot resume it (rerun without --resume)")
+        for rec in read_complete_lines(row_log):
+            row_idx = rec.get("row")
+            if isinstance(row_idx, int) and (not rec.get("emitted") or row_idx in item_rows):
+                logged[row_idx] = rec
+        if logged:
+            start_row = max(start_row, max(logged) + 1)
+        elif done_items:
+            print(f"[warn] resume: {row_log} missing; report counters cover this run only", flush=True)
+        for row_idx in sorted(logged):
+            if row_idx >= start_row:
+                continue
+            rec = logged[row_idx]
+            title_targets += bool(rec.get("target_is_title"))
+            skipped_rows += bool(rec.get("skipped"))
+            if rec.get("errors"):
+                details.append({"row": row_idx, "errors": rec["errors"]})
+                errors_found += not rec.get("skipped")
+        resumed_items = items_emitted = len(done_items)
+        print(f"[info] resume: {resumed_items} items already written; continuing at row {start_row}/{len(rows)}",
+              flush=True)
+
+    limiter = AIMDLimiter(initial=args.workers, min_limit=args.min_workers, max_limit=args.max_workers,
+                          latency_target_s=args.latency_target_s)
+
+    todo = range(start_row, len(rows))
+
+    # Rows repeating an earlier (source_text, target_text) pair reuse its response.
+    # The index covers every row, so a group whose first row came before the
+    # resume point reuses the response logged for it instead of calling again.
+    pair_index = shared = None
+    if args.dedup_pairs:
+        pair_index = PairIndex.build((i, rows[i].get("SourcePassage"), rows[i].get("TargetPassage"))
+                                     for i in range(len(rows)))
+        seeded = {pair_index.key_of[r]: rec["llm"] for r, rec in logged.items()
+                  if r < start_row and "llm" in rec}
+        shared = SharedResults(pair_index, rows=todo, seeded=seeded)
+        print(f"[info] dedup_pairs: {len(pair_index.groups)} unique pairs for {len(rows)} rows", flush=True)
+
+    def extract(idx: int) -> Dict[str, Any]:
+        if no_call[idx] or (shared is not None and not shared.is_caller(idx)):
+            return {}
+        row = rows[idx]
         user_prompt = USER_PROMPT_TEMPLATE.format(
             reference_type=(row.get("ReferenceType") or "").strip(),
             reference_text=(row.get("ReferenceText") or "").strip(),
@@ -540,54 +631,87 @@ def main():
             target_passage_ref=(row.get("TargetPassageID") or "").strip(),
             target_text=(row.get("TargetPassage") or "").strip(),
         )
-        llm_json = call_llm(client, args.model, SYSTEM_PROMPT, user_prompt)
-
-        item, errs = build_merged_item(row, llm_json, args.model)
-        if item is None:
-            details.append({"row": idx, "errors": errs or ["skipped"]})
-            skipped_rows += 1
-            continue
-
-        # Optionally drop title targets
-        if item.get("target_is_title"):
-            title_targets += 1
-            if args.drop_title_targets:
-                details.append({"row": idx, "errors": ["skipped: target_is_title"]})
+        return call_llm(client, args.model, SYSTEM_PROMPT, user_prompt, limiter=limiter,
+                        rpm=args.rpm, tpm=args.tpm, max_retries=args.max_retries)
+
+    progress = Throughput(len(todo), label="extract", unit="rows", enabled=args.verbose)
+
+    # The pool can grow to --max_workers; the limiter decides how many of its
+    # threads are actually talking to the API at any time.
+    mode = "a" if args.resume else "w"
+    with open(args.output_jsonl, mode, encoding="utf-8") as f, open(row_log, mode, encoding="utf-8") as lf:
+        for idx, llm_json in zip(todo, imap_ordered(extract, todo, concurrency=limiter.max_limit)):
+            progress.update()
+            shared_row = None
+            rec: Dict[str, Any] = {"row": idx}
+            if shared is not None:
+                if shared.is_caller(idx) and len(pair_index.members(idx)) > 1:
+                    rec["llm"] = copy.deepcopy(llm_json)
+                llm_json = shared.resolve(idx, llm_json)
+                if not shared.is_caller(idx):
+                    shared_row = shared.source_row(idx)
+                    # build_merged_item edits the spans in place
+                    llm_json = copy.deepcopy(llm_json)
+            item, errs = build_merged_item(rows[idx], llm_json, args.model, row_idx=idx,
+                                           target_is_title=bool(title_like[idx]))
+            if item is not None and shared_row is not None:
+                item["provenance"]["shared_llm_row"] = shared_row
+
+            if item is None:
+                rec["errors"] = errs or ["skipped"]
+            elif item.get("target_is_title"):
+                # Optionally drop title targets
+                rec["target_is_title"] = True
+                if args.drop_title_targets:
+                    rec["errors"] = ["skipped: target_is_title"]
+            if item is not None and "errors" not in rec:
+                # Soft dedupe
+                k = make_hash_key(item)
+                if k in seen_hashes:
+                    rec["errors"] = ["deduped: identical content key"]
+                else:
+                    seen_hashes.add(k)
+                    rec["emitted"] = True
+                    if errs:
+                        rec["errors"] = errs
+
+            if rec.get("errors"):
+                details.append({"row": idx, "errors": rec["errors"]})
+            title_targets += bool(rec.get("target_is_title"))
+            if not rec.get("emitted"):
+                rec["skipped"] = True
                 skipped_rows += 1
-                continue
-
-        # Soft dedupe
-        k = make_hash_key(item)
-        if k in seen_hashes:
-            details.append({"row": idx, "errors": ["deduped: identical content key"]})
-            skipped_rows += 1
-            continue
-        seen_hashes.add(k)
-
-        if errs:
-            details.append({"row": idx, "errors": errs})
-            errors_found += 1
-
-        out_items.append(item)
+            elif errs:
+                errors_found += 1
 
-        # Gentle pacing
-        time.sleep(0.02 + rng.random() * 0.02)
+            # Log the row before its item: a crash in between only redoes it
+            lf.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            lf.flush()
+            if rec.get("emitted"):
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+                f.flush()
+                items_emitted += 1
 
-    # Write JSONL
-    with open(args.output_jsonl, "w", encoding="utf-8") as f:
-        for it in out_items:
-            f.write(json.dumps(it, ensure_ascii=False) + "\n")
+    throughput = progress.summary()
 
     # Summary (light)
     summary = {
         "input_rows": len(rows),
-        "items_emitted": len(out_items),
+        "items_emitted": items_emitted,
+        "resumed_items": resumed_items,
         "skipped_rows": skipped_rows,
         "title_targets_seen": title_targets,
         "drop_title_targets": bool(args.drop_title_targets),
         "model": args.model,
         "timestamp": now_iso_utc(),
         "errors_logged": errors_found,
+        # Calls made: one per group started before the resume point, one per caller since
+        "llm_calls_saved_by_dedup_pairs": (
+            len(pair_index.key_of) - len(shared.caller)
+            - sum(1 for rows_ in pair_index.groups.values() if rows_[0] < start_row)
+        ) if pair_index else 0,
+        "concurrency": limiter.summary(),
+        "throughput": throughput,
     }
     report_path = os.path.join(os.path.dirname(os.path.abspath(args.output_jsonl)), "extract_report_merged.json")
     with open(report_path, "w", encoding="utf-8") as rf:
@@ -2,48 +2,77 @@
 # fuse_rrf.py
 # -*- coding: utf-8 -*-
 
+"""
+Fuse any number of TREC runs or .brun binary runs (see rank_fusion.py for
+the methods and run_store.py for the binary format).
+
+Two-way RRF, as before:
+  python srs/fuse_rrf.py --bm25 runs_full/kept/bm25.txt --dense runs_full/kept/e5.txt \
+    --output runs_full/kept/hybrid_rrf_bm25_e5.txt --k 100 --rrf-k 60
+
+N-way, weighted, with per-run cutoffs:
+  python srs/fuse_rrf.py --run runs_full/kept/bm25.txt --run runs_full/kept/e5.txt \
+    --run runs_full/kept/bge.txt --weights 1,1,0.5 --depths 100,100,50 \
+    --method combmnz --norm minmax --output runs_full/kept/fused.txt
+"""
+
 import argparse
-from collections import defaultdict
-
-def read_run(path):
-    runs = defaultdict(list)  # qid -> [(docid, rank, score)]
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) != 6:
-                continue
-            qid, _, docid, rank, score, tag = parts
-            runs[qid].append((docid, int(rank), float(score)))
-    # rank'e göre sırala (emin olmak için)
-    for qid in runs:
-        runs[qid].sort(key=lambda x: x[1])
-    return runs
+import time
+
+from rank_fusion import FUSION_METHODS, NORM_METHODS, ArrayRun, DocVocab, fuse_runs
+
+
+def parse_list(spec, n, cast, name):
+    if not spec:
+        return None
+    vals = [None if v.strip().lower() in ("", "all", "none") else cast(v) for v in spec.split(",")]
+    if len(vals) != n:
+        raise SystemExit(f"--{name} has {len(vals)} values for {n} runs")
+    return vals
+
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--bm25", required=True)
-    ap.add_argument("--dense", required=True)
+    ap.add_argument("--run", action="append", default=[], help="TREC run to fuse (repeatable)")
+    ap.add_argument("--bm25", help="Shorthand for the first --run")
+    ap.add_argument("--dense", help="Shorthand for the second --run")
     ap.add_argument("--output", required=True)
     ap.add_argument("--k", type=int, default=100, help="max docs per query in fused run")
+    ap.add_argument("--method", default="rrf", choices=FUSION_METHODS)
     ap.add_argument("--rrf-k", type=int, default=60, help="RRF constant")
+    ap.add_argument("--norm", default="minmax", choices=NORM_METHODS,
+                    help="per-query score normalization for combsum / combmnz")
+    ap.add_argument("--weights", default=None, help="comma-separated weight per run (default: all 1)")
+    ap.add_argument("--depths", default=None,
+                    help="comma-separated rank cutoff per run ('all' = no cutoff)")
+    ap.add_argument("--tag", default=None, help="run tag (default: the method name)")
     args = ap.parse_args()
 
-    bm25 = read_run(args.bm25)
-    dense = read_run(args.dense)
+    paths = [p for p in (args.bm25, args.dense) if p] + args.run
+    if len(paths) < 2:
+        ap.error("need at least two runs (--bm25/--dense or --run ...)")
+    weights = parse_list(args.weights, len(paths), float, "weights")
+    depths = parse_list(args.depths, len(paths), int, "depths")
+    tag = args.tag or args.method
 
-    qids = sorted(set(bm25.keys()) | set(dense.keys()))
+    t0 = time.time()
+    vocab = DocVocab()
+    runs = [ArrayRun.load(p, vocab) for p in paths]
+    print(f"[fuse] loaded {len(runs)} runs ({len(vocab.names)} distinct docs) in {time.time() - t0:.1f}s")
 
+    n_queries = 0
     with open(args.output, "w", encoding="utf-8") as out:
-        for qid in qids:
-            scores = defaultdict(float)
-            for docid, rank, _ in bm25.get(qid, []):
-                scores[docid] += 1.0 / (args.rrf_k + rank)
-            for docid, rank, _ in dense.get(qid, []):
-                scores[docid] += 1.0 / (args.rrf_k + rank)
-
-            ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:args.k]
-            for rank, (docid, score) in enumerate(ranked, start=1):
-                out.write(f"{qid} Q0 {docid} {rank} {score:.6f} rrf\n")
+        for qid, ids, scores in fuse_runs(
+            runs, k=args.k, method=args.method, weights=weights, depths=depths,
+            rrf_k=args.rrf_k, norm=args.norm,
+        ):
+            out.write("".join(
+                f"{qid} Q0 {vocab.names[d]} {rank} {s:.6f} {tag}\n"
+                for rank, (d, s) in enumerate(zip(ids.tolist(), scores.tolist()), start=1)
+            ))
+            n_queries += 1
+    print(f"[fuse] {args.method}: {n_queries} queries in {time.time() - t0:.1f}s -> {args.output}")
+
 
 if __name__ == "__main__":
     main()
@@ -10,7 +10,9 @@ LLM-as-Judge validation to ensure each Q&A truly relies on BOTH texts.
 
 Key behaviors:
 - Filters to ReferenceType ∈ {Internal, External} (if the column exists).
-- Drops title-like targets (strict heading detection).
+- Drops title-like targets (strict heading detection). Empty / title-like
+  masks are computed column-wise for the whole CSV and cached by CSV hash
+  (pair_filter.py); only surviving rows are iterated.
 - Sends FULL source/target text in prompts (no excerpts).
 - Two personas: professional & basic. Supports >1 question per (pair, persona).
 - Optional LLM-as-Judge validation: keep QAs only if neither SOURCE nor TARGET
@@ -20,6 +22,21 @@ Key behaviors:
 - REAL dataset row sampling: --row_sample_n/--row_sample_seed
 - Hard cap processed pairs: --max_pairs
 - Dry run / verbose progress supported.
+- Concurrent generation: --workers N keeps up to N requests in flight on one
+  shared OpenAI client (--rpm/--tpm rate limits, backoff on 429/5xx).
+  Results are consumed in input order, so --dedup and the output file are
+  the same as a serial run.
+- Pair dedup: --dedup_pairs calls the model once per unique (source_text,
+  target_text) pair (see pair_index.py) and reuses the response for the
+  other rows of the pair, with their own [#SRC:…]/[#TGT:…] ids; those QAs
+  record the row the generation came from in debug_context.shared_generation.
+  With --dedup / --near_dup_index, questions a shared row repeats from its
+  pair's representative are exempt from question dedup (they would all be
+  dropped otherwise); qas_from_shared_generations reports how many were kept.
+- Near-duplicate questions: --near_dup_index DIR rejects questions whose
+  MinHash-estimated Jaccard with an earlier question (this run or any run
+  that used the same index, see question_lsh.py) is >= --near_dup_threshold.
+  Rejected clusters are written next to --report_json.
 
 Requires: openai>=1.40.0. Set OPENAI_API_KEY in your env.
 """
@@ -36,6 +53,19 @@ from typing import Dict, List, Tuple, Any, Optional
 
 import pandas as pd
 
+from llm_cache import add_cache_args, cached_chat, configure_from_args
+from llm_pool import (
+    Throughput,
+    call_with_backoff,
+    estimate_tokens,
+    get_openai_client,
+    get_rate_limiter,
+    imap_ordered,
+)
+from pair_filter import add_prefilter_args, prefilter_csv
+from pair_index import PairIndex, SharedResults
+from question_lsh import QuestionLSH, add_near_dup_args, finish_near_dup, near_dup_from_args, save_near_dup
+
 # -----------------------------
 # Column normalization (aliases)
 # -----------------------------
@@ -73,80 +103,22 @@ def has_both_tags(answer: str, sid: str, tid: str) -> bool:
     return (f"[#SRC:{sid}]" in a) and (f"[#TGT:{tid}]" in a)
 
 
-# -----------------------------
-# Title-like detector (strict)
-# -----------------------------
-def is_title_like(s: str) -> bool:
-    """
-    Multi-signal heuristic to drop headings/captions.
-    We err on the side of dropping (strict).
-    """
-    if s is None:
-        return True
-    text = normalize_whitespace(s)
-
-    if len(text) == 0:
-        return True
-
-    # Hard length & token caps for "title-ish"
-    short_titleish = (len(text) <= 80 and text.count(" ") <= 12)
-
-    # No ending punctuation usually suggests a heading
-    no_end_punct = not re.search(r"[.!?]$", text)
-
-    # TitleCase / ALLCAPS tendency
-    tokens = text.split()
-    cap_ratio = 0.0
-    if tokens:
-        cap_like = sum(1 for t in tokens if re.match(r"^[A-Z][a-zA-Z0-9\-]*$", t))
-        cap_ratio = cap_like / max(1, len(tokens))
-
-    # Low stopword share tends to be headings
-    STOP = {
-        "the","and","of","to","in","for","on","by","with",
-        "a","an","or","as","is","are","at","from","that",
-        "its","be","this","these","those","must","shall",
-        "under","rule","section","chapter","part","article"
-    }
-    lower_tokens = [t.lower() for t in re.findall(r"[a-zA-Z]+", text)]
-    stop_share = (sum(1 for t in lower_tokens if t in STOP) / max(1, len(lower_tokens))) if lower_tokens else 0.0
-
-    # Few punctuation marks overall
-    punct_count = len(re.findall(r"[,;:]", text))
-    few_punct = punct_count == 0
-
-    # Common heading cues / structural references
-    heading_cues = bool(re.match(
-        r"^(definitions?|scope|interpretation|glossary|enforcement procedure|financial reports?)$",
-        text.strip(), re.I))
-    looks_like_rule_ref = bool(re.match(r"^(part|chapter|section|rule)\s+\d+([.\-]\d+)*", text.strip(), re.I))
-
-    score = 0
-    score += 2 if short_titleish else 0
-    score += 1 if no_end_punct else 0
-    score += 1 if cap_ratio >= 0.40 else 0
-    score += 1 if stop_share <= 0.18 else 0
-    score += 1 if few_punct else 0
-    score += 2 if heading_cues else 0
-    score += 2 if looks_like_rule_ref else 0
-
-    return score >= 3
 
 # -----------------------------
 # OpenAI model call
 # -----------------------------
 def call_llm(model: str, system_prompt: str, user_prompt: str,
              max_tokens: int = 1600, temperature: float = 0.3,
-             seed: Optional[int] = None) -> str:
+             seed: Optional[int] = None,
+             rpm: float = 0, tpm: float = 0, max_retries: int = 0) -> str:
     """One-shot chat completion. Returns content string or '' on failure."""
-    try:
-        from openai import OpenAI
-        client = OpenAI()
+    def _request() -> str:
+        get_rate_limiter(model, rpm, tpm).acquire(estimate_tokens(system_prompt, user_prompt, max_tokens=max_tokens))
         extra = {}
         if seed is not None:
             extra["seed"] = seed
 
-        resp = client.chat.completions.create(
+        resp = get_openai_client().chat.completions.create(
             model=model,
             temperature=temperature,
             max_tokens=max_tokens,
@@ -157,9 +129,15 @@ def call_llm(model: str, system_prompt: str, user_prompt: str,
             ],
         )
         return (resp.choices[0].message.content or "").strip()
-    except Exception as e:
-        sys.stderr.write(f"[LLM ERROR] {e}\n")
-        return ""
+
+    def _call() -> str:
+        try:
+            return call_with_backoff(_request, max_retries=max_retries)
+        except Exception as e:
+            sys.stderr.write(f"[LLM ERROR] {e}\n")
+            return ""
+
+    return cached_chat("openai", model, system_prompt, user_prompt, temperature, seed, max_tokens, _call)
 # -----------------------------
 # Prompt builder
 # -----------------------------
@@ -276,10 +254,15 @@ def collect_qas(
     reference_type: Optional[str],
     reference_text: Optional[str],
     max_q_per_persona: int,
-    dedup_set: Optional[set]
+    dedup_set: Optional[set],
+    near_dup: Optional[QuestionLSH] = None,
+    shared_keys: Optional[set] = None
 ) -> Tuple[List[Dict[str, Any]], int, int]:
     """
     Returns: (qa_objects, dropped_dupe_qs, kept_count)
+    Near-duplicates rejected by `near_dup` are counted by the index itself.
+    shared_keys: normalized questions kept for this row's pair group (rows
+    reusing a shared response); those skip dedup and near-dup checks.
     """
     out: List[Dict[str, Any]] = []
     dropped_dupe = 0
@@ -305,15 +288,20 @@ def collect_qas(
 
 
             # Optional global dedup by normalized question text
-            if dedup_set is not None:
-                key = normalize_question_for_dedup(q)
+            key = normalize_question_for_dedup(q)
+            from_group = shared_keys is not None and key in shared_keys
+            if dedup_set is not None and not from_group:
                 if key in dedup_set:
                     dropped_dupe += 1
                     continue
                 dedup_set.add(key)
 
+            qa_id = rand_uuid()
+            if near_dup is not None and not from_group and near_dup.check_and_add(qa_id, q) is not None:
+                continue
+
             qa_obj = {
-                "qa_id": rand_uuid(),
+                "qa_id": qa_id,
                 "persona": persona,
                 "question": q,
                 "expected_answer": a,
@@ -334,6 +322,13 @@ def collect_qas(
 
     return out, dropped_dupe, kept
 
+def retag_shared_content(content: str, rep_pair: Dict[str, Any], pair: Dict[str, Any]) -> str:
+    """Point the evidence tags of a response generated for `rep_pair` at `pair`'s passage ids."""
+    if not content:
+        return content
+    content = content.replace(f"[#SRC:{rep_pair['source_passage_id']}]", f"[#SRC:{pair['source_passage_id']}]")
+    return content.replace(f"[#TGT:{rep_pair['target_passage_id']}]", f"[#TGT:{pair['target_passage_id']}]")
+
 # -----------------------------
 # Main pipeline
 # -----------------------------
@@ -356,7 +351,19 @@ def main():
     ap.add_argument("--row_sample_seed", type=int, default=13, help="Random seed for row sampling")
     ap.add_argument("--max_pairs", type=int, default=None, help="Hard cap on number of candidate pairs processed")
 
+    # Concurrency
+    ap.add_argument("--workers", type=int, default=1, help="Concurrent generation requests (default 1 = serial)")
+    ap.add_argument("--rpm", type=float, default=0, help="Requests/minute limit (0 = unlimited)")
+    ap.add_argument("--tpm", type=float, default=0, help="Tokens/minute limit, estimated from prompt length (0 = unlimited)")
+    ap.add_argument("--max_retries", type=int, default=5, help="Retries with backoff on 429/5xx/timeout errors")
+    ap.add_argument("--dedup_pairs", action="store_true",
+                    help="One generation call per unique (source_text, target_text) pair, shared by its rows")
+    add_prefilter_args(ap)
+    add_near_dup_args(ap)
+    add_cache_args(ap)
+
     args = ap.parse_args()
+    configure_from_args(args)
 
     # Load
     df = pd.read_csv(args.input_csv, dtype=str, keep_default_na=False)
@@ -380,6 +387,10 @@ def main():
         sys.stderr.write(f"ERROR: Missing required columns (aliases checked): {missing}\n")
         sys.exit(1)
 
+    # Empty / title-like masks for every CSV row (cached by CSV hash)
+    masks = prefilter_csv(df, args.input_csv, colmap["source_text"], colmap["target_text"],
+                          cache_dir=args.prefilter_cache_dir or None)
+
     # Filter ReferenceType if present
     if colmap.get("reference_type"):
         ref_col = colmap["reference_type"]
@@ -394,14 +405,19 @@ def main():
         df = df.head(args.max_pairs).copy()
 
     # Stats
+    empty = masks["empty"].loc[df.index].to_numpy()
+    title_like = masks["title_like_target"].loc[df.index].to_numpy()
+    keep = ~empty & ~title_like
+    candidates = df[keep]
+
     rows_loaded = len(df)
     pairs_processed = 0
     qas_created = 0
     dropped_dupe_qs = 0
-    skipped_empty_text = 0
+    skipped_empty_text = int(empty.sum())
     skipped_model_fail = 0
-    dropped_title_like_targets = 0
-    kept_candidates = 0
+    dropped_title_like_targets = int((~empty & title_like).sum())
+    kept_candidates = int(keep.sum())
 
     # Dedup set
     dedup_set = set() if args.dedup else None
@@ -416,16 +432,13 @@ def main():
 
     # Dry-run: only scan/filter; no model calls; no output writing
     if args.dry_run:
-        for _, row in df.iterrows():
-            source_text = normalize_whitespace(str(row[colmap["source_text"]]))
-            target_text = normalize_whitespace(str(row[colmap["target_text"]]))
-            if looks_like_empty(source_text) or looks_like_empty(target_text):
-                skipped_empty_text += 1
-                continue
-            if is_title_like(target_text):
-                dropped_title_like_targets += 1
-                continue
-            kept_candidates += 1
+        pair_index = PairIndex.build(
+            (i, source_text, target_text)
+            for i, (source_text, target_text) in enumerate(zip(
+                candidates[colmap["source_text"]].tolist(), candidates[colmap["target_text"]].tolist()
+            ))
+        )
+        pair_stats = pair_index.stats()
         report = {
             "rows_loaded": rows_loaded,
             "kept_candidates": kept_candidates,
@@ -435,92 +448,152 @@ def main():
             "skipped_empty_text": skipped_empty_text,
             "skipped_model_fail": 0,
             "dropped_title_like_targets": dropped_title_like_targets,
+            "unique_pairs": pair_stats["unique_pairs"],
+            "llm_calls_saved_by_dedup_pairs": pair_stats["llm_calls_saved"],
+            "duplicate_pair_groups": pair_stats["duplicate_groups"],
         }
         print(json.dumps(report, indent=2))
         return
 
-    # Real generation
-    with open(out_path, "w", encoding="utf-8") as outf:
-        for _, row in df.iterrows():
-            source_text = normalize_whitespace(str(row[colmap["source_text"]]))
-            target_text = normalize_whitespace(str(row[colmap["target_text"]]))
-
-            if looks_like_empty(source_text) or looks_like_empty(target_text):
-                skipped_empty_text += 1
-                continue
-
-            # Drop title-like targets
-            if is_title_like(target_text):
-                dropped_title_like_targets += 1
-                continue
-
-            kept_candidates += 1
-            source_passage_id = str(row[colmap["source_passage_id"]])
-            target_passage_id = str(row[colmap["target_passage_id"]])
-
-            reference_type = str(row[colmap["reference_type"]]) if colmap.get("reference_type") else None
-            reference_text = str(row[colmap["reference_text"]]) if colmap.get("reference_text") else None
-
-            pairs_processed += 1
+    near_dup = near_dup_from_args(args, out_path)
 
+    # Real generation: filter pairs and build prompts first ...
+    pairs: List[Dict[str, Any]] = []
+    # (empty and title-like rows were already masked out above)
+    n_cand = len(candidates)
+    columns = {
+        name: candidates[colmap[name]].astype(str).tolist() if colmap.get(name) else [None] * n_cand
+        for name in COLUMN_ALIASES
+    }
+    for i in range(n_cand):
+        source_text = normalize_whitespace(columns["source_text"][i])
+        target_text = normalize_whitespace(columns["target_text"][i])
+        source_passage_id = columns["source_passage_id"][i]
+        target_passage_id = columns["target_passage_id"][i]
+
+        pairs.append({
+            "source_text": source_text,
+            "target_text": target_text,
+            "source_passage_id": source_passage_id,
+            "target_passage_id": target_passage_id,
+            "reference_type": columns["reference_type"][i],
+            "reference_text": columns["reference_text"][i],
             # Build prompt (now passes IDs so the model can emit [#SRC:…]/[#TGT:…] tags)
-            user_prompt = build_prompt(
+            "user_prompt": build_prompt(
                 source_text=source_text,
                 target_text=target_text,
                 source_id=source_passage_id,
                 target_id=target_passage_id,
                 max_per_persona=args.max_q_per_pair,
                 sample_n=args.sample_n
-            )
-
-            # Call generator LLM
-            content = call_llm(
-                model=args.model,
-                system_prompt=SYSTEM_PROMPT_GEN,
-                user_prompt=user_prompt,
-                max_tokens=2000,
-                temperature=args.temperature,
-                seed=args.seed
-            )
-            if not content:
-                skipped_model_fail += 2 * args.max_q_per_pair  # rough count
-                continue
+            ),
+        })
+
+    # Rows repeating an earlier (source_text, target_text) pair reuse its response
+    pair_index = shared = None
+    group_keys: Dict[str, set] = {}  # pair key -> normalized questions kept for its representative
+    qas_from_shared = 0
+    if args.dedup_pairs:
+        pair_index = PairIndex.build((i, p["source_text"], p["target_text"]) for i, p in enumerate(pairs))
+        shared = SharedResults(pair_index)
+        for i, p in enumerate(pairs):
+            p["row"] = i
+            p["shared_from"] = None if pair_index.is_representative(i) else pair_index.representative(i)
+
+    # ... then call the generator LLM (concurrently with --workers) and
+    # consume the results in input order so dedup stays deterministic.
+    def generate(pair: Dict[str, Any]) -> str:
+        if pair.get("shared_from") is not None:
+            return ""
+        return call_llm(
+            model=args.model,
+            system_prompt=SYSTEM_PROMPT_GEN,
+            user_prompt=pair["user_prompt"],
+            max_tokens=2000,
+            temperature=args.temperature,
+            seed=args.seed,
+            rpm=args.rpm,
+            tpm=args.tpm,
+            max_retries=args.max_retries
+        )
 
-            llm_obj = parse_llm_json(content)
-            if not llm_obj:
-                skipped_model_fail += 2 * args.max_q_per_pair
-                continue
+    if args.verbose:
+        print(f"[info] generating for {len(pairs)} pairs with {args.workers} worker(s)", flush=True)
+    progress = Throughput(len(pairs), label="DPEL", unit="pairs", enabled=args.verbose)
 
-            # Collect QAs
-            qa_objs, dup_ct, kept_ct = collect_qas(
-                llm_obj=llm_obj,
-                source_text=source_text,
-                target_text=target_text,
-                source_passage_id=source_passage_id,
-                target_passage_id=target_passage_id,
-                reference_type=reference_type,
-                reference_text=reference_text,
-                max_q_per_persona=args.max_q_per_pair,
-                dedup_set=dedup_set
-            )
-
-            dropped_dupe_qs += dup_ct
-            qas_created += kept_ct
-
-            # Stamp run metadata on each item
-            now_ts = int(time.time())
-            for qa in qa_objs:
-                qa["method"] = "DPEL"
-                qa["gen_model"] = args.model
-                qa["gen_ts"] = now_ts
-                qa["run_seed"] = args.seed
-
-                outf.write(json.dumps(qa, ensure_ascii=False) + "\n")
-
-            if args.verbose and pairs_processed % progress_every == 0:
-                print(f"[progress] {pairs_processed}/{rows_loaded} rows scanned "
-                      f"| kept_candidates={kept_candidates} | qas={qas_created}",
-                      flush=True)
+    # Saved even if generation fails, so the questions already written stay indexed
+    try:
+        with open(out_path, "w", encoding="utf-8") as outf:
+            for pair, content in zip(pairs, imap_ordered(generate, pairs, concurrency=args.workers)):
+                pairs_processed += 1
+                progress.update()
+
+                rep_pair = None
+                if shared is not None:
+                    content = shared.resolve(pair["row"], content)
+                    if pair["shared_from"] is not None:
+                        rep_pair = pairs[pair["shared_from"]]
+                        content = retag_shared_content(content, rep_pair, pair)
+
+                if not content:
+                    skipped_model_fail += 2 * args.max_q_per_pair  # rough count
+                    continue
+
+                llm_obj = parse_llm_json(content)
+                if not llm_obj:
+                    skipped_model_fail += 2 * args.max_q_per_pair
+                    continue
+
+                # Collect QAs
+                qa_objs, dup_ct, kept_ct = collect_qas(
+                    llm_obj=llm_obj,
+                    source_text=pair["source_text"],
+                    target_text=pair["target_text"],
+                    source_passage_id=pair["source_passage_id"],
+                    target_passage_id=pair["target_passage_id"],
+                    reference_type=pair["reference_type"],
+                    reference_text=pair["reference_text"],
+                    max_q_per_persona=args.max_q_per_pair,
+                    dedup_set=dedup_set,
+                    near_dup=near_dup,
+                    shared_keys=group_keys.get(pair_index.key_of[pair["row"]], set()) if rep_pair is not None else None
+                )
+
+                dropped_dupe_qs += dup_ct
+                qas_created += kept_ct
+                if pair_index is not None:
+                    if rep_pair is None:
+                        group_keys[pair_index.key_of[pair["row"]]] = {
+                            normalize_question_for_dedup(qa["question"]) for qa in qa_objs
+                        }
+                    else:
+                        qas_from_shared += kept_ct
+
+                # Stamp run metadata on each item
+                now_ts = int(time.time())
+                for qa in qa_objs:
+                    if rep_pair is not None:
+                        qa["debug_context"]["shared_generation"] = {
+                            "source_passage_id": rep_pair["source_passage_id"],
+                            "target_passage_id": rep_pair["target_passage_id"],
+                            "reference_text": rep_pair["reference_text"],
+                        }
+                    qa["method"] = "DPEL"
+                    qa["gen_model"] = args.model
+                    qa["gen_ts"] = now_ts
+                    qa["run_seed"] = args.seed
+
+                    outf.write(json.dumps(qa, ensure_ascii=False) + "\n")
+                outf.flush()
+
+                if args.verbose and pairs_processed % progress_every == 0:
+                    print(f"[progress] {pairs_processed}/{len(pairs)} pairs "
+                          f"| kept_candidates={kept_candidates} | qas={qas_created}",
+                          flush=True)
+    finally:
+        save_near_dup(near_dup, args.near_dup_index)
+
+    throughput = progress.summary()
 
     # Report
     report = {
@@ -532,7 +605,18 @@ def main():
         "skipped_empty_text": skipped_empty_text,
         "skipped_model_fail": skipped_model_fail,
         "dropped_title_like_targets": dropped_title_like_targets,
+        "workers": args.workers,
+        "throughput": throughput,
     }
+    if pair_index is not None:
+        pair_stats = pair_index.stats()
+        report["unique_pairs"] = pair_stats["unique_pairs"]
+        report["llm_calls_saved_by_dedup_pairs"] = pair_stats["llm_calls_saved"]
+        report["qas_from_shared_generations"] = qas_from_shared
+    near_dup_stats = finish_near_dup(near_dup, args.near_dup_index, rep_path)
+    if near_dup_stats is not None:
+        report["dropped_near_dupe_qs"] = near_dup_stats["removed"]
+        report["near_dup"] = near_dup_stats
     with open(rep_path, "w", encoding="utf-8") as rpf:
         json.dump(report, rpf, indent=2, ensure_ascii=False)
 
@@ -14,6 +14,14 @@ Key features vs DPEL:
 - Skips degenerate pairs (identical IDs or identical texts).
 - Optionally forbid citations in Q/A text (while keeping tags).
 - DPEL-style answer length (170–230 words; hard minimum 160).
+- Concurrent generation (as in DPEL): --workers/--concurrency N keeps up to N
+  requests in flight on one shared OpenAI client (--rpm/--tpm rate limits,
+  backoff on 429/5xx). Results are consumed in input order, so --dedup and the
+  output file are the same as a serial run; the output is flushed per item and
+  --report_json is rewritten with the running counters as items complete.
+- Near-duplicate questions (as in DPEL): --near_dup_index DIR rejects
+  paraphrases of questions already in the MinHash-LSH index (question_lsh.py),
+  which can be shared with DPEL runs; clusters are written next to --report_json.
 
 CLI example:
 python3 srs/generate_qas_method_schema.py \
@@ -32,6 +40,8 @@ python3 srs/generate_qas_method_schema.py \
   --drop_title_targets \
   --dual_anchors_mode always \
   --no_citations \
+  --workers 8 \
+  --near_dup_index indexes/question_lsh \
   --verbose
 """
 
@@ -45,6 +55,17 @@ import uuid
 import time
 from typing import Any, Dict, List, Optional
 
+from llm_cache import add_cache_args, cached_chat, configure_from_args
+from llm_pool import (
+    Throughput,
+    call_with_backoff,
+    estimate_tokens,
+    get_openai_client,
+    get_rate_limiter,
+    imap_ordered,
+)
+from question_lsh import add_near_dup_args, finish_near_dup, near_dup_from_args, save_near_dup
+
 # -----------------------------
 # Constants
 # -----------------------------
@@ -113,14 +134,14 @@ def has_required_tags(answer: str, source_id: str, target_id: str) -> bool:
 # -----------------------------
 def call_llm(model: str, system_prompt: str, user_prompt: str,
              temperature: float = 0.3, max_tokens: int = 2000,
-             seed: Optional[int] = None) -> str:
-    try:
-        from openai import OpenAI
-        client = OpenAI()
+             seed: Optional[int] = None,
+             rpm: float = 0, tpm: float = 0, max_retries: int = 0) -> str:
+    def _request() -> str:
+        get_rate_limiter(model, rpm, tpm).acquire(estimate_tokens(system_prompt, user_prompt, max_tokens=max_tokens))
         extra = {}
         if seed is not None:
             extra["seed"] = seed
-        resp = client.chat.completions.create(
+        resp = get_openai_client().chat.completions.create(
             model=model,
             temperature=temperature,
             max_tokens=max_tokens,
@@ -131,9 +152,15 @@ def call_llm(model: str, system_prompt: str, user_prompt: str,
             ],
         )
         return (resp.choices[0].message.content or "").strip()
-    except Exception as e:
-        sys.stderr.write(f"[LLM ERROR] {e}\n")
-        return ""
+
+    def _call() -> str:
+        try:
+            return call_with_backoff(_request, max_retries=max_retries)
+        except Exception as e:
+            sys.stderr.write(f"[LLM ERROR] {e}\n")
+            return ""
+
+    return cached_chat("openai", model, system_prompt, user_prompt, temperature, seed, max_tokens, _call)
 
 def parse_llm_json(s: str) -> Dict[str, Any]:
     try:
@@ -324,7 +351,19 @@ def main():
     ap.add_argument("--verbose", action="store_true")
     ap.add_argument("--dry_run", action="store_true", help="Scan/filter only; no model calls or writes.")
 
+    # Concurrency
+    ap.add_argument("--workers", "--concurrency", type=int, default=1,
+                    help="Concurrent generation requests (default 1 = serial)")
+    ap.add_argument("--rpm", type=float, default=0, help="Requests/minute limit (0 = unlimited)")
+    ap.add_argument("--tpm", type=float, default=0, help="Tokens/minute limit, estimated from prompt length (0 = unlimited)")
+    ap.add_argument("--max_retries", type=int, default=5, help="Retries with backoff on 429/5xx/timeout errors")
+    ap.add_argument("--report_every", type=int, default=50,
+                    help="Rewrite --report_json with the running counters every N items (0 = only at the end)")
+    add_near_dup_args(ap)
+    add_cache_args(ap)
+
     args = ap.parse_args()
+    configure_from_args(args)
 
     # Load items
     items = read_jsonl(args.input_jsonl)
@@ -401,36 +440,45 @@ def main():
         print(json.dumps(report, indent=2))
         return
 
-    # Real generation
-    with open(args.output_jsonl, "w", encoding="utf-8") as outf:
-        for idx, it in enumerate(items, start=1):
-            source_text = norm_ws(it.get("source_text"))
-            target_text = norm_ws(it.get("target_text"))
-            if looks_like_empty(source_text) or looks_like_empty(target_text):
-                skipped_empty_text += 1
-                continue
-            if args.drop_title_targets and bool(it.get("target_is_title")):
-                skipped_title_targets += 1
-                continue
-
-            # Anchors / metadata
-            semantic_hook    = norm_ws(it.get("semantic_hook"))
-            citation_hook    = norm_ws(it.get("citation_hook"))
-            source_item_type = (it.get("source_item_type") or "Other")
-            target_item_type = (it.get("target_item_type") or "Other")
-            answer_spans     = it.get("answer_spans") or []
-            source_id        = str(it.get("source_passage_id") or "")
-            target_id        = str(it.get("target_passage_id") or "")
-
-            # Degenerate pair guard (cannot truly require both)
-            if (source_id == target_id) or (norm_ws(source_text) == norm_ws(target_text)):
-                skipped_degenerate += 1
-                continue
-
-            kept_candidates += 1
-            pairs_processed += 1
-
-            user_prompt = build_prompt(
+    # Real generation: filter items and build prompts first ...
+    pairs: List[Dict[str, Any]] = []
+    for it in items:
+        source_text = norm_ws(it.get("source_text"))
+        target_text = norm_ws(it.get("target_text"))
+        if looks_like_empty(source_text) or looks_like_empty(target_text):
+            skipped_empty_text += 1
+            continue
+        if args.drop_title_targets and bool(it.get("target_is_title")):
+            skipped_title_targets += 1
+            continue
+
+        # Anchors / metadata
+        semantic_hook    = norm_ws(it.get("semantic_hook"))
+        citation_hook    = norm_ws(it.get("citation_hook"))
+        source_item_type = (it.get("source_item_type") or "Other")
+        target_item_type = (it.get("target_item_type") or "Other")
+        answer_spans     = it.get("answer_spans") or []
+        source_id        = str(it.get("source_passage_id") or "")
+        target_id        = str(it.get("target_passage_id") or "")
+
+        # Degenerate pair guard (cannot truly require both)
+        if (source_id == target_id) or (norm_ws(source_text) == norm_ws(target_text)):
+            skipped_degenerate += 1
+            continue
+
+        kept_candidates += 1
+        pairs.append({
+            "item": it,
+            "source_text": source_text,
+            "target_text": target_text,
+            "semantic_hook": semantic_hook,
+            "citation_hook": citation_hook,
+            "source_item_type": source_item_type,
+            "target_item_type": target_item_type,
+            "answer_spans": answer_spans,
+            "source_id": source_id,
+            "target_id": target_id,
+            "user_prompt": build_prompt(
                 source_text=source_text,
                 target_text=target_text,
                 semantic_hook=semantic_hook,
@@ -444,102 +492,152 @@ def main():
                 no_citations=args.no_citations,
                 source_id=source_id,
                 target_id=target_id
-            )
-
-            content = call_llm(
-                model=args.model,
-                system_prompt=SYSTEM_PROMPT_GEN,
-                user_prompt=user_prompt,
-                temperature=args.temperature,
-                max_tokens=2000,
-                seed=args.seed
-            )
-            if not content:
-                skipped_model_fail += 2 * args.max_q_per_pair
-                continue
+            ),
+        })
 
-            llm_obj = parse_llm_json(content)
-            if not llm_obj:
-                skipped_model_fail += 2 * args.max_q_per_pair
-                continue
+    near_dup = near_dup_from_args(args, args.output_jsonl)
+
+    def make_report(done: bool, throughput: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        report = {
+            "rows_loaded": rows_loaded,
+            "kept_candidates": kept_candidates,
+            "pairs_processed": pairs_processed,
+            "qas_created": qas_created,
+            "dropped_dupe_qs": dropped_dupe_qs,
+            "skipped_empty_text": skipped_empty_text,
+            "skipped_model_fail": skipped_model_fail,
+            "skipped_title_targets": skipped_title_targets,
+            "skipped_degenerate": skipped_degenerate,
+            "model": args.model,
+            "dual_anchors_mode": args.dual_anchors_mode,
+            "workers": args.workers,
+        }
+        if near_dup is not None:
+            report["dropped_near_dupe_qs"] = len(near_dup.rejected)
+        if throughput is not None:
+            report["throughput"] = throughput
+        if not done:
+            report["in_progress"] = True
+        return report
+
+    def write_report(report: Dict[str, Any]) -> None:
+        # Atomic replace, so a reader polling the file never sees half a report
+        tmp = f"{args.report_json}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as rf:
+            json.dump(report, rf, indent=2, ensure_ascii=False)
+        os.replace(tmp, args.report_json)
+
+    # ... then call the generator LLM (concurrently with --workers) and
+    # consume the results in input order so dedup stays deterministic.
+    def generate(pair: Dict[str, Any]) -> str:
+        return call_llm(
+            model=args.model,
+            system_prompt=SYSTEM_PROMPT_GEN,
+            user_prompt=pair["user_prompt"],
+            temperature=args.temperature,
+            max_tokens=2000,
+            seed=args.seed,
+            rpm=args.rpm,
+            tpm=args.tpm,
+            max_retries=args.max_retries
+        )
 
-            # Collect per persona
-            for persona in ["professional", "basic"]:
-                items_p = llm_obj.get(persona, [])
-                if not isinstance(items_p, list):
-                    continue
-
-                kept = 0
-                for qa in items_p:
-                    if not isinstance(qa, dict):
-                        continue
-                    q = norm_ws(qa.get("question"))
-                    a = norm_ws(qa.get("answer"))
-                    if looks_like_empty(q) or looks_like_empty(a):
-                        continue
-
-                    # Ensure passage tags exist and are distinct
-                    if not has_required_tags(a, source_id, target_id):
-                        continue
-
-                    # Global dedup on questions (optional)
-                    if dedup_set is not None:
-                        key = normalize_question_for_dedup(q)
-                        if key in dedup_set:
-                            dropped_dupe_qs += 1
+    if args.verbose:
+        print(f"[info] generating for {len(pairs)} items with {args.workers} worker(s)", flush=True)
+    progress = Throughput(len(pairs), label="SCHEMA", unit="pairs", enabled=args.verbose)
+
+    # Saved even if generation fails, so the questions already written stay indexed
+    try:
+        with open(args.output_jsonl, "w", encoding="utf-8") as outf:
+            for pair, content in zip(pairs, imap_ordered(generate, pairs, concurrency=args.workers)):
+                pairs_processed += 1
+                progress.update()
+
+                llm_obj = parse_llm_json(content) if content else {}
+                if not llm_obj:
+                    skipped_model_fail += 2 * args.max_q_per_pair
+                else:
+                    it = pair["item"]
+                    source_id = pair["source_id"]
+                    target_id = pair["target_id"]
+
+                    # Collect per persona
+                    for persona in ["professional", "basic"]:
+                        items_p = llm_obj.get(persona, [])
+                        if not isinstance(items_p, list):
                             continue
-                        dedup_set.add(key)
-
-                    out = {
-                        "qa_id": rand_uuid(),
-                        "persona": persona,
-                        "question": q,
-                        "expected_answer": a,
-                        "debug_context": {
-                            "source_passage_id": source_id,
-                            "target_passage_id": target_id,
-                            "source_text": source_text,
-                            "target_text": target_text,
-                            "reference_type": it.get("reference_type"),
-                            "reference_text": it.get("reference_text"),
-                            "semantic_hook": semantic_hook,
-                            "citation_hook": citation_hook,
-                            "answer_spans": answer_spans,
-                            "source_item_type": source_item_type,
-                            "target_item_type": target_item_type,
-                        },
-                        "method": "SCHEMA",
-                        "gen_model": args.model,
-                        "gen_ts": int(time.time()),
-                        "run_seed": args.seed,
-                    }
-                    outf.write(json.dumps(out, ensure_ascii=False) + "\n")
-                    qas_created += 1
-                    kept += 1
-                    if kept >= args.max_q_per_pair:
-                        break
-
-            if args.verbose and (pairs_processed % 50 == 0):
-                print(f"[progress] {pairs_processed}/{rows_loaded} | kept_candidates={kept_candidates} | qas={qas_created}", flush=True)
+
+                        kept = 0
+                        for qa in items_p:
+                            if not isinstance(qa, dict):
+                                continue
+                            q = norm_ws(qa.get("question"))
+                            a = norm_ws(qa.get("answer"))
+                            if looks_like_empty(q) or looks_like_empty(a):
+                                continue
+
+                            # Ensure passage tags exist and are distinct
+                            if not has_required_tags(a, source_id, target_id):
+                                continue
+
+                            # Global dedup on questions (optional)
+                            if dedup_set is not None:
+                                key = normalize_question_for_dedup(q)
+                                if key in dedup_set:
+                                    dropped_dupe_qs += 1
+                                    continue
+                                dedup_set.add(key)
+
+                            qa_id = rand_uuid()
+                            if near_dup is not None and near_dup.check_and_add(qa_id, q) is not None:
+                                continue
+
+                            out = {
+                                "qa_id": qa_id,
+                                "persona": persona,
+                                "question": q,
+                                "expected_answer": a,
+                                "debug_context": {
+                                    "source_passage_id": source_id,
+                                    "target_passage_id": target_id,
+                                    "source_text": pair["source_text"],
+                                    "target_text": pair["target_text"],
+                                    "reference_type": it.get("reference_type"),
+                                    "reference_text": it.get("reference_text"),
+                                    "semantic_hook": pair["semantic_hook"],
+                                    "citation_hook": pair["citation_hook"],
+                                    "answer_spans": pair["answer_spans"],
+                                    "source_item_type": pair["source_item_type"],
+                                    "target_item_type": pair["target_item_type"],
+                                },
+                                "method": "SCHEMA",
+                                "gen_model": args.model,
+                                "gen_ts": int(time.time()),
+                                "run_seed": args.seed,
+                            }
+                            outf.write(json.dumps(out, ensure_ascii=False) + "\n")
+                            qas_created += 1
+                            kept += 1
+                            if kept >= args.max_q_per_pair:
+                                break
+                outf.flush()
+
+                # After the item's QAs / failures are counted, so the live report is current
+                if args.report_every > 0 and pairs_processed % args.report_every == 0:
+                    write_report(make_report(done=False))
+
+                if args.verbose and (pairs_processed % 50 == 0):
+                    print(f"[progress] {pairs_processed}/{len(pairs)} pairs | kept_candidates={kept_candidates} | qas={qas_created}", flush=True)
+    finally:
+        save_near_dup(near_dup, args.near_dup_index)
 
     # Report
-    report = {
-        "rows_loaded": rows_loaded,
-        "kept_candidates": kept_candidates,
-        "pairs_processed": pairs_processed,
-        "qas_created": qas_created,
-        "dropped_dupe_qs": dropped_dupe_qs,
-        "skipped_empty_text": skipped_empty_text,
-        "skipped_model_fail": skipped_model_fail,
-        "skipped_title_targets": skipped_title_targets,
-        "skipped_degenerate": skipped_degenerate,
-        "model": args.model,
-        "dual_anchors_mode": args.dual_anchors_mode,
-    }
-    with open(args.report_json, "w", encoding="utf-8") as rf:
-        json.dump(report, rf, indent=2, ensure_ascii=False)
+    report = make_report(done=True, throughput=progress.summary())
+    near_dup_stats = finish_near_dup(near_dup, args.near_dup_index, args.report_json)
+    if near_dup_stats is not None:
+        report["near_dup"] = near_dup_stats
+    write_report(report)
     print(json.dumps(report, indent=2, ensure_ascii=False))
 
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/jsonl_log.py
+
+Append-only JSONL logs that survive a crash mid-write: the checkpoint of
+rag_step2_generate_answers.py, the pass log of judge_qas_ensemble.py and
+the resumable output of extract_schemas.py.
+
+A process killed while writing leaves an unterminated last line. Reading
+the log skips it, but it must also be cut off before the file is reopened
+in "a" mode, or the next record is glued onto it and lost as well.
+
+Usage:
+    done = {obj["key"]: obj for obj in read_complete_lines(path)}
+    with open(path, "a", encoding="utf-8") as f:
+        ...
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterator
+
+
+def truncate_torn_tail(path: str) -> None:
+    """Cut a file back to its last newline (drop an unterminated last line)."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b"\n":
+            return
+        # Walk back in blocks to the last newline
+        pos = size
+        while pos > 0:
+            step = min(1 << 16, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            nl = block.rfind(b"\n")
+            if nl >= 0:
+                f.truncate(pos - step + nl + 1)
+                return
+            pos -= step
+        f.truncate(0)
+
+
+def read_complete_lines(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    JSON objects of the complete lines of `path` (none if it does not exist),
+    after truncating a torn last line. Lines that do not parse are skipped.
+    """
+    if not os.path.exists(path):
+        return
+    truncate_torn_tail(path)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(obj, dict):
+                yield obj
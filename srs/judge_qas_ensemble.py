@@ -23,16 +23,46 @@ python srs/judge_qas_ensemble.py \
   --temperature 0.0 \
   --seed 13 \
   --verbose
+
+Concurrent judging: --workers N dispatches every (row, pass) call through a
+bounded thread pool; --rpm/--tpm are per-judge-model limits. Output order and
+content are identical to a serial run.
+
+Adaptive ensemble: --adaptive-ensemble issues the passes of a row one at a
+time (cross-model passes first, the repeat-seed pass last) and stops as soon
+as the remaining passes can no longer change the fused "passed" decision.
+Skipped passes are listed under fused.ensemble and the median scores are
+taken over the passes that actually ran.
+
+Resume: every judge pass is appended (and fsync'ed) to a pass log
+(--checkpoint, default <out_jsonl>.passes.jsonl) keyed by
+(qa_id, model, seed, rubric hash). A restarted run, or one whose --inputs
+gained new files, only executes the (row, pass) pairs missing from the log;
+out_jsonl and report_json are then rebuilt from the merged log.
+--no_resume starts from scratch.
 """
 
 import argparse
+import hashlib
 import json
 import os
 import re
 import statistics
 import sys
+import threading
 from typing import Any, Dict, List, Optional, Tuple
 
+from jsonl_log import read_complete_lines
+from llm_cache import add_cache_args, cached_chat, configure_from_args
+from llm_pool import (
+    Throughput,
+    call_with_backoff,
+    estimate_tokens,
+    get_openai_client,
+    get_rate_limiter,
+    imap_ordered,
+)
+
 # -----------------------------
 # Basic helpers
 # -----------------------------
@@ -70,18 +100,37 @@ def write_jsonl(path: str, rows: List[Dict[str, Any]]):
         for r in rows:
             f.write(json.dumps(r, ensure_ascii=False) + "\n")
 
+def load_pass_log(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Read the append-only pass log: key -> last pass record written for it.
+    A torn final line (crash mid-write) is cut off so appends continue on a
+    clean line; passes whose judge call failed are skipped, so they are
+    retried on the next run.
+    """
+    done: Dict[str, Dict[str, Any]] = {}
+    for obj in read_complete_lines(path):
+        key = obj.get("key")
+        rec = obj.get("pass")
+        if not key or not isinstance(rec, dict):
+            continue
+        if "judge_failed_or_invalid_json" in ((rec.get("result") or {}).get("reasons") or []):
+            continue
+        done[key] = rec
+    return done
+
 # -----------------------------
 # OpenAI call
 # -----------------------------
 def call_judge(model: str, system_prompt: str, user_prompt: str,
-               temperature: float = 0.0, seed: Optional[int] = None, max_tokens: int = 700) -> str:
-    try:
-        from openai import OpenAI
-        client = OpenAI()
+               temperature: float = 0.0, seed: Optional[int] = None, max_tokens: int = 700,
+               rpm: float = 0, tpm: float = 0, max_retries: int = 0) -> str:
+    def _request() -> str:
+        # Rate limits are per judge model and only charged for real API calls (not cache hits).
+        get_rate_limiter(model, rpm, tpm).acquire(estimate_tokens(system_prompt, user_prompt, max_tokens=max_tokens))
         extra = {}
         if seed is not None:
             extra["seed"] = seed
-        resp = client.chat.completions.create(
+        resp = get_openai_client().chat.completions.create(
             model=model,
             temperature=temperature,
             max_tokens=max_tokens,
@@ -92,9 +141,15 @@ def call_judge(model: str, system_prompt: str, user_prompt: str,
             ],
         )
         return (resp.choices[0].message.content or "").strip()
-    except Exception as e:
-        sys.stderr.write(f"[LLM-JUDGE ERROR] {e}\n")
-        return ""
+
+    def _call() -> str:
+        try:
+            return call_with_backoff(_request, max_retries=max_retries, label="LLM-JUDGE")
+        except Exception as e:
+            sys.stderr.write(f"[LLM-JUDGE ERROR] {e}\n")
+            return ""
+
+    return cached_chat("openai", model, system_prompt, user_prompt, temperature, seed, max_tokens, _call)
 
 def parse_llm_json(s: str) -> Dict[str, Any]:
     s = (s or "").strip()
@@ -185,6 +240,27 @@ TARGET:
 \"\"\"{target_text}\"\"\"
 """.strip()
 
+def rubric_hash(
+    pass_threshold: int,
+    temperature: float,
+    forbid_citations_in_question: bool,
+    allow_citations_in_answer: bool
+) -> str:
+    """Fingerprint of everything besides the QA itself that shapes a verdict."""
+    raw = json.dumps([SYSTEM_PROMPT, JUDGE_RUBRIC, pass_threshold, temperature,
+                      forbid_citations_in_question, allow_citations_in_answer])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+def row_id(row: Dict[str, Any]) -> str:
+    """qa_id, or a content hash for rows that lack one."""
+    if row.get("qa_id"):
+        return str(row["qa_id"])
+    raw = json.dumps([row.get("question"), row.get("expected_answer")], ensure_ascii=False)
+    return "sha:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+def pass_key(qa_id: str, model: str, seed: Optional[int], rubric: str) -> str:
+    return f"{qa_id}|{model}|{seed}|{rubric}"
+
 # -----------------------------
 # Single-call judge (one model/seed)
 # -----------------------------
@@ -195,7 +271,10 @@ def judge_once(
     seed: Optional[int],
     pass_threshold: int,
     forbid_citations_in_question: bool,
-    allow_citations_in_answer: bool
+    allow_citations_in_answer: bool,
+    rpm: float = 0,
+    tpm: float = 0,
+    max_retries: int = 0
 ) -> Dict[str, Any]:
     q = norm_ws(row.get("question"))
     a = norm_ws(row.get("expected_answer"))
@@ -241,7 +320,10 @@ def judge_once(
         user_prompt=user_prompt,
         temperature=temperature,
         seed=seed,
-        max_tokens=700
+        max_tokens=700,
+        rpm=rpm,
+        tpm=tpm,
+        max_retries=max_retries
     )
     obj = parse_llm_json(content)
     if not isinstance(obj, dict) or "final_score" not in obj:
@@ -308,6 +390,84 @@ def fuse_ensemble(
 
     return fused
 
+def decided_outcome(
+    per_judge: List[Dict[str, Any]],
+    n_total: int,
+    require_dual_use_k: int
+) -> Optional[bool]:
+    """
+    The fused "passed" value if it is already fixed whatever the remaining
+    (n_total - len(per_judge)) passes return, else None.
+
+    Mirrors fuse_ensemble: a strict majority decides; a tie can only be
+    ruled a fail for sure when even all-unknown dual_use >= 3 cannot reach K.
+    """
+    yes = sum(1 for j in per_judge if j.get("passed"))
+    no = len(per_judge) - yes
+    rem = n_total - len(per_judge)
+    if yes > no + rem:
+        return True
+    if no > yes + rem:
+        return False
+    if yes + rem == no:
+        # Best case for "pass" is a tie; it fails unless the tie-break can reach K.
+        k_known = sum(1 for j in per_judge if int((j.get("subscores") or {}).get("dual_use", 0)) >= 3)
+        if k_known + rem < require_dual_use_k:
+            return False
+    return None
+
+# -----------------------------
+# Summary
+# -----------------------------
+def summarize(out_rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    stats = {
+        "total": 0,
+        "fused_passed": 0,
+        "avg_fused_score": 0.0,
+        "avg_fused_realism": 0.0,
+        "avg_fused_dual_use": 0.0,
+        "avg_fused_correctness": 0.0,
+        "by_method": {},
+        "by_persona": {},
+    }
+    fused_scores, fused_realism, fused_dual, fused_correct = [], [], [], []
+
+    for r in out_rows:
+        fused = r.get("fused") or {}
+        method = r.get("method")
+        persona = r.get("persona")
+
+        stats["total"] += 1
+        if fused.get("passed"):
+            stats["fused_passed"] += 1
+        fused_scores.append(int(fused.get("final_score", 0)))
+        ss = fused.get("subscores") or {}
+        fused_realism.append(int(ss.get("realism", 0)))
+        fused_dual.append(int(ss.get("dual_use", 0)))
+        fused_correct.append(int(ss.get("correctness", 0)))
+
+        stats["by_method"].setdefault(method, {"count": 0, "pass": 0})
+        stats["by_method"][method]["count"] += 1
+        stats["by_method"][method]["pass"] += 1 if fused.get("passed") else 0
+
+        stats["by_persona"].setdefault(persona, {"count": 0, "pass": 0})
+        stats["by_persona"][persona]["count"] += 1
+        stats["by_persona"][persona]["pass"] += 1 if fused.get("passed") else 0
+
+        ens = fused.get("ensemble") or {}
+        if ens.get("adaptive"):
+            stats["judge_passes_run"] = stats.get("judge_passes_run", 0) + int(ens.get("n", 0))
+            stats["judge_passes_skipped"] = stats.get("judge_passes_skipped", 0) + len(ens.get("skipped") or [])
+
+    # final means
+    if stats["total"] > 0:
+        stats["avg_fused_score"] = round(statistics.mean(fused_scores), 3)
+        stats["avg_fused_realism"] = round(statistics.mean(fused_realism), 3)
+        stats["avg_fused_dual_use"] = round(statistics.mean(fused_dual), 3)
+        stats["avg_fused_correctness"] = round(statistics.mean(fused_correct), 3)
+
+    return stats
+
 # -----------------------------
 # CLI
 # -----------------------------
@@ -337,9 +497,29 @@ def main():
                     help="If set, answers must not contain citation-like tokens (default: citations allowed in answers).")
 
     ap.add_argument("--max_items", type=int, default=None, help="Optional cap on total items judged.")
+
+    # Concurrency
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Concurrent judge calls across all rows/passes (default 1 = serial).")
+    ap.add_argument("--rpm", type=float, default=0,
+                    help="Per-judge-model requests/minute limit (0 = unlimited).")
+    ap.add_argument("--tpm", type=float, default=0,
+                    help="Per-judge-model tokens/minute limit, estimated from prompt length (0 = unlimited).")
+    ap.add_argument("--max_retries", type=int, default=5,
+                    help="Retries with exponential backoff on 429/5xx/timeout errors.")
+    ap.add_argument("--adaptive-ensemble", "--adaptive_ensemble", dest="adaptive_ensemble", action="store_true",
+                    help="Stop issuing a row's passes once the fused 'passed' decision can no longer change.")
+
+    # Resume
+    ap.add_argument("--checkpoint", default=None,
+                    help="Append-only pass log used to resume (default: <out_jsonl>.passes.jsonl).")
+    ap.add_argument("--no_resume", "--no-resume", dest="no_resume", action="store_true",
+                    help="Delete an existing pass log and judge everything again.")
     ap.add_argument("--verbose", action="store_true")
+    add_cache_args(ap)
 
     args = ap.parse_args()
+    configure_from_args(args)
 
     allow_citations_in_answer = not bool(args.no_citations_in_answer)
     models = [m.strip() for m in args.ensemble_models.split(",") if m.strip()]
@@ -367,88 +547,136 @@ def main():
         if args.verbose:
             print(f"[info] truncated to max_items={args.max_items}", flush=True)
 
-    out_rows: List[Dict[str, Any]] = []
-    stats = {
-        "total": 0,
-        "fused_passed": 0,
-        "avg_fused_score": 0.0,
-        "avg_fused_realism": 0.0,
-        "avg_fused_dual_use": 0.0,
-        "avg_fused_correctness": 0.0,
-        "by_method": {},
-        "by_persona": {},
-    }
-    fused_scores, fused_realism, fused_dual, fused_correct = [], [], [], []
-
-    for i, row in enumerate(all_rows, 1):
-        method = row.get("method")
-        persona = row.get("persona")
-        dbg = row.get("debug_context") or {}
-        src_id = str(dbg.get("source_passage_id") or "")
-        tgt_id = str(dbg.get("target_passage_id") or "")
-
+    # Resume index: (qa_id, model, seed, rubric hash) -> pass record
+    ckpt_path = args.checkpoint or args.out_jsonl + ".passes.jsonl"
+    if args.no_resume and os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    done = load_pass_log(ckpt_path)
+    os.makedirs(os.path.dirname(os.path.abspath(ckpt_path)), exist_ok=True)
+    ckpt_f = open(ckpt_path, "a", encoding="utf-8")
+    ckpt_lock = threading.Lock()
+
+    row_ids = [row_id(row) for row in all_rows]
+    row_rubric = [
+        rubric_hash(
+            args.pass_threshold, args.temperature,
+            bool(args.forbid_citations_in_question_for_schema and row.get("method") == "SCHEMA"),
+            allow_citations_in_answer,
+        )
+        for row in all_rows
+    ]
+    n_cached = sum(
+        1 for i, row in enumerate(all_rows) for (m, s, _) in passes
+        if pass_key(row_ids[i], m, s, row_rubric[i]) in done
+    )
+    if args.verbose or n_cached:
+        print(f"[info] pass log {ckpt_path}: reusing {n_cached}/{len(all_rows) * len(passes)} judged passes", flush=True)
+
+    def run_pass(item: Tuple[int, int]) -> Dict[str, Any]:
+        i, j = item
+        row = all_rows[i]
+        m, s, tag = passes[j]
+        key = pass_key(row_ids[i], m, s, row_rubric[i])
+        if key in done:
+            return done[key]
         # Gate: forbid citations in question for SCHEMA only (policy-aligned)
-        forbid_citations_in_question = bool(args.forbid_citations_in_question_for_schema and method == "SCHEMA")
-
-        per_judge = []
-        for (m, s, tag) in passes:
-            obj = judge_once(
-                row=row,
-                model=m,
-                temperature=args.temperature,
-                seed=s,
-                pass_threshold=args.pass_threshold,
-                forbid_citations_in_question=forbid_citations_in_question,
-                allow_citations_in_answer=allow_citations_in_answer
-            )
-            per_judge.append({"model": m, "seed": s, "tag": tag, "result": obj})
-
-        fused = fuse_ensemble(
-            per_judge=[x["result"] for x in per_judge],
-            require_dual_use_k=args.require_dual_use_k
+        forbid_citations_in_question = bool(args.forbid_citations_in_question_for_schema and row.get("method") == "SCHEMA")
+        obj = judge_once(
+            row=row,
+            model=m,
+            temperature=args.temperature,
+            seed=s,
+            pass_threshold=args.pass_threshold,
+            forbid_citations_in_question=forbid_citations_in_question,
+            allow_citations_in_answer=allow_citations_in_answer,
+            rpm=args.rpm,
+            tpm=args.tpm,
+            max_retries=args.max_retries
         )
+        rec = {"model": m, "seed": s, "tag": tag, "result": obj}
+        line = json.dumps({"key": key, "qa_id": row_ids[i], "pass": rec}, ensure_ascii=False) + "\n"
+        with ckpt_lock:
+            ckpt_f.write(line)
+            ckpt_f.flush()
+            os.fsync(ckpt_f.fileno())
+        progress.update()
+        return rec
+
+    def run_row_adaptive(i: int) -> List[Dict[str, Any]]:
+        # Passes of one row run in order and stop once the decision is fixed;
+        # concurrency comes from judging several rows at once.
+        per_judge: List[Dict[str, Any]] = []
+        for j in range(len(passes)):
+            per_judge.append(run_pass((i, j)))
+            if decided_outcome([x["result"] for x in per_judge], len(passes), args.require_dual_use_k) is not None:
+                break
+        return per_judge
+
+    def judged_rows():
+        """Yield each row's executed passes, in input order."""
+        if args.adaptive_ensemble:
+            yield from imap_ordered(run_row_adaptive, range(len(all_rows)), concurrency=args.workers)
+            return
+        # Every (row, pass) pair is one job; imap_ordered yields them in input
+        # order, so each row's passes arrive together and rows are fused in order.
+        jobs = ((i, j) for i in range(len(all_rows)) for j in range(len(passes)))
+        per_judge: List[Dict[str, Any]] = []
+        for judged in imap_ordered(run_pass, jobs, concurrency=args.workers):
+            per_judge.append(judged)
+            if len(per_judge) == len(passes):
+                yield per_judge
+                per_judge = []
+
+    progress = Throughput(len(all_rows) * len(passes) - n_cached, label="judge", unit="calls",
+                          enabled=args.verbose)
+    if args.verbose:
+        mode = "adaptive" if args.adaptive_ensemble else "full"
+        print(f"[info] judging {len(all_rows)} rows x {len(passes)} passes ({mode}) with {args.workers} worker(s)", flush=True)
 
-        out_rows.append({
-            "qa_id": row.get("qa_id"),
-            "method": method,
-            "persona": persona,
-            "reference_type": (row.get("debug_context") or {}).get("reference_type"),
-            "source_passage_id": src_id,
-            "target_passage_id": tgt_id,
-            "per_judge": per_judge,
-            "fused": fused,
-        })
-
-        # aggregate
-        stats["total"] += 1
-        if fused.get("passed"):
-            stats["fused_passed"] += 1
-        fused_scores.append(int(fused.get("final_score", 0)))
-        ss = fused.get("subscores") or {}
-        fused_realism.append(int(ss.get("realism", 0)))
-        fused_dual.append(int(ss.get("dual_use", 0)))
-        fused_correct.append(int(ss.get("correctness", 0)))
-
-        stats["by_method"].setdefault(method, {"count": 0, "pass": 0})
-        stats["by_method"][method]["count"] += 1
-        stats["by_method"][method]["pass"] += 1 if fused.get("passed") else 0
-
-        stats["by_persona"].setdefault(persona, {"count": 0, "pass": 0})
-        stats["by_persona"][persona]["count"] += 1
-        stats["by_persona"][persona]["pass"] += 1 if fused.get("passed") else 0
-
-        if args.verbose and i % 200 == 0:
-            print(f"[progress] {i}/{len(all_rows)} judged", flush=True)
-
-    # final means
-    if stats["total"] > 0:
-        stats["avg_fused_score"] = round(statistics.mean(fused_scores), 3)
-        stats["avg_fused_realism"] = round(statistics.mean(fused_realism), 3)
-        stats["avg_fused_dual_use"] = round(statistics.mean(fused_dual), 3)
-        stats["avg_fused_correctness"] = round(statistics.mean(fused_correct), 3)
+    out_rows: List[Dict[str, Any]] = []
+    try:
+        for i, per_judge in enumerate(judged_rows(), 1):
+            row = all_rows[i - 1]
+            dbg = row.get("debug_context") or {}
 
-    # write outputs
-    write_jsonl(args.out_jsonl, out_rows)
+            fused = fuse_ensemble(
+                per_judge=[x["result"] for x in per_judge],
+                require_dual_use_k=args.require_dual_use_k
+            )
+            if args.adaptive_ensemble:
+                skipped = [tag for (_, _, tag) in passes[len(per_judge):]]
+                fused["ensemble"].update({
+                    "adaptive": True,
+                    "n_planned": len(passes),
+                    "skipped": skipped,
+                    "medians_over": [x["tag"] for x in per_judge],
+                })
+                if skipped:
+                    fused["reasons"].append(f"early_exit_decision_fixed_after_{len(per_judge)}_of_{len(passes)}")
+
+            out_rows.append({
+                "qa_id": row.get("qa_id"),
+                "method": row.get("method"),
+                "persona": row.get("persona"),
+                "reference_type": dbg.get("reference_type"),
+                "source_passage_id": str(dbg.get("source_passage_id") or ""),
+                "target_passage_id": str(dbg.get("target_passage_id") or ""),
+                "per_judge": per_judge,
+                "fused": fused,
+            })
+
+            if args.verbose and i % 200 == 0:
+                print(f"[progress] {i}/{len(all_rows)} judged", flush=True)
+    finally:
+        ckpt_f.close()
+
+    progress.summary()
+
+    # Rebuild outputs from the merged log (input order, atomic rename)
+    stats = summarize(out_rows)
+    tmp_out = args.out_jsonl + ".tmp"
+    write_jsonl(tmp_out, out_rows)
+    os.replace(tmp_out, args.out_jsonl)
     os.makedirs(os.path.dirname(os.path.abspath(args.report_json)), exist_ok=True)
     with open(args.report_json, "w", encoding="utf-8") as rf:
         json.dump(stats, rf, indent=2, ensure_ascii=False)
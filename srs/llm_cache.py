@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/llm_cache.py
+
+Content-addressed cache for chat-completion responses, shared by every
+pipeline script that calls an LLM (generation, schema extraction, judging,
+RAG answering and RAG evaluation).
+
+Key   = sha256(provider, model, system, user, temperature, seed, max_tokens)
+Store = one SQLite file (default outputs/cache/llm_cache.sqlite), WAL mode,
+        safe to share between threads and between concurrent processes.
+Size  = bounded by --cache-max-mb; least-recently-used rows are evicted.
+
+Modes (--cache-mode):
+  off        no cache (default; identical to the uncached scripts)
+  read       serve hits, never write
+  readwrite  serve hits, store misses
+  refresh    always call the model, overwrite the cached response
+
+Empty responses and error-tagged responses ("[OPENAI_API_ERROR] ...",
+"[GEMINI_SAFETY_BLOCK]", ...) are never stored.
+
+Usage inside a script:
+    from llm_cache import add_cache_args, cached_chat, configure_from_args
+
+    add_cache_args(ap)                 # adds --cache-mode/--cache-path/--cache-max-mb
+    args = ap.parse_args()
+    configure_from_args(args)
+
+    content = cached_chat("openai", model, system_prompt, user_prompt,
+                          temperature, seed, max_tokens, lambda: _raw_call(...))
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+CACHE_MODES = ("off", "read", "readwrite", "refresh")
+DEFAULT_CACHE_PATH = "outputs/cache/llm_cache.sqlite"
+DEFAULT_CACHE_MAX_MB = 2048
+
+# Bracketed status tags our wrappers return instead of real content
+STATUS_TAG_PAT = re.compile(r"^\[[A-Z][A-Z0-9_]*\]")
+
+
+def make_key(
+    provider: str,
+    model: str,
+    system: str,
+    user: str,
+    temperature: Optional[float],
+    seed: Optional[int],
+    max_tokens: Optional[int],
+) -> str:
+    raw = json.dumps(
+        [provider, model, system, user, temperature, seed, max_tokens],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(response: Any) -> bool:
+    if not isinstance(response, str) or not response.strip():
+        return False
+    return not STATUS_TAG_PAT.match(response.lstrip())
+
+
+class LLMCache:
+    """SQLite-backed response cache with LRU eviction and hit/miss counters."""
+
+    def __init__(self, path: str, mode: str = "readwrite", max_mb: float = DEFAULT_CACHE_MAX_MB):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode} (choose from {CACHE_MODES})")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = int(max_mb * 1024 * 1024) if max_mb and max_mb > 0 else 0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+        row = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        self.total_bytes = int(row[0])
+
+    @property
+    def reads(self) -> bool:
+        return self.mode in ("read", "readwrite")
+
+    @property
+    def writes_enabled(self) -> bool:
+        return self.mode in ("readwrite", "refresh")
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.reads:
+            return None
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, provider: str, model: str, response: str) -> None:
+        if not self.writes_enabled or not is_cacheable(response):
+            return
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, response, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, size, now, now),
+            )
+            self.total_bytes += size - (int(old[0]) if old else 0)
+            self.writes += 1
+            if self.max_bytes and self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop least-recently-used rows until the cache is under 90% of its budget."""
+        target = int(self.max_bytes * 0.9)
+        while self.total_bytes > target:
+            rows = self.conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 256"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            for key, size in rows:
+                if self.total_bytes <= target:
+                    break
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= int(size)
+                self.evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evicted": self.evicted,
+            "size_mb": round(self.total_bytes / (1024 * 1024), 2),
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+
+
+# -----------------------------
+# Process-wide cache
+# -----------------------------
+_CACHE: Optional[LLMCache] = None
+
+
+def get_cache() -> Optional[LLMCache]:
+    return _CACHE
+
+
+def configure_cache(
+    mode: str = "off",
+    path: str = DEFAULT_CACHE_PATH,
+    max_mb: float = DEFAULT_CACHE_MAX_MB,
+) -> Optional[LLMCache]:
+    """Install the process-wide cache (or remove it for mode=off)."""
+    global _CACHE
+    if _CACHE is not None:
+        _CACHE.close()
+        _CACHE = None
+    if mode == "off":
+        return None
+    _CACHE = LLMCache(path, mode=mode, max_mb=max_mb)
+    atexit.register(_report_and_close, _CACHE)
+    return _CACHE
+
+
+def _report_and_close(cache: LLMCache) -> None:
+    sys.stderr.write(f"[llm-cache] {json.dumps(cache.stats())}\n")
+    cache.close()
+
+
+def add_cache_args(ap) -> None:
+    """Add --cache-mode / --cache-path / --cache-max-mb (underscore spellings accepted too)."""
+    ap.add_argument("--cache-mode", "--cache_mode", dest="cache_mode", choices=CACHE_MODES, default="off",
+                    help="LLM response cache: off | read | readwrite | refresh (default: off).")
+    ap.add_argument("--cache-path", "--cache_path", dest="cache_path", default=DEFAULT_CACHE_PATH,
+                    help=f"SQLite file for the LLM response cache (default: {DEFAULT_CACHE_PATH}).")
+    ap.add_argument("--cache-max-mb", "--cache_max_mb", dest="cache_max_mb", type=float,
+                    default=DEFAULT_CACHE_MAX_MB,
+                    help="Size bound of the LLM response cache; LRU rows are evicted beyond it.")
+
+
+def configure_from_args(args) -> Optional[LLMCache]:
+    return configure_cache(mode=args.cache_mode, path=args.cache_path, max_mb=args.cache_max_mb)
+
+
+def cached_chat(
+    provider: str,
+    model: str,
+    system: str,
+    user: str,
+    temperature: Optional[float],
+    seed: Optional[int],
+    max_tokens: Optional[int],
+    call_fn: Callable[[], str],
+) -> str:
+    """
+    Return the cached response for this request, or call_fn() and store it.
+
+    Exceptions raised by call_fn propagate unchanged and nothing is cached.
+    """
+    cache = _CACHE
+    if cache is None:
+        return call_fn()
+    key = make_key(provider, model, system, user, temperature, seed, max_tokens)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+    response = call_fn()
+    cache.put(key, provider, model, response)
+    return response
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/llm_pool.py
+
+Bounded-concurrency execution helpers for LLM API calls.
+
+- TokenBucket / RateLimiter: requests-per-minute and tokens-per-minute limits,
+  shared by all worker threads talking to the same provider
+  (see get_rate_limiter).
+- call_with_backoff: exponential backoff with full jitter on 429 / 5xx /
+  timeout style failures, whether they surface as exceptions or as the
+  "[..._API_ERROR] ..." strings our provider wrappers return.
+- AIMDLimiter: adaptive cap on in-flight calls (TCP-style additive increase,
+  multiplicative decrease on 429 / overload / slow responses).
+- imap_ordered: thread-pool map with a bounded number of in-flight calls that
+  yields results in INPUT order, so callers can stream output files that are
+  identical to a serial run.
+- Throughput: periodic done/total, rate and ETA progress lines.
+- get_openai_client: one lazily-created OpenAI client per process; it is
+  thread-safe and keeps a connection pool, so workers should share it.
+
+Usage:
+    limiter = get_rate_limiter("openai", rpm=500, tpm=200_000)
+
+    def task(rec):
+        limiter.acquire(estimate_tokens(prompt, max_tokens))
+        return call_with_backoff(lambda: call_openai_chat(...),
+                                 retry_on_result=is_retryable_error)
+
+    for out in imap_ordered(task, records, concurrency=8):
+        out_f.write(json.dumps(out) + "\n")
+
+    # Adaptive: a pool of up to 32 threads, in-flight calls gated by AIMD
+    aimd = AIMDLimiter(initial=4, max_limit=32)
+    task = lambda rec: call_with_backoff(lambda: aimd.run(lambda: call_openai_chat(...)))
+    for out in imap_ordered(task, records, concurrency=aimd.max_limit):
+        ...
+"""
+
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+# Status codes / messages that are worth retrying (rate limits, overload, transient server errors)
+RETRYABLE_PAT = re.compile(
+    r"""(?ix)
+    \b(?:429|500|502|503|504|529)\b |
+    rate[\s_-]?limit | too\s+many\s+requests | quota | overloaded |
+    resource[\s_]exhausted | temporarily\s+unavailable | service\s+unavailable |
+    timed?\s*out | timeout | connection\s+(?:error|reset|aborted)
+    """
+)
+
+
+def is_retryable_error(err: Any) -> bool:
+    """
+    True if `err` (an exception or an error-tagged answer string) looks transient.
+
+    Plain answer strings are only considered when they carry an error tag
+    such as "[OPENAI_API_ERROR] ..." so normal model output is never retried.
+    """
+    if err is None:
+        return False
+    if isinstance(err, BaseException):
+        status = getattr(err, "status_code", None) or getattr(err, "code", None)
+        if isinstance(status, int) and (status == 429 or 500 <= status < 600):
+            return True
+        return bool(RETRYABLE_PAT.search(f"{type(err).__name__}: {err}"))
+    if isinstance(err, str):
+        head = err.lstrip()
+        if not head.startswith("[") or "ERROR]" not in head[:40]:
+            return False
+        return bool(RETRYABLE_PAT.search(head))
+    return False
+
+
+def estimate_tokens(*texts: str, max_tokens: int = 0) -> int:
+    """Cheap token estimate (~4 chars/token) for prompt + completion budget."""
+    return sum(len(t or "") for t in texts) // 4 + int(max_tokens or 0)
+
+
+# -----------------------------
+# Rate limiting
+# -----------------------------
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute` units/min.
+
+    A rate <= 0 disables the bucket (acquire returns immediately).
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = float(per_minute) / 60.0 if per_minute else 0.0
+        self.capacity = float(capacity if capacity is not None else (per_minute or 0.0))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0) -> None:
+        if self.rate <= 0:
+            return
+        # A single request larger than the bucket waits for a full bucket.
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(min(max(wait, 0.01), 5.0))
+
+
+class RateLimiter:
+    """Requests/min + tokens/min limits for one provider."""
+
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    def acquire(self, n_tokens: int = 0) -> None:
+        self.requests.acquire(1)
+        if n_tokens:
+            self.tokens.acquire(n_tokens)
+
+
+_LIMITERS: Dict[Tuple[str, float, float], RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(provider: str, rpm: float = 0, tpm: float = 0) -> RateLimiter:
+    """Process-wide limiter shared by every caller of the same provider/limits."""
+    key = (provider, float(rpm or 0), float(tpm or 0))
+    with _LIMITERS_LOCK:
+        if key not in _LIMITERS:
+            _LIMITERS[key] = RateLimiter(rpm=rpm, tpm=tpm)
+        return _LIMITERS[key]
+
+
+_OPENAI_CLIENT = None
+_OPENAI_CLIENT_LOCK = threading.Lock()
+
+
+def get_openai_client():
+    """Process-wide OpenAI client (created on first use)."""
+    global _OPENAI_CLIENT
+    with _OPENAI_CLIENT_LOCK:
+        if _OPENAI_CLIENT is None:
+            from openai import OpenAI
+            _OPENAI_CLIENT = OpenAI()
+        return _OPENAI_CLIENT
+
+
+# -----------------------------
+# Adaptive concurrency (AIMD)
+# -----------------------------
+class AIMDLimiter:
+    """
+    Caps the number of concurrent calls and adapts the cap like TCP
+    congestion control:
+
+    - each successful call adds increase / limit, i.e. about +increase per
+      full window of successes (additive increase);
+    - a throttled call (429 / overload / timeout, see is_retryable_error)
+      or one slower than `latency_target_s` multiplies the limit by
+      `decrease` (multiplicative decrease), at most once per cooldown so a
+      burst of 429s from one window only halves it once.
+
+    Use run(fn) around the single API request (inside call_with_backoff, so
+    backoff sleeps do not hold a slot).
+    """
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 32,
+                 increase: float = 1.0, decrease: float = 0.5,
+                 latency_target_s: float = 0.0, cooldown_s: float = 2.0):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.latency_target_s = float(latency_target_s or 0.0)
+        self.cooldown_s = float(cooldown_s)
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.calls = 0
+        self.throttled = 0
+        self.slow = 0
+        self.decreases = 0
+        self.peak_limit = self.limit
+        self.cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False, latency_s: Optional[float] = None) -> None:
+        with self.cond:
+            self.in_flight -= 1
+            self.calls += 1
+            slow = bool(self.latency_target_s and latency_s is not None and latency_s > self.latency_target_s)
+            self.throttled += int(throttled)
+            self.slow += int(slow and not throttled)
+            now = time.monotonic()
+            if throttled or slow:
+                if now - self.last_decrease >= self.cooldown_s:
+                    self.limit = max(float(self.min_limit), self.limit * self.decrease)
+                    self.last_decrease = now
+                    self.decreases += 1
+            else:
+                self.limit = min(float(self.max_limit), self.limit + self.increase / self.limit)
+                self.peak_limit = max(self.peak_limit, self.limit)
+            self.cond.notify_all()
+
+    def run(self, fn: Callable[[], Any]) -> Any:
+        """Call fn() in a slot; error-tagged result strings count as throttling too."""
+        self.acquire()
+        t0 = time.monotonic()
+        try:
+            result = fn()
+        except Exception as e:
+            self.release(throttled=is_retryable_error(e), latency_s=time.monotonic() - t0)
+            raise
+        self.release(throttled=is_retryable_error(result), latency_s=time.monotonic() - t0)
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        with self.cond:
+            return {
+                "limit": round(self.limit, 2),
+                "peak_limit": round(self.peak_limit, 2),
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "slow": self.slow,
+                "decreases": self.decreases,
+            }
+
+
+# -----------------------------
+# Retry with backoff
+# -----------------------------
+def call_with_backoff(
+    fn: Callable[[], Any],
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    retry_on_result: Optional[Callable[[Any], bool]] = None,
+    label: str = "LLM",
+) -> Any:
+    """
+    Call fn(); on a retryable exception (or a result for which
+    retry_on_result(result) is True) sleep with exponential backoff + full
+    jitter and try again. After max_retries the last result is returned
+    (or the last exception re-raised).
+    """
+    attempt = 0
+    while True:
+        try:
+            result = fn()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable_error(e):
+                raise
+            reason = f"{type(e).__name__}: {e}"
+        else:
+            if retry_on_result is None or attempt >= max_retries or not retry_on_result(result):
+                return result
+            reason = str(result)[:200]
+        delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+        attempt += 1
+        sys.stderr.write(f"[{label} RETRY {attempt}/{max_retries}] sleeping {delay:.1f}s after: {reason}\n")
+        time.sleep(delay)
+
+
+# -----------------------------
+# Ordered concurrent map
+# -----------------------------
+def imap_ordered(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    concurrency: int = 1,
+    max_in_flight: Optional[int] = None,
+) -> Iterator[Any]:
+    """
+    Yield fn(item) for every item, in input order.
+
+    At most `max_in_flight` (default 4 x concurrency) calls are submitted
+    ahead of the item currently being yielded, so memory stays bounded and a
+    slow head-of-line item does not let the queue grow without limit.
+    Exceptions raised by fn propagate at that item's position.
+    """
+    if concurrency <= 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    max_in_flight = max(concurrency, max_in_flight or concurrency * 4)
+    it = iter(items)
+    pending: deque = deque()
+    ex = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        for item in it:
+            pending.append(ex.submit(fn, item))
+            if len(pending) >= max_in_flight:
+                break
+        while pending:
+            result = pending.popleft().result()
+            for item in it:
+                pending.append(ex.submit(fn, item))
+                break
+            yield result
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+
+
+
+# -----------------------------
+# Progress / throughput
+# -----------------------------
+class Throughput:
+    """
+    Thread-safe progress counter that prints done/total, rate and ETA at most
+    every `every_s` seconds (and once more from summary()).
+    """
+
+    def __init__(self, total: int, label: str = "progress", unit: str = "items",
+                 every_s: float = 30.0, enabled: bool = True):
+        self.total = int(total)
+        self.label = label
+        self.unit = unit
+        self.every_s = float(every_s)
+        self.enabled = enabled
+        self.done = 0
+        self.start = time.monotonic()
+        self.last_print = self.start
+        self.lock = threading.Lock()
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.start
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def line(self) -> str:
+        rate = self.rate()
+        left = max(0, self.total - self.done)
+        eta = f"{left / rate:.0f}s" if rate > 0 else "?"
+        return f"[{self.label}] {self.done}/{self.total} {self.unit} | {rate:.2f} {self.unit}/s | eta {eta}"
+
+    def update(self, n: int = 1) -> None:
+        with self.lock:
+            self.done += n
+            now = time.monotonic()
+            if not self.enabled or now - self.last_print < self.every_s:
+                return
+            self.last_print = now
+            msg = self.line()
+        print(msg, flush=True)
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.start
+        out = {
+            "done": self.done,
+            "total": self.total,
+            "elapsed_s": round(elapsed, 2),
+            f"{self.unit}_per_s": round(self.rate(), 3),
+        }
+        if self.enabled:
+            print(f"[{self.label}] finished {self.done}/{self.total} {self.unit} in {elapsed:.1f}s "
+                  f"({out[f'{self.unit}_per_s']} {self.unit}/s)", flush=True)
+        return out
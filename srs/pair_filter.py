@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/pair_filter.py
+
+Pre-LLM filtering of cross-reference pairs shared by
+generate_qas_method_DPEL.py and extract_schemas.py: empty source / target
+texts and title-like (heading) targets.
+
+title_like_mask() computes the same multi-signal heuristic as the scalar
+is_title_like() (length, cap ratio, stopword share, punctuation, heading
+cues) with pandas string ops over a whole column instead of one regex pass
+per row. prefilter_csv() runs it on every row of a CSV and caches the masks
+under --prefilter_cache_dir, keyed by the CSV's SHA-256, so repeated dry
+runs and generations on the same file skip the text scan.
+
+Usage:
+    masks = prefilter_csv(df, "data/CrossReferenceData.csv", "SourcePassage", "TargetPassage")
+    keep = ~masks["empty"] & ~masks["title_like_target"]    # aligned with df.index
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+FILTER_VERSION = 1
+DEFAULT_PREFILTER_CACHE_DIR = "outputs/cache/prefilter"
+
+TITLE_STOPWORDS = (
+    "the", "and", "of", "to", "in", "for", "on", "by", "with",
+    "a", "an", "or", "as", "is", "are", "at", "from", "that",
+    "its", "be", "this", "these", "those", "must", "shall",
+    "under", "rule", "section", "chapter", "part", "article",
+)
+HEADING_CUES_RE = r"^(definitions?|scope|interpretation|glossary|enforcement procedure|financial reports?)$"
+RULE_REF_RE = r"^(part|chapter|section|rule)\s+\d+([.\-]\d+)*"
+
+
+def normalize_whitespace(s: str) -> str:
+    return re.sub(r"\s+", " ", s or "").strip()
+
+
+# -----------------------------
+# Scalar reference implementation
+# -----------------------------
+def is_title_like(s: str) -> bool:
+    """
+    Multi-signal heuristic to drop headings/captions.
+    We err on the side of dropping (strict).
+    """
+    if s is None:
+        return True
+    text = normalize_whitespace(s)
+
+    if len(text) == 0:
+        return True
+
+    # Hard length & token caps for "title-ish"
+    short_titleish = (len(text) <= 80 and text.count(" ") <= 12)
+
+    # No ending punctuation usually suggests a heading
+    no_end_punct = not re.search(r"[.!?]$", text)
+
+    # TitleCase / ALLCAPS tendency
+    tokens = text.split()
+    cap_ratio = 0.0
+    if tokens:
+        cap_like = sum(1 for t in tokens if re.match(r"^[A-Z][a-zA-Z0-9\-]*$", t))
+        cap_ratio = cap_like / max(1, len(tokens))
+
+    # Low stopword share tends to be headings
+    lower_tokens = [t.lower() for t in re.findall(r"[a-zA-Z]+", text)]
+    stop_share = (sum(1 for t in lower_tokens if t in TITLE_STOPWORDS) / max(1, len(lower_tokens))) if lower_tokens else 0.0
+
+    # Few punctuation marks overall
+    punct_count = len(re.findall(r"[,;:]", text))
+    few_punct = punct_count == 0
+
+    # Common heading cues / structural references
+    heading_cues = bool(re.match(HEADING_CUES_RE, text.strip(), re.I))
+    looks_like_rule_ref = bool(re.match(RULE_REF_RE, text.strip(), re.I))
+
+    score = 0
+    score += 2 if short_titleish else 0
+    score += 1 if no_end_punct else 0
+    score += 1 if cap_ratio >= 0.40 else 0
+    score += 1 if stop_share <= 0.18 else 0
+    score += 1 if few_punct else 0
+    score += 2 if heading_cues else 0
+    score += 2 if looks_like_rule_ref else 0
+
+    return score >= 3
+
+
+# -----------------------------
+# Vectorized version
+# -----------------------------
+# Whole ASCII-letter runs equal to a stopword in any case (what
+# findall("[a-zA-Z]+") + lower() + "in STOP" counts one by one)
+_STOPWORD_RUN_RE = r"(?<![a-zA-Z])(?:{})(?![a-zA-Z])".format(
+    "|".join("".join(f"[{c}{c.upper()}]" for c in w) for w in sorted(TITLE_STOPWORDS, key=len, reverse=True))
+)
+# Space-separated tokens of the normalized text matching ^[A-Z][a-zA-Z0-9\-]*$
+_CAP_TOKEN_RE = r"(?:^| )[A-Z][a-zA-Z0-9\-]*(?= |$)"
+
+
+def normalize_series(texts: pd.Series) -> pd.Series:
+    return texts.fillna("").astype(str).str.replace(r"\s+", " ", regex=True).str.strip()
+
+
+def title_signals(texts: pd.Series) -> pd.DataFrame:
+    """Per-text signals and score of is_title_like(), computed column-wise."""
+    text = normalize_series(texts)
+    length = text.str.len().to_numpy()
+    n_tokens = np.where(length > 0, text.str.count(" ").to_numpy() + 1, 0)
+    n_alpha = text.str.count(r"[a-zA-Z]+").to_numpy()
+
+    short_titleish = (length <= 80) & (text.str.count(" ").to_numpy() <= 12)
+    no_end_punct = ~text.str.contains(r"[.!?]$", regex=True).to_numpy(dtype=bool)
+    cap_ratio = text.str.count(_CAP_TOKEN_RE).to_numpy() / np.maximum(1, n_tokens)
+    stop_share = np.where(n_alpha > 0, text.str.count(_STOPWORD_RUN_RE).to_numpy() / np.maximum(1, n_alpha), 0.0)
+    few_punct = ~text.str.contains(r"[,;:]", regex=True).to_numpy(dtype=bool)
+    heading_cues = text.str.match(HEADING_CUES_RE, case=False).to_numpy(dtype=bool)
+    rule_ref = text.str.match(RULE_REF_RE, case=False).to_numpy(dtype=bool)
+
+    score = (
+        2 * short_titleish
+        + no_end_punct
+        + (cap_ratio >= 0.40)
+        + (stop_share <= 0.18)
+        + few_punct
+        + 2 * heading_cues
+        + 2 * rule_ref
+    ).astype(np.int8)
+    return pd.DataFrame({
+        "length": length,
+        "cap_ratio": cap_ratio,
+        "stop_share": stop_share,
+        "few_punct": few_punct,
+        "heading_cues": heading_cues,
+        "rule_ref": rule_ref,
+        "score": score,
+        "title_like": (length == 0) | (score >= 3),
+    }, index=texts.index)
+
+
+def title_like_mask(texts: pd.Series) -> np.ndarray:
+    """
+    is_title_like() for every element of `texts` (None / NaN count as
+    title-like). Same decision as title_signals()["title_like"], but the
+    regex-heavy cap-ratio and stopword signals (+1 each) are only computed
+    for rows whose score could still cross the threshold with them.
+    """
+    text = normalize_series(texts)
+    length = text.str.len().to_numpy()
+    n_spaces = text.str.count(" ").to_numpy()
+    score = (
+        2 * ((length <= 80) & (n_spaces <= 12))
+        + ~text.str.contains(r"[.!?]$", regex=True).to_numpy(dtype=bool)
+        + ~text.str.contains(r"[,;:]", regex=True).to_numpy(dtype=bool)
+        + 2 * text.str.match(HEADING_CUES_RE, case=False).to_numpy(dtype=bool)
+        + 2 * text.str.match(RULE_REF_RE, case=False).to_numpy(dtype=bool)
+    ).astype(np.int8)
+
+    # Cap ratio, then stopword share, only where 3 is still reachable
+    open_rows = np.flatnonzero((score < 3) & (score >= 1))
+    if open_rows.size:
+        sub = text.iloc[open_rows]
+        n_tokens = np.where(length[open_rows] > 0, n_spaces[open_rows] + 1, 0)
+        score[open_rows] += sub.str.count(_CAP_TOKEN_RE).to_numpy() / np.maximum(1, n_tokens) >= 0.40
+    open_rows = np.flatnonzero(score == 2)
+    if open_rows.size:
+        sub = text.iloc[open_rows]
+        n_alpha = sub.str.count(r"[a-zA-Z]+").to_numpy()
+        stop_share = np.where(n_alpha > 0, sub.str.count(_STOPWORD_RUN_RE).to_numpy() / np.maximum(1, n_alpha), 0.0)
+        score[open_rows] += stop_share <= 0.18
+    return (length == 0) | (score >= 3) | texts.isna().to_numpy()
+
+
+def empty_mask(texts: pd.Series) -> np.ndarray:
+    return (normalize_series(texts).str.len() == 0).to_numpy()
+
+
+# -----------------------------
+# Whole-CSV masks with a disk cache
+# -----------------------------
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def prefilter_csv(
+    df: pd.DataFrame,
+    csv_path: str,
+    source_col: str,
+    target_col: str,
+    cache_dir: Optional[str] = DEFAULT_PREFILTER_CACHE_DIR,
+) -> Dict[str, pd.Series]:
+    """
+    Boolean Series aligned with df.index: "empty" (source or target empty)
+    and "title_like_target". `df` must be the CSV as read (RangeIndex);
+    filtering / sampling can be applied afterwards with .loc.
+    """
+    key = f"{file_sha256(csv_path)}-{source_col}-{target_col}-v{FILTER_VERSION}"
+    cache_path = None
+    if cache_dir:
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+        cache_path = os.path.join(cache_dir, f"{name}.npz")
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as z:
+                if str(z["key"]) == key and len(z["empty"]) == len(df):
+                    return {
+                        "empty": pd.Series(z["empty"], index=df.index),
+                        "title_like_target": pd.Series(z["title_like_target"], index=df.index),
+                    }
+
+    empty = empty_mask(df[source_col]) | empty_mask(df[target_col])
+    title = title_like_mask(df[target_col])
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{cache_path}.tmp{os.getpid()}.npz"
+        np.savez(tmp, key=np.array(key), empty=empty, title_like_target=title)
+        os.replace(tmp, cache_path)
+    return {
+        "empty": pd.Series(empty, index=df.index),
+        "title_like_target": pd.Series(title, index=df.index),
+    }
+
+
+def add_prefilter_args(ap) -> None:
+    ap.add_argument("--prefilter_cache_dir", default=DEFAULT_PREFILTER_CACHE_DIR,
+                    help="Cache of empty/title-like masks keyed by CSV hash ('' = no cache)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Check the vectorized title filter against is_title_like().")
+    ap.add_argument("--input_csv", required=True)
+    ap.add_argument("--target_col", default="TargetPassage")
+    args = ap.parse_args()
+    frame = pd.read_csv(args.input_csv, dtype=str, keep_default_na=False)
+    fast = title_like_mask(frame[args.target_col])
+    slow = np.array([is_title_like(t) for t in frame[args.target_col]])
+    print(json.dumps({"rows": len(frame), "title_like": int(fast.sum()), "mismatches": int((fast != slow).sum())}))
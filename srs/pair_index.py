@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/pair_index.py
+
+Content-hash index over (source_text, target_text) pairs, built before any
+LLM call. CrossReferenceData.csv repeats the same pair under different
+ReferenceText values and ids; with --dedup_pairs the generators call the
+model once per unique pair (the first row holding it, in input order) and
+fan that response out to every other row of the group.
+
+Pair key: sha1 of the whitespace-normalized source and target texts.
+Case and punctuation are kept, so spans / tags copied from the shared
+response stay valid for every row of the group.
+
+Dry-run report of the calls it would save:
+
+  python srs/pair_index.py --input_csv data/CrossReferenceData.csv \
+    --out_json outputs/pair_dedup_report.json
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def normalize_pair_text(s: Optional[str]) -> str:
+    return re.sub(r"\s+", " ", (s or "")).strip()
+
+
+def pair_key(source_text: Optional[str], target_text: Optional[str]) -> str:
+    h = hashlib.sha1()
+    h.update(normalize_pair_text(source_text).encode("utf-8"))
+    h.update(b"\x1f")
+    h.update(normalize_pair_text(target_text).encode("utf-8"))
+    return h.hexdigest()
+
+
+class PairIndex:
+    """
+    Groups row positions by pair key. The representative of a group is its
+    first row; that is the only row of the group sent to the model.
+    """
+
+    def __init__(self):
+        self.groups: Dict[str, List[int]] = {}
+        self.key_of: Dict[int, str] = {}
+
+    def add(self, row: int, source_text: Optional[str], target_text: Optional[str]) -> str:
+        key = pair_key(source_text, target_text)
+        self.groups.setdefault(key, []).append(row)
+        self.key_of[row] = key
+        return key
+
+    @classmethod
+    def build(cls, pairs: Iterable[Tuple[int, Optional[str], Optional[str]]]) -> "PairIndex":
+        """From (row, source_text, target_text) tuples."""
+        index = cls()
+        for row, source_text, target_text in pairs:
+            index.add(row, source_text, target_text)
+        return index
+
+    def representative(self, row: int) -> int:
+        return self.groups[self.key_of[row]][0]
+
+    def is_representative(self, row: int) -> bool:
+        return self.representative(row) == row
+
+    def members(self, row: int) -> List[int]:
+        return self.groups[self.key_of[row]]
+
+    def stats(self, top: int = 10) -> Dict[str, Any]:
+        n_rows = len(self.key_of)
+        n_unique = len(self.groups)
+        biggest = sorted(self.groups.values(), key=len, reverse=True)[:top]
+        return {
+            "rows": n_rows,
+            "unique_pairs": n_unique,
+            "llm_calls_saved": n_rows - n_unique,
+            "saved_share": round((n_rows - n_unique) / n_rows, 4) if n_rows else 0.0,
+            "duplicate_groups": sum(1 for rows in self.groups.values() if len(rows) > 1),
+            "largest_groups": [{"rows": len(rows), "first_row": rows[0]} for rows in biggest if len(rows) > 1],
+        }
+
+
+class SharedResults:
+    """
+    Holds the LLM result of a group until the last row of its group has been
+    consumed. Rows must be consumed in input order (imap_ordered does).
+
+    The first consumed row of a group is its caller (the representative when
+    every row is consumed). A resumed run passes the rows it still consumes
+    and `seeded` results, by pair key, saved by the earlier run; rows of a
+    seeded group make no call at all.
+    """
+
+    def __init__(self, index: PairIndex, rows: Optional[Iterable[int]] = None,
+                 seeded: Optional[Dict[str, Any]] = None):
+        self.index = index
+        self.results: Dict[str, Any] = dict(seeded or {})
+        self.caller: Dict[str, int] = {}
+        self.remaining: Dict[str, int] = {}
+        for row in (index.key_of if rows is None else rows):
+            key = index.key_of.get(row)
+            if key is None:
+                continue
+            self.remaining[key] = self.remaining.get(key, 0) + 1
+            if key not in self.results:
+                self.caller.setdefault(key, row)
+
+    def is_caller(self, row: int) -> bool:
+        key = self.index.key_of.get(row)
+        return key is not None and self.caller.get(key) == row
+
+    def source_row(self, row: int) -> int:
+        """Row whose LLM response `row` is built from."""
+        return self.caller.get(self.index.key_of[row], self.index.representative(row))
+
+    def resolve(self, row: int, result: Any) -> Any:
+        """`result` for the caller of a group, the group's result otherwise."""
+        key = self.index.key_of[row]
+        if self.caller.get(key) == row:
+            self.results[key] = result
+        else:
+            result = self.results[key]
+        self.remaining[key] -= 1
+        if self.remaining[key] == 0:
+            self.results.pop(key, None)
+        return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Report LLM calls saved by pre-call (source, target) pair dedup.")
+    ap.add_argument("--input_csv", required=True, help="CrossReferenceData.csv")
+    ap.add_argument("--source_col", default="SourcePassage")
+    ap.add_argument("--target_col", default="TargetPassage")
+    ap.add_argument("--top", type=int, default=10, help="Largest duplicate groups to list")
+    ap.add_argument("--out_json", default=None)
+    args = ap.parse_args()
+
+    with open(args.input_csv, "r", newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    index = PairIndex.build(
+        (i, r.get(args.source_col), r.get(args.target_col))
+        for i, r in enumerate(rows)
+        if normalize_pair_text(r.get(args.source_col)) and normalize_pair_text(r.get(args.target_col))
+    )
+    report = dict(index.stats(top=args.top), input_rows=len(rows))
+    for group in report["largest_groups"]:
+        r = rows[group["first_row"]]
+        group["source_id"] = r.get("SourceID")
+        group["target_id"] = r.get("TargetID")
+    print(json.dumps(report, indent=2))
+    if args.out_json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out_json)), exist_ok=True)
+        with open(args.out_json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/question_lsh.py
+
+Incremental MinHash-LSH index of generated questions, used by the DPEL and
+SCHEMA generators to reject near-duplicate (paraphrased) questions before
+they reach judging. Exact dedup (--dedup) only catches identical
+normalized text.
+
+- Shingles: character k-grams (default 5) of the normalized question.
+- MinHash: num_perm universal hashes (a * x + b) mod (2^31 - 1).
+- LSH: bands x rows chosen for the Jaccard threshold (same weighting of
+  false positives / negatives as datasketch); a candidate from a shared band
+  bucket is a duplicate when its estimated Jaccard >= threshold. Lookups
+  touch only the colliding buckets, not the whole index.
+
+The index lives in a directory and is reused across runs (and across the
+DPEL and SCHEMA outputs when both point at it):
+
+  indexes/question_lsh/
+      meta.json         # {"num_perm", "shingle_k", "seed", "n", "generation"}
+      signatures.npy    # (n, num_perm) uint32
+      questions.jsonl   # {"id", "question", "source"} per row
+      .lock             # flock held while the files are read / rewritten
+
+Each row records the output file it was generated into ("source"). A run
+writing an output drops that file's rows first, so regenerating into the
+same file is not matched against its own earlier copy. The index is saved
+every --near_dup_save_every new questions and when the run ends or fails.
+
+Runs that share the directory concurrently each check against the rows
+present when they opened it; save() merges what other runs saved in the
+meantime (on-disk rows first, then its own), so no row is lost.
+
+Bands are derived from the threshold at load time, so the threshold can be
+changed without rebuilding. Seed an index from existing outputs and list
+near-duplicate clusters:
+
+  python srs/question_lsh.py build --index indexes/question_lsh \
+    --inputs outputs/generation/dpel/answers.jsonl outputs/generation/schema/answers.jsonl \
+    --threshold 0.8 --clusters_json outputs/generation/near_dup_clusters.json
+"""
+
+import argparse
+import json
+import os
+import re
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+MERSENNE_PRIME = (1 << 31) - 1
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+DEFAULT_SHINGLE_K = 5
+DEFAULT_SAVE_EVERY = 500
+
+
+def normalize_question(q: str) -> str:
+    q = (q or "").lower().strip()
+    q = re.sub(r"[^a-z0-9\s?]", " ", q)
+    return re.sub(r"\s+", " ", q).strip()
+
+
+def shingles(text: str, k: int = DEFAULT_SHINGLE_K) -> np.ndarray:
+    """Distinct hashed character k-grams of the normalized text."""
+    t = normalize_question(text)
+    if len(t) <= k:
+        grams = {t} if t else set()
+    else:
+        grams = {t[i : i + k] for i in range(len(t) - k + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) % MERSENNE_PRIME for g in grams),
+                       dtype=np.uint64, count=len(grams))
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """(bands, rows) with bands * rows <= num_perm minimizing FP + FN area around `threshold`."""
+    xs = np.linspace(0.0, 1.0, 201)
+
+    def area(b: int, r: int, lo: float, hi: float, fp: bool) -> float:
+        x = xs[(xs >= lo) & (xs <= hi)]
+        if x.size < 2:
+            return 0.0
+        p = 1.0 - (1.0 - x ** r) ** b
+        y = p if fp else 1.0 - p
+        return float(np.sum((y[1:] + y[:-1]) * np.diff(x)) / 2.0)
+
+    best, best_err = (1, num_perm), float("inf")
+    for b in range(1, num_perm + 1):
+        for r in range(1, num_perm // b + 1):
+            err = 0.5 * area(b, r, 0.0, threshold, True) + 0.5 * area(b, r, threshold, 1.0, False)
+            if err < best_err:
+                best, best_err = (b, r), err
+    return best
+
+
+@contextmanager
+def _index_lock(path: str):
+    """Exclusive lock on <path>/.lock, held while the index files are read or rewritten."""
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, ".lock"), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def source_key(output_path: str) -> str:
+    """Key of the output file a row was generated into."""
+    return os.path.realpath(output_path)
+
+
+def _read_rows(path: str) -> Tuple[Dict[str, Any], List[str], List[str], List[Optional[str]], np.ndarray]:
+    """
+    meta, ids, questions, sources, signatures of the first meta["n"] rows
+    (extra rows of a torn save are ignored).
+    """
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    n = int(meta["n"])
+    sigs = np.load(os.path.join(path, "signatures.npy"))[:n]
+    ids, questions, sources = [], [], []
+    with open(os.path.join(path, "questions.jsonl"), "r", encoding="utf-8") as f:
+        for line in f:
+            if len(ids) == n:
+                break
+            rec = json.loads(line)
+            ids.append(rec["id"])
+            questions.append(rec["question"])
+            sources.append(rec.get("source"))
+    if len(ids) != n or len(sigs) != n:
+        raise ValueError(f"{path}: meta.json expects {n} rows, found {len(ids)} questions / {len(sigs)} signatures")
+    return meta, ids, questions, sources, sigs
+
+
+def _write_rows(
+    path: str,
+    meta: Dict[str, Any],
+    ids: List[str],
+    questions: List[str],
+    sources: List[Optional[str]],
+    sigs: np.ndarray,
+) -> None:
+    """Replace the index files (caller holds the lock); meta.json last, with n and a new generation."""
+    tmp = os.path.join(path, f"signatures.tmp{os.getpid()}.npy")
+    np.save(tmp, sigs)
+    os.replace(tmp, os.path.join(path, "signatures.npy"))
+    tmp = os.path.join(path, f"questions.jsonl.tmp{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for qid, q, src in zip(ids, questions, sources):
+            f.write(json.dumps({"id": qid, "question": q, "source": src}, ensure_ascii=False) + "\n")
+    os.replace(tmp, os.path.join(path, "questions.jsonl"))
+    meta = dict(meta, n=len(ids), generation=int(meta.get("generation", 0)) + 1)
+    # Written last: n tells open() how many rows of the other files belong to the index
+    tmp = os.path.join(path, f"meta.json.tmp{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, "meta.json"))
+
+
+def drop_source_rows(path: str, sources: Iterable[str]) -> int:
+    """
+    Remove the rows generated into the given output files from the index at
+    `path` (a rerun rewriting an output must not match its own earlier copy).
+    Returns the number of rows removed.
+    """
+    drop = {source_key(s) for s in sources}
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return 0
+    with _index_lock(path):
+        meta, ids, questions, srcs, sigs = _read_rows(path)
+        keep = [i for i, src in enumerate(srcs) if src not in drop]
+        if len(keep) == len(ids):
+            return 0
+        _write_rows(path, meta, [ids[i] for i in keep], [questions[i] for i in keep],
+                    [srcs[i] for i in keep], sigs[keep])
+    return len(ids) - len(keep)
+
+
+class QuestionLSH:
+    """MinHash signatures + band buckets over the questions added so far."""
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        num_perm: int = DEFAULT_NUM_PERM,
+        shingle_k: int = DEFAULT_SHINGLE_K,
+        seed: int = 1,
+    ):
+        self.threshold = float(threshold)
+        self.num_perm = int(num_perm)
+        self.shingle_k = int(shingle_k)
+        self.seed = int(seed)
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self.bands, self.rows = optimal_bands(self.threshold, self.num_perm)
+
+        self.ids: List[str] = []
+        self.questions: List[str] = []
+        self._sigs: List[np.ndarray] = []
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self.sources: List[Optional[str]] = []
+        self._n_disk = 0  # rows of the on-disk index this object was opened / last saved with
+        self._disk_generation = 0  # meta.json generation of those rows
+        # Output file new rows are tagged with; optional periodic save
+        self.source: Optional[str] = None
+        self.autosave_path: Optional[str] = None
+        self.autosave_every = DEFAULT_SAVE_EVERY
+        # Run statistics
+        self.checked = 0
+        self.rejected: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ------------------------------------------------------------------
+    # MinHash / buckets
+    # ------------------------------------------------------------------
+    def signature(self, text: str) -> np.ndarray:
+        x = shingles(text, self.shingle_k)
+        if x.size == 0:
+            return np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint32)
+        hv = (self._a[:, None] * x[None, :] + self._b[:, None]) % MERSENNE_PRIME
+        return hv.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, sig: np.ndarray) -> List[bytes]:
+        r = self.rows
+        return [sig[i * r : (i + 1) * r].tobytes() for i in range(self.bands)]
+
+    def _insert(self, row: int, sig: np.ndarray) -> None:
+        for band, key in zip(self._buckets, self._band_keys(sig)):
+            band.setdefault(key, []).append(row)
+
+    # ------------------------------------------------------------------
+    # Query / add
+    # ------------------------------------------------------------------
+    def query(self, text: str, sig: Optional[np.ndarray] = None) -> Optional[Tuple[int, float]]:
+        """(row, estimated Jaccard) of the most similar indexed question >= threshold, else None."""
+        sig = self.signature(text) if sig is None else sig
+        candidates = set()
+        for band, key in zip(self._buckets, self._band_keys(sig)):
+            candidates.update(band.get(key, ()))
+        best = None
+        for row in candidates:
+            sim = float(np.mean(self._sigs[row] == sig))
+            if sim >= self.threshold and (best is None or sim > best[1]):
+                best = (row, sim)
+        return best
+
+    def add(self, qid: str, text: str, sig: Optional[np.ndarray] = None, source: Optional[str] = None) -> int:
+        sig = self.signature(text) if sig is None else sig
+        row = len(self.ids)
+        self.ids.append(str(qid))
+        self.questions.append(text)
+        self.sources.append(source)
+        self._sigs.append(sig)
+        self._insert(row, sig)
+        return row
+
+    def check_and_add(self, qid: str, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Add `text` (tagged with self.source) unless it near-duplicates an
+        indexed question; in that case return the match ({"matched_id",
+        "matched_question", "similarity"}). With autosave set, the index is
+        saved every autosave_every added rows.
+        """
+        self.checked += 1
+        sig = self.signature(text)
+        hit = self.query(text, sig)
+        if hit is None:
+            self.add(qid, text, sig, self.source)
+            if self.autosave_path and len(self) - self._n_disk >= self.autosave_every:
+                self.save(self.autosave_path)
+            return None
+        row, sim = hit
+        match = {
+            "question": text,
+            "matched_id": self.ids[row],
+            "matched_question": self.questions[row],
+            "similarity": round(sim, 4),
+        }
+        self.rejected.append(match)
+        return match
+
+    # ------------------------------------------------------------------
+    # Reports
+    # ------------------------------------------------------------------
+    def clusters(self) -> List[Dict[str, Any]]:
+        """Rejected questions grouped by the indexed question they matched."""
+        by_kept: Dict[str, Dict[str, Any]] = {}
+        for r in self.rejected:
+            c = by_kept.setdefault(r["matched_id"], {
+                "kept_id": r["matched_id"],
+                "kept_question": r["matched_question"],
+                "removed": [],
+            })
+            c["removed"].append({"question": r["question"], "similarity": r["similarity"]})
+        return sorted(by_kept.values(), key=lambda c: len(c["removed"]), reverse=True)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "threshold": self.threshold,
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "rows": self.rows,
+            "checked": self.checked,
+            "removed": len(self.rejected),
+            "clusters": len({r["matched_id"] for r in self.rejected}),
+            "index_size": len(self),
+        }
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def save(self, path: str) -> None:
+        """
+        Write the index, keeping what other processes saved to `path` since
+        this one opened it: the current on-disk rows come first, then the
+        rows added here.
+        """
+        os.makedirs(path, exist_ok=True)
+        with _index_lock(path):
+            if os.path.exists(os.path.join(path, "meta.json")):
+                meta, ids, questions, sources, sigs = _read_rows(path)
+                if int(meta.get("generation", 0)) != self._disk_generation:
+                    self._merge_disk_rows(ids, questions, sources, sigs)
+            else:
+                meta = {}
+            meta.update(num_perm=self.num_perm, shingle_k=self.shingle_k, seed=self.seed)
+            sigs = np.stack(self._sigs) if self._sigs else np.zeros((0, self.num_perm), dtype=np.uint32)
+            _write_rows(path, meta, self.ids, self.questions, self.sources, sigs)
+            self._disk_generation = int(meta.get("generation", 0)) + 1
+        self._n_disk = len(self.ids)
+
+    def _merge_disk_rows(
+        self, ids: List[str], questions: List[str], sources: List[Optional[str]], sigs: np.ndarray
+    ) -> None:
+        """Replace the rows read at open() with the current on-disk rows; keep the ones added since."""
+        n = self._n_disk
+        own = list(zip(self.ids[n:], self.questions[n:], self._sigs[n:], self.sources[n:]))
+        self.ids, self.questions, self.sources, self._sigs = [], [], [], []
+        self._buckets = [{} for _ in range(self.bands)]
+        for qid, q, sig, src in zip(ids, questions, sigs, sources):
+            self.add(qid, q, sig, src)
+        for qid, q, sig, src in own:
+            self.add(qid, q, sig, src)
+        self._n_disk = len(ids)
+
+    @classmethod
+    def open(cls, path: str, threshold: float = DEFAULT_THRESHOLD) -> "QuestionLSH":
+        with _index_lock(path):
+            meta, ids, questions, sources, sigs = _read_rows(path)
+        index = cls(threshold=threshold, num_perm=meta["num_perm"], shingle_k=meta["shingle_k"], seed=meta["seed"])
+        for qid, q, sig, src in zip(ids, questions, sigs, sources):
+            index.add(qid, q, sig, src)
+        index._n_disk = len(index)
+        index._disk_generation = int(meta.get("generation", 0))
+        return index
+
+    @classmethod
+    def open_or_create(
+        cls,
+        path: str,
+        threshold: float = DEFAULT_THRESHOLD,
+        num_perm: int = DEFAULT_NUM_PERM,
+        shingle_k: int = DEFAULT_SHINGLE_K,
+        output_path: Optional[str] = None,
+    ) -> "QuestionLSH":
+        """
+        Open (or start) the index at `path`. With `output_path`, rows an
+        earlier run generated into that file are dropped first (the file is
+        about to be rewritten) and new rows are tagged with it.
+        """
+        if output_path:
+            dropped = drop_source_rows(path, [output_path])
+            if dropped:
+                print(f"[near-dup] dropped {dropped} questions of an earlier run into {output_path}", flush=True)
+        if os.path.exists(os.path.join(path, "meta.json")):
+            index = cls.open(path, threshold=threshold)
+            print(f"[near-dup] loaded {len(index)} questions from {path} "
+                  f"(threshold={threshold}, bands={index.bands}x{index.rows})", flush=True)
+        else:
+            index = cls(threshold=threshold, num_perm=num_perm, shingle_k=shingle_k)
+        index.source = source_key(output_path) if output_path else None
+        return index
+
+
+# ------------------------------------------------------------------
+# Generator integration
+# ------------------------------------------------------------------
+def add_near_dup_args(ap) -> None:
+    ap.add_argument("--near_dup_index", default=None,
+                    help="MinHash-LSH index dir of earlier questions; rejects near-duplicates (off if unset)")
+    ap.add_argument("--near_dup_threshold", type=float, default=DEFAULT_THRESHOLD,
+                    help="Estimated Jaccard (char 5-gram shingles) at which a question is a near-duplicate")
+    ap.add_argument("--near_dup_num_perm", type=int, default=DEFAULT_NUM_PERM,
+                    help="MinHash permutations for a new index")
+    ap.add_argument("--near_dup_save_every", type=int, default=DEFAULT_SAVE_EVERY,
+                    help="Save the index every N new questions (it is also saved when the run ends or fails)")
+
+
+def near_dup_from_args(args, output_path: str) -> Optional[QuestionLSH]:
+    """The run's index, with the rows of a previous run into `output_path` dropped."""
+    if not args.near_dup_index:
+        return None
+    index = QuestionLSH.open_or_create(args.near_dup_index, args.near_dup_threshold, args.near_dup_num_perm,
+                                       output_path=output_path)
+    if args.near_dup_save_every > 0:
+        index.autosave_path = args.near_dup_index
+        index.autosave_every = args.near_dup_save_every
+    return index
+
+
+def save_near_dup(index: Optional[QuestionLSH], path: Optional[str]) -> None:
+    """For a finally: block around generation, so a failed run keeps the rows it added."""
+    if index is not None and len(index) > index._n_disk:
+        index.save(path)
+
+
+def finish_near_dup(index: Optional[QuestionLSH], path: Optional[str], report_json: str) -> Optional[Dict[str, Any]]:
+    """Save the index, write the removed clusters next to report_json, return the summary."""
+    if index is None:
+        return None
+    save_near_dup(index, path)
+    stem, _ = os.path.splitext(report_json)
+    clusters_path = f"{stem}.near_dup_clusters.json"
+    with open(clusters_path, "w", encoding="utf-8") as f:
+        json.dump(index.clusters(), f, indent=2, ensure_ascii=False)
+    return dict(index.summary(), index_dir=path, clusters_json=clusters_path)
+
+
+def iter_questions(paths: Iterable[str]) -> Iterable[Tuple[str, str]]:
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for n, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    obj = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                q = obj.get("question")
+                if q:
+                    yield str(obj.get("qa_id") or f"{os.path.basename(path)}:{n}"), q
+
+
+def main():
+    ap = argparse.ArgumentParser(description="MinHash-LSH near-duplicate question index.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Add the questions of generation JSONLs to an index")
+    b.add_argument("--index", required=True)
+    b.add_argument("--inputs", nargs="+", required=True)
+    b.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    b.add_argument("--num_perm", type=int, default=DEFAULT_NUM_PERM)
+    b.add_argument("--clusters_json", default=None, help="Write the near-duplicate clusters found")
+    q = sub.add_parser("query", help="Near-duplicates of one question")
+    q.add_argument("--index", required=True)
+    q.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    q.add_argument("question")
+    args = ap.parse_args()
+
+    if args.cmd == "query":
+        index = QuestionLSH.open(args.index, threshold=args.threshold)
+        hit = index.query(args.question)
+        print(json.dumps(None if hit is None else {
+            "id": index.ids[hit[0]], "question": index.questions[hit[0]], "similarity": round(hit[1], 4),
+        }, indent=2, ensure_ascii=False))
+        return
+
+    # Re-adding an input replaces its rows (as a rerun into that output would)
+    drop_source_rows(args.index, args.inputs)
+    index = QuestionLSH.open_or_create(args.index, args.threshold, args.num_perm)
+    for path in args.inputs:
+        index.source = source_key(path)
+        for qid, question in iter_questions([path]):
+            index.check_and_add(qid, question)
+    index.save(args.index)
+    if args.clusters_json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.clusters_json)), exist_ok=True)
+        with open(args.clusters_json, "w", encoding="utf-8") as f:
+            json.dump(index.clusters(), f, indent=2, ensure_ascii=False)
+    print(json.dumps(index.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
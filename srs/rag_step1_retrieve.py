@@ -5,10 +5,11 @@ RAG Step 1: Retrieval
 Given:
   - full passages file (JSONL)
   - final test set (JSONL)
-  - retriever name (bm25, e5, bge, bm25_e5_rerank, hybrid_rrf_bm25_e5)
+  - retriever name (bm25, e5, bge, bm25_e5_rerank, hybrid_rrf_bm25_e5),
+    or a comma-separated list via --retrievers
 
 Produces:
-  - retrieval JSONL with one line per QA:
+  - retrieval JSONL with one line per QA (one file per retriever):
       {
         "qa_id": "DPEL_000677",
         "retriever": "hybrid_rrf_bm25_e5",
@@ -18,22 +19,51 @@ Produces:
           ...
         ]
       }
+
+With --retrievers, every base retriever (BM25 searcher, e5, bge) is built
+once and the composite retrievers reuse the BM25 hit lists and e5 query
+embeddings computed for the base runs, e.g.:
+
+  python srs/rag_step1_retrieve.py \
+    --passages data/passages_full.jsonl \
+    --test-json outputs/final_dataset/DPEL/test.jsonl \
+    --retrievers bm25,e5,bge,bm25_e5_rerank,hybrid_rrf_bm25_e5 \
+    --bm25-index indexes/bm25_full \
+    --topk 50 \
+    --out-template outputs/rag/DPEL_test_{retriever}_retrieval.jsonl
+
+BM25 runs on Pyserini/Lucene by default; --bm25-backend sparse swaps in the
+in-process NumPy/SciPy engine (srs/bm25_sparse.py), which needs no JVM. It
+ignores --bm25-index and uses --bm25-sparse-index (default
+indexes/bm25_sparse.npz), built from --passages on first use and reused
+while the passages are unchanged.
+
+Dense retrievers search exactly by default; --index hnsw|ivfpq switches to
+a faiss ANN index persisted under --index-dir (see srs/ann_index.py, which
+also benchmarks the backends against exact search).
+
+--server http://host:port (or unix:///path.sock) sends the queries to a
+running srs/retrieval_service.py instead, so models and indexes stay warm
+across runs. The server must have been started on the same --passages
+file with the same BM25, --index and encoder flags; otherwise the run is
+refused rather than answered from a different corpus or model setup.
 """
 
 import argparse
 import json
 import os
-from collections import defaultdict
-from typing import Dict, List, Tuple
+from typing import Dict, List, Mapping, Optional, Tuple
 
 import numpy as np
 from tqdm import tqdm
 
-# BM25 (Pyserini)
-from pyserini.search.lucene import LuceneSearcher
-
-# Dense retrievers
-from sentence_transformers import SentenceTransformer
+from ann_index import QUANTIZED_TYPES, DenseIndex, add_index_args, index_params_from_args, load_or_build_index
+from bm25_sparse import DEFAULT_SPARSE_INDEX, SparseBM25
+from corpus_registry import load_corpus
+from embedding_store import EmbeddingStore
+from encoder_backend import DEFAULT_ONNX_DIR, DEFAULT_QUANT_CONFIG, add_encoder_args, load_encoder, store_model_key
+from rank_fusion import fuse_hits
+from retrieval_service import RetrievalClient, add_server_arg, bm25_settings, dense_settings
 
 
 # ------------------------------------------------------------------
@@ -41,35 +71,14 @@ from sentence_transformers import SentenceTransformer
 # ------------------------------------------------------------------
 
 
-def load_passages(path: str) -> Dict[str, str]:
+def load_passages(path: str) -> Mapping[str, str]:
     """
-    Load passages_full.jsonl into a dict: pid -> text
+    pid -> text view of the shared corpus registry (see corpus_registry.py).
 
-    We try several common field names to be robust:
-      - id / pid / passage_id
-      - text / passage / passage_text
+    `path` is passages_full.jsonl or its .registry directory; texts are
+    read from the memory-mapped blob on access.
     """
-    passages: Dict[str, str] = {}
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            obj = json.loads(line)
-            pid = str(
-                obj.get("pid")
-                or obj.get("id")
-                or obj.get("passage_id")
-                or obj.get("PassageID")
-            )
-            text = (
-                obj.get("text")
-                or obj.get("passage")
-                or obj.get("passage_text")
-                or obj.get("Passage")
-            )
-            if pid and text:
-                passages[pid] = text
+    passages = load_corpus(path).texts()
     if not passages:
         raise ValueError(f"No passages loaded from {path}")
     print(f"[INFO] Loaded {len(passages)} passages from {path}")
@@ -127,60 +136,184 @@ def load_test_items(path: str) -> List[Dict[str, str]]:
 
 
 class BM25Retriever:
-    def __init__(self, index_dir: str, k1: float = 0.9, b: float = 0.4):
+    def __init__(self, index_dir: str, k1: float = 0.9, b: float = 0.4, threads: int = 1):
         if not os.path.isdir(index_dir):
             raise ValueError(f"BM25 index dir not found: {index_dir}")
+        # Imported here so --bm25-backend sparse runs without Pyserini / Java
+        from pyserini.search.lucene import LuceneSearcher
+
         self.searcher = LuceneSearcher(index_dir)
         self.searcher.set_bm25(k1=k1, b=b)
+        self.threads = max(1, threads)
 
     def retrieve(self, query: str, k: int) -> List[Tuple[str, float]]:
         hits = self.searcher.search(query, k=k)
         return [(h.docid, float(h.score)) for h in hits]
 
+    def retrieve_batch(
+        self, queries: List[str], k: int, chunk_size: int = 1024
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Lucene's multi-threaded batch_search over `self.threads` threads.
+
+        Queries are submitted in chunks so the progress bar still moves;
+        results keep the input order.
+        """
+        if self.threads == 1:
+            return [
+                self.retrieve(q, k)
+                for q in tqdm(queries, desc="BM25 search", disable=len(queries) < 100)
+            ]
+        results: List[List[Tuple[str, float]]] = []
+        with tqdm(total=len(queries), desc="BM25 search", disable=len(queries) < 100) as pbar:
+            for start in range(0, len(queries), chunk_size):
+                chunk = queries[start : start + chunk_size]
+                qids = [str(start + i) for i in range(len(chunk))]
+                hits = self.searcher.batch_search(chunk, qids, k=k, threads=self.threads)
+                results.extend([(h.docid, float(h.score)) for h in hits[qid]] for qid in qids)
+                pbar.update(len(chunk))
+        return results
+
+
+class SparseBM25Retriever:
+    """
+    Same interface as BM25Retriever, backed by the NumPy/SciPy engine.
+
+    The whole query batch is scored with one sparse matrix product.
+    """
+
+    def __init__(
+        self,
+        passages: Mapping[str, str],
+        index_path: Optional[str],
+        k1: float = 0.9,
+        b: float = 0.4,
+    ):
+        pids = list(passages.keys())
+        texts = [passages[pid] for pid in pids]
+        self.engine = SparseBM25.load_or_build(index_path, pids, texts, k1=k1, b=b)
+
+    def retrieve(self, query: str, k: int) -> List[Tuple[str, float]]:
+        return self.engine.search(query, k)
+
+    def retrieve_batch(self, queries: List[str], k: int) -> List[List[Tuple[str, float]]]:
+        return self.engine.search_batch(queries, k)
+
 
 class DenseRetriever:
     """
     Generic dense retriever with SentenceTransformers.
 
     Supports query / passage prefixes (e.g. for e5, bge).
+
+    If `cache_dir` is set, passage embeddings are read from / written to a
+    persistent EmbeddingStore and only new or changed passages are encoded.
+
+    `index_type` selects the top-k backend (flat = exact, hnsw, ivfpq, int8,
+    binary); hnsw / ivfpq indexes are persisted under `index_dir`. int8 and
+    binary keep only their codes in memory: with `cache_dir` they rescore
+    against the store's memmap through `emb_rows` (passage i is
+    embs[emb_rows[i]]) instead of a float32 copy of the corpus.
+
+    `encoder_backend` runs the encoder on torch, onnx or onnx-int8 (see
+    encoder_backend.py); stores and indexes are kept per backend.
     """
 
     def __init__(
         self,
-        passages: Dict[str, str],
+        passages: Mapping[str, str],
         model_name: str,
         query_prefix: str = "",
         passage_prefix: str = "",
         batch_size: int = 64,
+        cache_dir: Optional[str] = None,
+        cache_dtype: str = "float32",
+        index_type: str = "flat",
+        index_params: Optional[Dict] = None,
+        index_dir: Optional[str] = None,
+        encoder_backend: str = "torch",
+        onnx_dir: str = DEFAULT_ONNX_DIR,
+        onnx_quant_config: str = DEFAULT_QUANT_CONFIG,
     ):
         self.model_name = model_name
-        self.model = SentenceTransformer(model_name)
+        self.encoder_backend = encoder_backend
+        self.model = load_encoder(model_name, encoder_backend, onnx_dir, onnx_quant_config)
+        store_key = store_model_key(model_name, encoder_backend, onnx_quant_config)
         self.query_prefix = query_prefix
         self.passage_prefix = passage_prefix
+        self.batch_size = batch_size
 
         self.pids: List[str] = list(passages.keys())
-        texts = [self.passage_prefix + passages[pid] for pid in self.pids]
+        self.emb_rows: Optional[np.ndarray] = None
+
+        if cache_dir and index_type in QUANTIZED_TYPES:
+            store = EmbeddingStore(cache_dir, store_key, passage_prefix, dtype=cache_dtype)
+            self.emb_rows = store.get_rows(
+                self.pids,
+                [passages[pid] for pid in self.pids],
+                self._encode_passages,
+            )
+            self.embs = store.embs
+        elif cache_dir:
+            store = EmbeddingStore(cache_dir, store_key, passage_prefix, dtype=cache_dtype)
+            self.embs = store.get_or_encode(
+                self.pids,
+                [passages[pid] for pid in self.pids],
+                self._encode_passages,
+            )
+        else:
+            texts = [self.passage_prefix + passages[pid] for pid in self.pids]
+            print(f"[DenseRetriever] Encoding {len(self.pids)} passages with {model_name}...")
+            self.embs = self._encode_passages(texts)
+
+        self.index: DenseIndex = load_or_build_index(
+            self.embs, index_type, index_params, index_dir, store_key, rows=self.emb_rows
+        )
 
-        print(f"[DenseRetriever] Encoding {len(self.pids)} passages with {model_name}...")
-        self.embs = self.model.encode(
+    def passage_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """float32 embeddings of the passages at `rows` (positions in self.pids)."""
+        if self.emb_rows is not None:
+            rows = self.emb_rows[rows]
+        return np.asarray(self.embs[rows], dtype=np.float32)
+
+    def _encode_passages(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
             texts,
-            batch_size=batch_size,
+            batch_size=self.batch_size,
             show_progress_bar=True,
             convert_to_numpy=True,
             normalize_embeddings=True,
         )
 
-    def retrieve(self, query: str, k: int) -> List[Tuple[str, float]]:
-        q_emb = self.model.encode(
-            [self.query_prefix + query],
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        return self.model.encode(
+            [self.query_prefix + q for q in queries],
+            batch_size=self.batch_size,
+            show_progress_bar=len(queries) > self.batch_size,
             convert_to_numpy=True,
             normalize_embeddings=True,
-        )[0]
-        scores = np.dot(self.embs, q_emb)
-        k = min(k, len(self.pids))
-        idx = np.argpartition(-scores, k - 1)[:k]
-        idx = idx[np.argsort(-scores[idx])]
-        return [(self.pids[i], float(scores[i])) for i in idx]
+        )
+
+    def search(
+        self, q_embs: np.ndarray, k: int, chunk_size: int = 1024
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Top-k search for a (Q, dim) matrix of query embeddings.
+
+        With the flat index, scores are computed chunk by chunk as
+        (chunk, dim) x (dim, D) so the score matrix never exceeds chunk_size x D.
+        """
+        top_scores, top = self.index.search(q_embs, k, chunk_size=chunk_size)
+        return [
+            [(self.pids[i], float(sc)) for i, sc in zip(row_idx, row_scores) if i >= 0]
+            for row_idx, row_scores in zip(top, top_scores)
+        ]
+
+    def retrieve_batch(self, queries: List[str], k: int) -> List[List[Tuple[str, float]]]:
+        return self.search(self.encode_queries(queries), k)
+
+    def retrieve(self, query: str, k: int) -> List[Tuple[str, float]]:
+        return self.retrieve_batch([query], k)[0]
 
 
 class BM25E5RerankRetriever:
@@ -194,31 +327,41 @@ class BM25E5RerankRetriever:
         self.dense = dense
         self.candidate_k = candidate_k
 
-        # Build a small lookup from pid -> row index in dense.embs
+        # Build a small lookup from pid -> row index in dense.pids
         self.pid_to_idx = {pid: i for i, pid in enumerate(self.dense.pids)}
 
-    def retrieve(self, query: str, k: int) -> List[Tuple[str, float]]:
-        bm25_hits = self.bm25.retrieve(query, k=self.candidate_k)
-        candidate_pids = [pid for pid, _ in bm25_hits]
+    def rerank(
+        self, bm25_hits: List[Tuple[str, float]], q_emb: np.ndarray, k: int
+    ) -> List[Tuple[str, float]]:
+        candidate_pids = [pid for pid, _ in bm25_hits if pid in self.pid_to_idx]
+        if not candidate_pids:
+            return []
+        rows = np.fromiter(
+            (self.pid_to_idx[pid] for pid in candidate_pids),
+            dtype=np.int64,
+            count=len(candidate_pids),
+        )
+        scores = self.dense.passage_vectors(rows) @ q_emb
 
-        # Encode query once
-        q_emb = self.dense.model.encode(
-            [self.dense.query_prefix + query],
-            convert_to_numpy=True,
-            normalize_embeddings=True,
-        )[0]
+        # Sort by dense score (stable, so BM25 order breaks ties)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [(candidate_pids[i], float(scores[i])) for i in order]
 
-        scores = []
-        for pid in candidate_pids:
-            idx = self.pid_to_idx.get(pid)
-            if idx is None:
-                continue
-            score = float(np.dot(self.dense.embs[idx], q_emb))
-            scores.append((pid, score))
+    def rerank_batch(
+        self,
+        bm25_hits: List[List[Tuple[str, float]]],
+        q_embs: np.ndarray,
+        k: int,
+    ) -> List[List[Tuple[str, float]]]:
+        return [self.rerank(hits, q_emb, k) for hits, q_emb in zip(bm25_hits, q_embs)]
 
-        # Sort by dense score
-        scores.sort(key=lambda x: x[1], reverse=True)
-        return scores[:k]
+    def retrieve_batch(self, queries: List[str], k: int) -> List[List[Tuple[str, float]]]:
+        bm25_hits = self.bm25.retrieve_batch(queries, k=self.candidate_k)
+        q_embs = self.dense.encode_queries(queries)
+        return self.rerank_batch(bm25_hits, q_embs, k)
+
+    def retrieve(self, query: str, k: int) -> List[Tuple[str, float]]:
+        return self.retrieve_batch([query], k)[0]
 
 
 class HybridRRFRetriever:
@@ -235,28 +378,153 @@ class HybridRRFRetriever:
         self.dense = dense
         self.rrf_k = rrf_k
 
-    def _rrf_fuse(
+    def fuse_batch(
         self,
-        bm25_hits: List[Tuple[str, float]],
-        dense_hits: List[Tuple[str, float]],
+        bm25_hits: List[List[Tuple[str, float]]],
+        dense_hits: List[List[Tuple[str, float]]],
         k: int,
-    ) -> List[Tuple[str, float]]:
-        scores = defaultdict(float)
+    ) -> List[List[Tuple[str, float]]]:
+        return [
+            fuse_hits([b, d], k=k, method="rrf", rrf_k=self.rrf_k)
+            for b, d in zip(bm25_hits, dense_hits)
+        ]
+
+    def retrieve_batch(self, queries: List[str], k: int) -> List[List[Tuple[str, float]]]:
+        bm25_hits = self.bm25.retrieve_batch(queries, k=k)
+        dense_hits = self.dense.retrieve_batch(queries, k=k)
+        return self.fuse_batch(bm25_hits, dense_hits, k=k)
 
-        for rank, (pid, _) in enumerate(bm25_hits, start=1):
-            scores[pid] += 1.0 / (self.rrf_k + rank)
+    def retrieve(self, query: str, k: int) -> List[Tuple[str, float]]:
+        return self.retrieve_batch([query], k)[0]
 
-        for rank, (pid, _) in enumerate(dense_hits, start=1):
-            scores[pid] += 1.0 / (self.rrf_k + rank)
 
-        # sort by fused score
-        sorted_items = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        return sorted_items[:k]
+# ------------------------------------------------------------------
+# Multi-retriever execution
+# ------------------------------------------------------------------
 
-    def retrieve(self, query: str, k: int) -> List[Tuple[str, float]]:
-        bm25_hits = self.bm25.retrieve(query, k=k)
-        dense_hits = self.dense.retrieve(query, k=k)
-        return self._rrf_fuse(bm25_hits, dense_hits, k=k)
+RETRIEVER_NAMES = ["bm25", "e5", "bge", "bm25_e5_rerank", "hybrid_rrf_bm25_e5"]
+NEEDS_BM25 = {"bm25", "bm25_e5_rerank", "hybrid_rrf_bm25_e5"}
+NEEDS_E5 = {"e5", "bm25_e5_rerank", "hybrid_rrf_bm25_e5"}
+
+DENSE_MODELS = {
+    "e5": ("intfloat/e5-base-v2", "query: ", "passage: "),
+    "bge": ("BAAI/bge-base-en-v1.5", "query: ", "passage: "),
+}
+
+
+def parse_retriever_list(spec: str) -> List[str]:
+    names = []
+    for name in spec.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in RETRIEVER_NAMES:
+            raise ValueError(f"Unknown retriever: {name} (choose from {RETRIEVER_NAMES})")
+        if name not in names:
+            names.append(name)
+    if not names:
+        raise ValueError("--retrievers cannot be empty")
+    return names
+
+
+def build_dense(passages: Mapping[str, str], name: str, args) -> DenseRetriever:
+    model_name, query_prefix, passage_prefix = DENSE_MODELS[name]
+    return DenseRetriever(
+        passages,
+        model_name=model_name,
+        query_prefix=query_prefix,
+        passage_prefix=passage_prefix,
+        cache_dir=None if args.no_emb_cache else args.emb_cache_dir,
+        cache_dtype=args.emb_cache_dtype,
+        index_type=args.index,
+        index_params=index_params_from_args(args),
+        index_dir=args.index_dir,
+        encoder_backend=args.encoder_backend,
+        onnx_dir=args.onnx_dir,
+        onnx_quant_config=args.onnx_quant_config,
+    )
+
+
+def run_retrievers(
+    names: List[str],
+    questions: List[str],
+    passages: Mapping[str, str],
+    args,
+) -> Dict[str, List[List[Tuple[str, float]]]]:
+    """
+    Run every retriever in `names` over `questions` in one process.
+
+    Base retrievers are built and searched once; composites reuse their
+    outputs (BM25 hits at depth topk, e5 query embeddings / hits).
+    """
+    wanted = set(names)
+    k = args.topk
+    results: Dict[str, List[List[Tuple[str, float]]]] = {}
+
+    bm25 = None
+    bm25_hits = None
+    if wanted & NEEDS_BM25:
+        if args.bm25_backend == "sparse":
+            bm25 = SparseBM25Retriever(passages, args.bm25_sparse_index, k1=args.bm25_k1, b=args.bm25_b)
+        else:
+            if not args.bm25_index:
+                needing = sorted(wanted & NEEDS_BM25)
+                raise ValueError(f"--bm25-index is required for {', '.join(needing)}")
+            bm25 = BM25Retriever(args.bm25_index, k1=args.bm25_k1, b=args.bm25_b, threads=args.bm25_threads)
+        print(f"[INFO] BM25 search for {len(questions)} queries...")
+        bm25_hits = bm25.retrieve_batch(questions, k=k)
+        if "bm25" in wanted:
+            results["bm25"] = bm25_hits
+
+    if wanted & NEEDS_E5:
+        e5 = build_dense(passages, "e5", args)
+        print(f"[INFO] Encoding {len(questions)} queries with {e5.model_name}...")
+        e5_q_embs = e5.encode_queries(questions)
+        e5_hits = None
+        if wanted & {"e5", "hybrid_rrf_bm25_e5"}:
+            e5_hits = e5.search(e5_q_embs, k)
+        if "e5" in wanted:
+            results["e5"] = e5_hits
+        if "bm25_e5_rerank" in wanted:
+            rerank = BM25E5RerankRetriever(bm25=bm25, dense=e5, candidate_k=k)
+            results["bm25_e5_rerank"] = rerank.rerank_batch(bm25_hits, e5_q_embs, k)
+        if "hybrid_rrf_bm25_e5" in wanted:
+            hybrid = HybridRRFRetriever(bm25=bm25, dense=e5)
+            results["hybrid_rrf_bm25_e5"] = hybrid.fuse_batch(bm25_hits, e5_hits, k)
+        del e5, e5_q_embs
+
+    if "bge" in wanted:
+        bge = build_dense(passages, "bge", args)
+        results["bge"] = bge.retrieve_batch(questions, k)
+        del bge
+
+    return {name: results[name] for name in names}
+
+
+def write_retrieval_jsonl(
+    path: str,
+    retriever: str,
+    test_items: List[Dict[str, str]],
+    all_hits: List[List[Tuple[str, float]]],
+) -> int:
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    n_queries = 0
+    with open(path, "w", encoding="utf-8") as out_f:
+        for item, hits in zip(test_items, all_hits):
+            record = {
+                "qa_id": item["qa_id"],
+                "retriever": retriever,
+                "question": item["question"],
+                "retrieved": [
+                    {"pid": pid, "rank": rank, "score": score}
+                    for rank, (pid, score) in enumerate(hits, start=1)
+                ],
+            }
+            out_f.write(json.dumps(record) + "\n")
+            n_queries += 1
+    return n_queries
 
 
 # ------------------------------------------------------------------
@@ -276,15 +544,41 @@ def main():
         required=True,
         help="Path to final test.jsonl (DPEL/SCHEMA)",
     )
-    parser.add_argument(
+    which = parser.add_mutually_exclusive_group(required=True)
+    which.add_argument(
         "--retriever",
-        required=True,
-        choices=["bm25", "e5", "bge", "bm25_e5_rerank", "hybrid_rrf_bm25_e5"],
+        choices=RETRIEVER_NAMES,
         help="Retriever type",
     )
+    which.add_argument(
+        "--retrievers",
+        help=(
+            "Comma-separated retrievers to run in a single pass, e.g. "
+            "'bm25,e5,bge,bm25_e5_rerank,hybrid_rrf_bm25_e5' (requires --out-template)"
+        ),
+    )
     parser.add_argument(
         "--bm25-index",
-        help="Path to BM25 (Pyserini) index dir (required for bm25, bm25_e5_rerank, hybrid_rrf_bm25_e5)",
+        help="Pyserini index dir (required for bm25, bm25_e5_rerank, hybrid_rrf_bm25_e5 with --bm25-backend pyserini)",
+    )
+    parser.add_argument(
+        "--bm25-sparse-index",
+        default=DEFAULT_SPARSE_INDEX,
+        help=f"--bm25-backend sparse: .npz index, built from --passages if missing or stale (default: {DEFAULT_SPARSE_INDEX})",
+    )
+    parser.add_argument(
+        "--bm25-backend",
+        default="pyserini",
+        choices=["pyserini", "sparse"],
+        help="pyserini = Lucene via Pyserini (needs Java); sparse = in-process NumPy/SciPy BM25",
+    )
+    parser.add_argument("--bm25-k1", type=float, default=0.9, help="BM25 k1")
+    parser.add_argument("--bm25-b", type=float, default=0.4, help="BM25 b")
+    parser.add_argument(
+        "--bm25-threads",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Lucene batch_search threads for --bm25-backend pyserini (1 = sequential search)",
     )
     parser.add_argument(
         "--topk",
@@ -294,91 +588,65 @@ def main():
     )
     parser.add_argument(
         "--out-jsonl",
-        required=True,
-        help="Output JSONL file with retrieval results",
+        help="Output JSONL file with retrieval results (single --retriever mode)",
+    )
+    parser.add_argument(
+        "--out-template",
+        help="Output path template with a {retriever} placeholder (--retrievers mode)",
+    )
+    parser.add_argument(
+        "--emb-cache-dir",
+        default="indexes/emb_cache",
+        help="Directory of the persistent passage embedding store (dense retrievers)",
+    )
+    parser.add_argument(
+        "--emb-cache-dtype",
+        default="float32",
+        choices=["float32", "float16"],
+        help="On-disk dtype of cached passage embeddings",
+    )
+    parser.add_argument(
+        "--no-emb-cache",
+        action="store_true",
+        help="Always re-encode passages; do not read or write the embedding store",
     )
+    add_index_args(parser)
+    add_encoder_args(parser)
+    add_server_arg(parser)
 
     args = parser.parse_args()
 
+    if args.retriever:
+        if not args.out_jsonl:
+            parser.error("--out-jsonl is required with --retriever")
+        names = [args.retriever]
+        out_paths = {args.retriever: args.out_jsonl}
+    else:
+        if not args.out_template or "{retriever}" not in args.out_template:
+            parser.error("--out-template with a {retriever} placeholder is required with --retrievers")
+        names = parse_retriever_list(args.retrievers)
+        out_paths = {name: args.out_template.format(retriever=name) for name in names}
+
     # Load data
-    passages = load_passages(args.passages)
     test_items = load_test_items(args.test_json)
-
-    # Initialise retriever
-    retriever_obj = None
-
-    if args.retriever == "bm25":
-        if not args.bm25_index:
-            raise ValueError("--bm25-index is required for bm25 retriever")
-        retriever_obj = BM25Retriever(args.bm25_index)
-
-    elif args.retriever == "e5":
-        retriever_obj = DenseRetriever(
-            passages,
-            model_name="intfloat/e5-base-v2",
-            query_prefix="query: ",
-            passage_prefix="passage: ",
-        )
-
-    elif args.retriever == "bge":
-        retriever_obj = DenseRetriever(
-            passages,
-            model_name="BAAI/bge-base-en-v1.5",
-            query_prefix="query: ",
-            passage_prefix="passage: ",
-        )
-
-    elif args.retriever == "bm25_e5_rerank":
-        if not args.bm25_index:
-            raise ValueError("--bm25-index is required for bm25_e5_rerank retriever")
-        bm25 = BM25Retriever(args.bm25_index)
-        dense = DenseRetriever(
-            passages,
-            model_name="intfloat/e5-base-v2",
-            query_prefix="query: ",
-            passage_prefix="passage: ",
-        )
-        retriever_obj = BM25E5RerankRetriever(bm25=bm25, dense=dense, candidate_k=args.topk)
-
-    elif args.retriever == "hybrid_rrf_bm25_e5":
-        if not args.bm25_index:
-            raise ValueError("--bm25-index is required for hybrid_rrf_bm25_e5 retriever")
-        bm25 = BM25Retriever(args.bm25_index)
-        dense = DenseRetriever(
-            passages,
-            model_name="intfloat/e5-base-v2",
-            query_prefix="query: ",
-            passage_prefix="passage: ",
-        )
-        retriever_obj = HybridRRFRetriever(bm25=bm25, dense=dense)
-
+    questions = [item["question"] for item in test_items]
+
+    print(f"[INFO] Retrieving with {', '.join(names)} for {len(test_items)} queries...")
+    if args.server:
+        client = RetrievalClient(args.server)
+        wanted = set(names)
+        dense = {name: dense_settings(*DENSE_MODELS[name], args)
+                 for name in DENSE_MODELS if name in wanted or (name == "e5" and wanted & NEEDS_E5)}
+        client.check(args.passages, dense=dense, bm25=bm25_settings(args) if wanted & NEEDS_BM25 else None)
+        all_results = {name: client.search(name, questions, args.topk) for name in names}
+        client.report("INFO")
     else:
-        raise ValueError(f"Unknown retriever: {args.retriever}")
-
-    # Run retrieval and write JSONL
-    os.makedirs(os.path.dirname(args.out_jsonl), exist_ok=True)
-    n_queries = 0
-
-    with open(args.out_jsonl, "w", encoding="utf-8") as out_f:
-        for item in tqdm(test_items, desc=f"Retrieving with {args.retriever}"):
-            qa_id = item["qa_id"]
-            question = item["question"]
-
-            hits = retriever_obj.retrieve(question, k=args.topk)
-
-            record = {
-                "qa_id": qa_id,
-                "retriever": args.retriever,
-                "question": question,
-                "retrieved": [
-                    {"pid": pid, "rank": rank, "score": score}
-                    for rank, (pid, score) in enumerate(hits, start=1)
-                ],
-            }
-            out_f.write(json.dumps(record) + "\n")
-            n_queries += 1
+        passages = load_passages(args.passages)
+        all_results = run_retrievers(names, questions, passages, args)
 
-    print(f"[INFO] Wrote retrieval results for {n_queries} queries to {args.out_jsonl}")
+    for name in names:
+        n_queries = write_retrieval_jsonl(out_paths[name], name, test_items, all_results[name])
+        print(f"[INFO] Wrote {name} retrieval results for {n_queries} queries to {out_paths[name]}")
 
 
 if __name__ == "__main__":
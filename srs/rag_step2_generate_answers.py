@@ -9,6 +9,23 @@ Supports multiple providers:
 - Google Gemini (e.g. gemini-2.5-flash-lite, gemini-2.5-pro)
 - Anthropic (e.g. claude-3.5-sonnet, claude-3.5-haiku)
 - Local HuggingFace models (via prefix: hf:<model_name>)
+- A local fake provider for dry runs / load tests (via prefix: fake:<name>)
+
+Calls run through a bounded thread pool (--concurrency) with per-provider
+requests/min and tokens/min limits (--rpm / --tpm) and exponential backoff
+with jitter on 429 / 5xx errors (--max-retries). Output lines are written in
+the original input order regardless of concurrency.
+
+Resume / checkpointing
+----------------------
+Every finished answer is appended (and fsync'ed) to a checkpoint log
+(--checkpoint, default <out-jsonl>.ckpt.jsonl) keyed by
+(qa_id, model, retriever, topk, prompt hash). On restart, items with a
+non-error answer in the log are reused; items whose last answer carries an
+error tag ([OPENAI_API_ERROR], [GEMINI_API_ERROR], [GENERATION_ERROR], ...)
+or an empty-response tag ([GEMINI_EMPTY_TEXT], [GEMINI_BLOCKED_OR_EMPTY],
+[ANTHROPIC_EMPTY_RESPONSE], ...) or that never finished are generated again. The output JSONL is rebuilt
+from the log in input order at the end via an atomic rename.
 
 Inputs
 ------
@@ -56,13 +73,27 @@ JSONL with one object per QA including the generated RAG answer:
 """
 
 import argparse
+import hashlib
 import json
 import os
+import random
+import re
 import time
-from typing import Dict, List, Any, Tuple, Optional
+from typing import Dict, List, Any, Mapping, Tuple, Optional
 
 from tqdm import tqdm
 
+from corpus_registry import load_corpus
+from jsonl_log import read_complete_lines
+from llm_cache import add_cache_args, cached_chat, configure_from_args
+from llm_pool import (
+    call_with_backoff,
+    estimate_tokens,
+    get_rate_limiter,
+    imap_ordered,
+    is_retryable_error,
+)
+
 # Silence some noisy logs (esp. from gRPC / Gemini)
 os.environ.setdefault("GRPC_VERBOSITY", "ERROR")
 os.environ.setdefault("GLOG_minloglevel", "2")
@@ -150,22 +181,12 @@ def init_hf_model(model_name: str) -> None:
 # ---------------------------------------------------------------------------
 # Data loading helpers
 # ---------------------------------------------------------------------------
-def load_passages(path: str) -> Dict[str, Dict[str, Any]]:
+def load_passages(path: str) -> Mapping[str, Dict[str, Any]]:
     """
-    Load passages_full.jsonl into a dict keyed by pid.
+    pid -> {"pid", "text", "document_id", "passage_id"} view of the shared
+    corpus registry built from passages_full.jsonl.
     """
-    passages: Dict[str, Dict[str, Any]] = {}
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            obj = json.loads(line)
-            pid = obj.get("pid")
-            if not pid:
-                continue
-            passages[pid] = obj
-    return passages
+    return load_corpus(path).records()
 
 
 def load_retrievals(path: str) -> List[Dict[str, Any]]:
@@ -183,6 +204,44 @@ def load_retrievals(path: str) -> List[Dict[str, Any]]:
     return records
 
 
+# ---------------------------------------------------------------------------
+# Checkpoint log
+# ---------------------------------------------------------------------------
+ERROR_TAG_PAT = re.compile(r"^\[[A-Z_]*(?:ERROR|EMPTY_TEXT|EMPTY_RESPONSE|BLOCKED_OR_EMPTY)\]")
+
+
+def is_error_answer(answer: Optional[str]) -> bool:
+    """True for answers that carry an API/generation error or empty-response tag (retried on resume)."""
+    return bool(ERROR_TAG_PAT.match((answer or "").lstrip()))
+
+
+def checkpoint_key(
+    qa_id: Any,
+    model: str,
+    retriever: Optional[str],
+    topk: int,
+    system_msg: str,
+    user_msg: str,
+) -> str:
+    prompt_hash = hashlib.sha256(f"{system_msg}\x00{user_msg}".encode("utf-8")).hexdigest()
+    raw = json.dumps([qa_id, model, retriever, topk, prompt_hash], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def load_checkpoint(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Read the append-only checkpoint log: key -> last record written for it.
+    A torn final line (crash mid-write) is cut off so the next append starts
+    on a clean line.
+    """
+    done: Dict[str, Dict[str, Any]] = {}
+    for obj in read_complete_lines(path):
+        key = obj.get("key")
+        if key and isinstance(obj.get("record"), dict):
+            done[key] = obj["record"]
+    return done
+
+
 # ---------------------------------------------------------------------------
 # Provider detection
 # ---------------------------------------------------------------------------
@@ -191,6 +250,7 @@ class Provider:
     GEMINI = "gemini"
     ANTHROPIC = "anthropic"
     HF_LOCAL = "hf_local"
+    FAKE = "fake"
 
 
 def detect_provider(model_name: str) -> str:
@@ -199,11 +259,14 @@ def detect_provider(model_name: str) -> str:
     - "gemini-..." -> GEMINI
     - startswith "claude" or contains "anthropic" -> ANTHROPIC
     - startswith "hf:" -> HF_LOCAL
+    - startswith "fake:" -> FAKE
     - otherwise -> OPENAI
     """
     lower = model_name.lower()
     if lower.startswith("hf:"):
         return Provider.HF_LOCAL
+    if lower.startswith("fake:"):
+        return Provider.FAKE
     if "gemini" in lower:
         return Provider.GEMINI
     if lower.startswith("claude") or "anthropic" in lower:
@@ -408,6 +471,52 @@ def call_hf_chat(
     return gen_text.strip() or "[HF_EMPTY_RESPONSE]"
 
 
+def call_fake_chat(
+    model: str,
+    system_msg: str,
+    user_msg: str,
+    temperature: float = 0.0,
+    max_tokens: int = 512,
+) -> str:
+    """
+    Local stand-in for a chat API (no network, no keys).
+
+    Sleeps FAKE_LLM_LATENCY seconds (default 0.05) and fails with a 429-style
+    error tag with probability FAKE_LLM_ERROR_RATE (default 0), so the
+    concurrency / rate-limit / retry path can be exercised offline.
+    """
+    time.sleep(float(os.environ.get("FAKE_LLM_LATENCY", "0.05")))
+    if random.random() < float(os.environ.get("FAKE_LLM_ERROR_RATE", "0")):
+        return "[FAKE_API_ERROR] 429 Too Many Requests"
+    pids = re.findall(r"PID=([^\s,]+)", user_msg)[:2]
+    tags = " ".join(f"[#P:{pid}]" for pid in pids)
+    return f"Fake answer from {model} based on {len(pids)} passage(s). {tags}".strip()
+
+
+def generate_answer(
+    provider: str,
+    model: str,
+    system_msg: str,
+    user_msg: str,
+    temperature: float,
+    max_tokens: int,
+) -> str:
+    """Dispatch one chat call to the wrapper for `provider` (through the LLM cache)."""
+    def _call() -> str:
+        if provider == Provider.GEMINI:
+            return call_gemini_chat(model, system_msg, user_msg, temperature, max_tokens)
+        if provider == Provider.ANTHROPIC:
+            return call_anthropic_chat(model, system_msg, user_msg, temperature, max_tokens)
+        if provider == Provider.HF_LOCAL:
+            return call_hf_chat(model[len("hf:") :], system_msg, user_msg, temperature, max_tokens)
+        if provider == Provider.FAKE:
+            return call_fake_chat(model, system_msg, user_msg, temperature, max_tokens)
+        # Default: OpenAI
+        return call_openai_chat(model, system_msg, user_msg, temperature, max_tokens)
+
+    return cached_chat(provider, model, system_msg, user_msg, temperature, None, max_tokens, _call)
+
+
 # ---------------------------------------------------------------------------
 # Prompt construction
 # ---------------------------------------------------------------------------
@@ -533,7 +642,41 @@ def main() -> None:
         "--sleep",
         type=float,
         default=0.0,
-        help="Optional sleep (seconds) between API calls to avoid rate limits.",
+        help="Optional sleep (seconds) after each API call (per worker).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of concurrent generator calls (HF-local models always run with 1).",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=0,
+        help="Requests/min limit for the provider (0 = unlimited).",
+    )
+    parser.add_argument(
+        "--tpm",
+        type=float,
+        default=0,
+        help="Estimated tokens/min limit for the provider, prompt + max_tokens (0 = unlimited).",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=5,
+        help="Retries with exponential backoff + jitter on 429/5xx/timeout errors.",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="Append-only checkpoint log (default: <out-jsonl>.ckpt.jsonl).",
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Ignore and truncate an existing checkpoint log; regenerate everything.",
     )
     parser.add_argument(
         "--out-jsonl",
@@ -541,7 +684,9 @@ def main() -> None:
         help="Output JSONL file with generated answers.",
     )
 
+    add_cache_args(parser)
     args = parser.parse_args()
+    configure_from_args(args)
 
     out_dir = os.path.dirname(args.out_jsonl)
     if out_dir:
@@ -558,103 +703,149 @@ def main() -> None:
     provider = detect_provider(args.model)
     print(f"[INFO] Model provider detected: {provider}")
 
+    concurrency = max(1, args.concurrency)
+    if provider == Provider.HF_LOCAL and concurrency > 1:
+        print("[WARN] HF-local generation is not thread-safe; using --concurrency 1.")
+        concurrency = 1
+    limiter = get_rate_limiter(provider, rpm=args.rpm, tpm=args.tpm)
+
     missing_passages = 0
     total_api_errors = 0
 
-    with open(args.out_jsonl, "w", encoding="utf-8") as out_f:
-        for rec in tqdm(retrieval_records, desc="Generating answers"):
-            qa_id = rec.get("qa_id") or rec.get("id") or rec.get("qid")
-            question = rec.get("question")
-            persona = rec.get("persona")  # Optional
-            retriever_name = rec.get("retriever")
+    # Resolve contexts up front (cheap, single-threaded); only the API calls
+    # run in the pool.
+    jobs: List[Dict[str, Any]] = []
+    for rec in retrieval_records:
+        qa_id = rec.get("qa_id") or rec.get("id") or rec.get("qid")
+        question = rec.get("question")
+
+        if not question:
+            # If somehow there is no question, skip this record.
+            continue
+
+        retrieved = rec.get("retrieved", [])
+        contexts: List[Dict[str, Any]] = []
+        used_retrieved: List[Dict[str, Any]] = []
 
-            if not question:
-                # If somehow there is no question, skip this record.
+        # Collect top-k contexts
+        for r in retrieved[: args.topk_contexts]:
+            pid = r.get("pid")
+            if not pid:
+                continue
+            p = passages.get(pid)
+            if p is None:
+                missing_passages += 1
                 continue
 
-            retrieved = rec.get("retrieved", [])
-            contexts: List[Dict[str, Any]] = []
-            used_retrieved: List[Dict[str, Any]] = []
-
-            # Collect top-k contexts
-            for r in retrieved[: args.topk_contexts]:
-                pid = r.get("pid")
-                if not pid:
-                    continue
-                p = passages.get(pid)
-                if p is None:
-                    missing_passages += 1
-                    continue
-
-                ctx = {
-                    "pid": pid,
-                    "text": p.get("text", ""),
-                    "document_id": p.get("document_id"),
-                    "passage_id": p.get("passage_id"),
-                }
-                contexts.append(ctx)
-                used_retrieved.append(r)
-
-            system_msg, user_msg = build_prompt(question, contexts)
-
-            try:
-                if provider == Provider.GEMINI:
-                    answer_text = call_gemini_chat(
-                        model=args.model,
-                        system_msg=system_msg,
-                        user_msg=user_msg,
-                        temperature=args.temperature,
-                        max_tokens=args.max_tokens,
-                    )
-                elif provider == Provider.ANTHROPIC:
-                    answer_text = call_anthropic_chat(
-                        model=args.model,
-                        system_msg=system_msg,
-                        user_msg=user_msg,
-                        temperature=args.temperature,
-                        max_tokens=args.max_tokens,
-                    )
-                elif provider == Provider.HF_LOCAL:
-                    hf_name = args.model[len("hf:") :]
-                    answer_text = call_hf_chat(
-                        model_name=hf_name,
-                        system_msg=system_msg,
-                        user_msg=user_msg,
-                        temperature=args.temperature,
-                        max_tokens=args.max_tokens,
-                    )
-                else:
-                    # Default: OpenAI
-                    answer_text = call_openai_chat(
-                        model=args.model,
-                        system_msg=system_msg,
-                        user_msg=user_msg,
-                        temperature=args.temperature,
-                        max_tokens=args.max_tokens,
-                    )
-            except Exception as e:
-                total_api_errors += 1
-                answer_text = f"[GENERATION_ERROR] {type(e).__name__}: {e}"
-
-            out_obj = {
-                "id": qa_id,
-                "qa_id": qa_id,
-                "persona": persona,
-                "question": question,
-                "rag_answer": answer_text,
-                "generator_model": args.model,
-                "retriever": retriever_name,
-                "topk_contexts": args.topk_contexts,
-                "retrieved": used_retrieved,
-                "contexts": contexts,
+            ctx = {
+                "pid": pid,
+                "text": p.get("text", ""),
+                "document_id": p.get("document_id"),
+                "passage_id": p.get("passage_id"),
             }
+            contexts.append(ctx)
+            used_retrieved.append(r)
+
+        system_msg, user_msg = build_prompt(question, contexts)
+        jobs.append({
+            "key": checkpoint_key(
+                qa_id, args.model, rec.get("retriever"), args.topk_contexts, system_msg, user_msg
+            ),
+            "qa_id": qa_id,
+            "persona": rec.get("persona"),  # Optional
+            "retriever": rec.get("retriever"),
+            "question": question,
+            "retrieved": used_retrieved,
+            "contexts": contexts,
+            "system_msg": system_msg,
+            "user_msg": user_msg,
+        })
+
+    # Resume from checkpoint
+    ckpt_path = args.checkpoint or args.out_jsonl + ".ckpt.jsonl"
+    if args.no_resume and os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    done = load_checkpoint(ckpt_path)
+    todo = [
+        job for job in jobs
+        if job["key"] not in done or is_error_answer(done[job["key"]].get("rag_answer"))
+    ]
+    n_reused = len(jobs) - len(todo)
+    n_retry = sum(1 for job in todo if job["key"] in done)
+    print(f"[INFO] Checkpoint {ckpt_path}: reusing {n_reused}, "
+          f"retrying {n_retry} error-tagged, generating {len(todo) - n_retry} new.")
+
+    def run_job(job: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        system_msg, user_msg = job["system_msg"], job["user_msg"]
+        n_tokens = estimate_tokens(system_msg, user_msg, max_tokens=args.max_tokens)
+
+        def attempt() -> str:
+            limiter.acquire(n_tokens)
+            return generate_answer(
+                provider=provider,
+                model=args.model,
+                system_msg=system_msg,
+                user_msg=user_msg,
+                temperature=args.temperature,
+                max_tokens=args.max_tokens,
+            )
 
+        failed = False
+        try:
+            answer_text = call_with_backoff(
+                attempt,
+                max_retries=args.max_retries,
+                retry_on_result=is_retryable_error,
+                label=provider.upper(),
+            )
+        except Exception as e:
+            failed = True
+            answer_text = f"[GENERATION_ERROR] {type(e).__name__}: {e}"
+
+        if args.sleep > 0.0:
+            time.sleep(args.sleep)
+
+        out_obj = {
+            "id": job["qa_id"],
+            "qa_id": job["qa_id"],
+            "persona": job["persona"],
+            "question": job["question"],
+            "rag_answer": answer_text,
+            "generator_model": args.model,
+            "retriever": job["retriever"],
+            "topk_contexts": args.topk_contexts,
+            "retrieved": job["retrieved"],
+            "contexts": job["contexts"],
+        }
+        return out_obj, failed
+
+    print(f"[INFO] Generating {len(todo)} answers with concurrency={concurrency}.")
+    with open(ckpt_path, "a", encoding="utf-8") as ckpt_f:
+        results = imap_ordered(run_job, todo, concurrency=concurrency)
+        for job, (out_obj, failed) in tqdm(
+            zip(todo, results), total=len(todo), desc="Generating answers"
+        ):
+            if failed:
+                total_api_errors += 1
+            done[job["key"]] = out_obj
+            ckpt_f.write(json.dumps({"key": job["key"], "record": out_obj}, ensure_ascii=False) + "\n")
+            ckpt_f.flush()
+            os.fsync(ckpt_f.fileno())
+
+    # Compact the checkpoint into the final output (input order, atomic rename)
+    tmp_path = args.out_jsonl + ".tmp"
+    n_error_tagged = 0
+    with open(tmp_path, "w", encoding="utf-8") as out_f:
+        for job in jobs:
+            out_obj = done[job["key"]]
+            if is_error_answer(out_obj.get("rag_answer")):
+                n_error_tagged += 1
             out_f.write(json.dumps(out_obj, ensure_ascii=False) + "\n")
-
-            if args.sleep > 0.0:
-                time.sleep(args.sleep)
+    os.replace(tmp_path, args.out_jsonl)
 
     print(f"[INFO] Wrote generated answers to: {args.out_jsonl}")
+    if n_error_tagged > 0:
+        print(f"[WARN] {n_error_tagged} answers still error-tagged; rerun to retry them.")
     if missing_passages > 0:
         print(f"[WARN] Missing passages for {missing_passages} retrieved pids.")
     if total_api_errors > 0:
@@ -27,6 +27,8 @@ from typing import Dict, Any, List
 
 import pytrec_eval
 
+from run_store import BinaryRun, is_binary_run
+
 
 def load_qrels_from_test_json(path: str) -> Dict[str, Dict[str, int]]:
     """
@@ -82,7 +84,8 @@ def load_qrels_from_test_json(path: str) -> Dict[str, Dict[str, int]]:
 
 def load_run_from_retrieval_json(path: str, k: int) -> Dict[str, Dict[str, float]]:
     """
-    Build a TREC-style run from the retrieval JSONL produced by rag_step1_retrieve.py.
+    Build a TREC-style run from the retrieval JSONL produced by rag_step1_retrieve.py
+    (or its .brun conversion, see run_store.py).
 
     Expected schema per line:
         {
@@ -98,6 +101,15 @@ def load_run_from_retrieval_json(path: str, k: int) -> Dict[str, Dict[str, float
     run: Dict[str, Dict[str, float]] = {}
     num_lines = 0
 
+    if is_binary_run(path):
+        for qid, pids, _, scores in BinaryRun.open(path).iter_queries():
+            num_lines += 1
+            docs = run.setdefault(qid, {})
+            for pid, score in zip(pids[:k], scores[:k]):
+                docs[pid] = max(docs[pid], score) if pid in docs else score
+        print(f"[INFO] Loaded binary run for {len(run)} queries from: {path}")
+        return run
+
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
             line = line.strip()
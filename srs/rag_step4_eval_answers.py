@@ -30,6 +30,8 @@ import re
 import statistics
 from typing import Dict, List, Tuple, Optional
 
+from llm_cache import add_cache_args, cached_chat, configure_from_args
+
 # Optional: OpenAI client for GPT-based judging
 try:
     from openai import OpenAI
@@ -370,16 +372,21 @@ def gpt_judge_one(
         return None, None
 
     prompt = build_gpt_judge_prompt(question, gold_answer, cand_answer)
-    try:
+    system_msg = "You are a strict, careful evaluation assistant."
+
+    def _call() -> str:
         resp = client.chat.completions.create(
             model=model,
             messages=[
-                {"role": "system", "content": "You are a strict, careful evaluation assistant."},
+                {"role": "system", "content": system_msg},
                 {"role": "user", "content": prompt},
             ],
             temperature=0.0,
         )
-        content = resp.choices[0].message.content
+        return resp.choices[0].message.content or ""
+
+    try:
+        content = cached_chat("openai", model, system_msg, prompt, 0.0, None, None, _call)
     except Exception as e:
         print(f"[WARN] GPT judge call failed: {e}")
         return None, None
@@ -463,7 +470,9 @@ def main():
         help="Maximum number of items to send to GPT judge (0 = no limit when --use-gpt-judge is set).",
     )
 
+    add_cache_args(parser)
     args = parser.parse_args()
+    configure_from_args(args)
 
     print(f"[INFO] Loading gold from: {args.gold_json}")
     print(f"[INFO] Loading predictions from: {args.pred_json}")
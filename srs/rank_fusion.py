@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/rank_fusion.py
+
+N-way weighted rank fusion shared by fuse_rrf.py and rag_step1_retrieve.py.
+
+Methods (each input run i has weight w_i and an optional rank cutoff):
+  rrf       sum_i w_i / (rrf_k + rank_i(d))
+  combsum   sum_i w_i * norm_i(score_i(d))
+  combmnz   combsum * (number of runs that retrieved d)
+
+norm (per query, per run): minmax (default), zscore, sum, none.
+
+Fused lists are sorted by score; ties keep the order in which documents
+first appear across the inputs (run 1 first, then run 2, ...), which is
+what the original two-way RRF produced.
+
+Runs are array-backed (ArrayRun): doc ids are interned to int32 in a
+shared DocVocab and scores / ranks are flat arrays with per-query offsets,
+so each query is fused with a handful of NumPy ops. fuse_runs() walks the
+sorted query ids of all runs as a k-way merge and yields one fused query
+at a time, so the output can be streamed to disk.
+
+Usage:
+    vocab = DocVocab()
+    runs = [ArrayRun.load(p, vocab) for p in paths]   # TREC or .brun
+    for qid, doc_ids, scores in fuse_runs(runs, method="rrf", k=100):
+        ...
+
+    fused = fuse_hits([bm25_hits, e5_hits], method="rrf", k=50)  # [(pid, score)]
+"""
+
+import heapq
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from run_store import BinaryRun, is_binary_run
+
+FUSION_METHODS = ("rrf", "combsum", "combmnz")
+NORM_METHODS = ("minmax", "zscore", "sum", "none")
+
+
+class DocVocab:
+    """Interns document ids to dense int32 ids shared by several runs."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def intern(self, docid: str) -> int:
+        i = self.ids.get(docid)
+        if i is None:
+            i = self.ids[docid] = len(self.names)
+            self.names.append(docid)
+        return i
+
+    def intern_many(self, docids: Sequence[str]) -> np.ndarray:
+        return np.fromiter((self.intern(d) for d in docids), dtype=np.int32, count=len(docids))
+
+
+class ArrayRun:
+    """
+    One ranked run as flat arrays: for query qids[j], rows
+    offsets[j]:offsets[j + 1] of doc_ids / scores in rank order.
+    """
+
+    def __init__(self, qids: List[str], offsets: np.ndarray, doc_ids: np.ndarray, scores: np.ndarray):
+        self.qids = qids
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.scores = scores
+        self.row_of: Dict[str, int] = {q: j for j, q in enumerate(qids)}
+
+    def get(self, qid: str) -> Tuple[np.ndarray, np.ndarray]:
+        j = self.row_of.get(qid)
+        if j is None:
+            return _EMPTY_IDS, _EMPTY_SCORES
+        lo, hi = self.offsets[j], self.offsets[j + 1]
+        return self.doc_ids[lo:hi], self.scores[lo:hi]
+
+    @classmethod
+    def from_trec(cls, path: str, vocab: DocVocab) -> "ArrayRun":
+        """Read a 6-column TREC run; each query's rows are put in rank order."""
+        blocks: Dict[str, List[Tuple[int, int, float]]] = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) != 6:
+                    continue
+                qid, _, docid, rank, score, _tag = parts
+                blocks.setdefault(qid, []).append((int(rank), vocab.intern(docid), float(score)))
+
+        qids = sorted(blocks)
+        offsets = np.zeros(len(qids) + 1, dtype=np.int64)
+        n = sum(len(rows) for rows in blocks.values())
+        doc_ids = np.empty(n, dtype=np.int32)
+        scores = np.empty(n, dtype=np.float32)
+        pos = 0
+        for j, qid in enumerate(qids):
+            rows = blocks.pop(qid)
+            rows.sort(key=lambda r: r[0])
+            doc_ids[pos : pos + len(rows)] = [r[1] for r in rows]
+            scores[pos : pos + len(rows)] = [r[2] for r in rows]
+            pos += len(rows)
+            offsets[j + 1] = pos
+        return cls(qids, offsets, doc_ids, scores)
+
+    @classmethod
+    def from_binary(cls, path: str, vocab: DocVocab) -> "ArrayRun":
+        """Array views of a .brun binary run (see run_store.py), remapped to `vocab`."""
+        brun = BinaryRun.open(path)
+        order = sorted(range(len(brun.qids)), key=brun.qids.__getitem__)
+        docs = np.asarray(brun.docs)[order]
+        ranks = np.asarray(brun.ranks)[order]
+        scores = np.asarray(brun.scores)[order]
+        valid = docs >= 0
+        # Rank order within each row; padding sorts last
+        by_rank = np.argsort(np.where(valid, ranks, np.iinfo(np.int32).max), axis=1, kind="stable")
+        docs = np.take_along_axis(docs, by_rank, axis=1)
+        scores = np.take_along_axis(scores, by_rank, axis=1)
+        valid = np.take_along_axis(valid, by_rank, axis=1)
+
+        remap = vocab.intern_many(brun.pids)
+        offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(valid.sum(axis=1), out=offsets[1:])
+        return cls(
+            [brun.qids[i] for i in order],
+            offsets,
+            remap[docs[valid]],
+            scores[valid].astype(np.float32),
+        )
+
+    @classmethod
+    def load(cls, path: str, vocab: DocVocab) -> "ArrayRun":
+        """A .brun binary run or a TREC text run."""
+        if is_binary_run(path):
+            return cls.from_binary(path, vocab)
+        return cls.from_trec(path, vocab)
+
+
+_EMPTY_IDS = np.empty(0, dtype=np.int32)
+_EMPTY_SCORES = np.empty(0, dtype=np.float32)
+
+
+def _normalize(scores: np.ndarray, norm: str) -> np.ndarray:
+    scores = scores.astype(np.float64, copy=False)
+    if norm == "none" or scores.size == 0:
+        return scores
+    if norm == "minmax":
+        lo, hi = scores.min(), scores.max()
+        return (scores - lo) / (hi - lo) if hi > lo else np.ones_like(scores)
+    if norm == "zscore":
+        std = scores.std()
+        return (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+    if norm == "sum":
+        total = scores.sum()
+        return scores / total if total != 0 else scores
+    raise ValueError(f"Unknown norm: {norm} (choose from {NORM_METHODS})")
+
+
+def fuse_arrays(
+    ranked: Sequence[Tuple[np.ndarray, np.ndarray]],
+    method: str = "rrf",
+    weights: Optional[Sequence[float]] = None,
+    depths: Optional[Sequence[Optional[int]]] = None,
+    rrf_k: float = 60,
+    norm: str = "minmax",
+    k: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse one query's ranked (doc_ids, scores) arrays from several runs.
+
+    `depths[i]` cuts run i to its top depths[i] rows before fusion (None =
+    all). Returns the fused (doc_ids, scores), best first, at most k rows.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method: {method} (choose from {FUSION_METHODS})")
+    n_runs = len(ranked)
+    weights = [1.0] * n_runs if weights is None else weights
+    depths = [None] * n_runs if depths is None else depths
+    if len(weights) != n_runs or len(depths) != n_runs:
+        raise ValueError("weights / depths must have one entry per run")
+
+    ids_parts, contrib_parts = [], []
+    for (ids, scores), w, depth in zip(ranked, weights, depths):
+        if depth is not None:
+            ids, scores = ids[:depth], scores[:depth]
+        if ids.size == 0:
+            continue
+        if method == "rrf":
+            contrib = w / (rrf_k + np.arange(1, ids.size + 1, dtype=np.float64))
+        else:
+            contrib = w * _normalize(scores, norm)
+        ids_parts.append(ids)
+        contrib_parts.append(contrib)
+    if not ids_parts:
+        return _EMPTY_IDS, np.empty(0, dtype=np.float64)
+
+    all_ids = np.concatenate(ids_parts)
+    uniq, first, inverse = np.unique(all_ids, return_index=True, return_inverse=True)
+    fused = np.bincount(inverse, weights=np.concatenate(contrib_parts), minlength=uniq.size)
+    if method == "combmnz":
+        fused *= np.bincount(inverse, minlength=uniq.size)
+
+    # Best score first; ties by first appearance across the runs
+    order = np.lexsort((first, -fused))
+    if k is not None:
+        order = order[:k]
+    return uniq[order], fused[order]
+
+
+def fuse_runs(
+    runs: Sequence[ArrayRun],
+    k: Optional[int] = None,
+    **fusion_kwargs,
+) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+    """Yield (qid, doc_ids, scores) per query over the union of all runs, in qid order."""
+    last = None
+    for qid in heapq.merge(*(run.qids for run in runs)):
+        if qid == last:
+            continue
+        last = qid
+        ids, scores = fuse_arrays([run.get(qid) for run in runs], k=k, **fusion_kwargs)
+        yield qid, ids, scores
+
+
+def fuse_hits(
+    hit_lists: Sequence[Sequence[Tuple[str, float]]],
+    k: Optional[int] = None,
+    **fusion_kwargs,
+) -> List[Tuple[str, float]]:
+    """fuse_arrays for one query's in-memory [(pid, score), ...] lists."""
+    vocab = DocVocab()
+    ranked = [
+        (vocab.intern_many([pid for pid, _ in hits]), np.asarray([s for _, s in hits], dtype=np.float64))
+        for hits in hit_lists
+    ]
+    ids, scores = fuse_arrays(ranked, k=k, **fusion_kwargs)
+    return [(vocab.names[i], float(s)) for i, s in zip(ids, scores)]
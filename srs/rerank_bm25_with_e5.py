@@ -2,24 +2,19 @@
 # rerank_bm25_with_e5.py
 # -*- coding: utf-8 -*-
 
-import argparse, json
+import argparse
 from collections import defaultdict
-from sentence_transformers import SentenceTransformer
 import numpy as np
 from tqdm import tqdm
 
+from corpus_registry import load_corpus
+from embedding_store import EmbeddingStore
+from encoder_backend import add_encoder_args, load_encoder_from_args, store_model_key
+from retrieval_service import RetrievalClient, add_server_arg, dense_settings
+
 def load_passages(path="data/passages.jsonl"):
-    pid2text = {}
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            row = json.loads(line)
-            pid = str(row["pid"])
-            text = str(row["text"])
-            pid2text[pid] = text
-    return pid2text
+    """pid -> text view of the shared corpus registry."""
+    return load_corpus(path).texts()
 
 def load_queries_tsv(path):
     qid2q = {}
@@ -58,8 +53,38 @@ def main():
                     help="BM25 top-k candidates to rerank")
     ap.add_argument("--k-output", type=int, default=100,
                     help="final top-k docs to output")
+    ap.add_argument("--query-prefix", default="",
+                    help="Prepended to every query (e5 expects 'query: ')")
+    ap.add_argument("--passage-prefix", default="",
+                    help="Prepended to every passage (e5 expects 'passage: ')")
+    ap.add_argument("--batch-size", type=int, default=64)
+    ap.add_argument("--emb-cache-dir", default="indexes/emb_cache",
+                    help="Persistent passage embedding store shared with the dense retrievers")
+    ap.add_argument("--emb-cache-dtype", default="float32", choices=["float32", "float16"])
+    ap.add_argument("--no-emb-cache", action="store_true",
+                    help="Encode candidate passages in memory; do not read or write the store")
+    add_encoder_args(ap)
+    add_server_arg(ap)
     args = ap.parse_args()
 
+    if args.server:
+        # The server reranks with its warm e5: its corpus, prefixes and encoder must match
+        client = RetrievalClient(args.server)
+        client.check(args.passages, dense={"e5": dense_settings(
+            args.model_name, args.query_prefix, args.passage_prefix, args, with_index=False)})
+        qid2q = load_queries_tsv(args.queries)
+        qid2cands = load_bm25_run(args.bm25, k_candidate=args.k_candidate)
+        qids = [qid for qid in sorted(qid2cands.keys()) if qid in qid2q]
+        print(f"[rerank] reranking {len(qids)} queries on {args.server}...")
+        hits = client.rerank([qid2q[q] for q in qids], [qid2cands[q] for q in qids], args.k_output)
+        client.report("rerank")
+        with open(args.output, "w", encoding="utf-8") as out:
+            for qid, row in zip(qids, hits):
+                for rank, (pid, score) in enumerate(row, start=1):
+                    out.write(f"{qid} Q0 {pid} {rank} {float(score):.6f} bm25_e5_rerank\n")
+        print("[rerank] done, wrote:", args.output)
+        return
+
     print("[rerank] loading passages...")
     pid2text = load_passages(args.passages)
 
@@ -69,33 +94,50 @@ def main():
     print("[rerank] loading BM25 run...")
     qid2cands = load_bm25_run(args.bm25, k_candidate=args.k_candidate)
 
-    print("[rerank] loading model:", args.model_name)
-    model = SentenceTransformer(args.model_name)
+    qids = [qid for qid in sorted(qid2cands.keys()) if qid in qid2q]
+    qid2cands = {qid: [pid for pid in qid2cands[qid] if pid in pid2text] for qid in qids}
+    qids = [qid for qid in qids if qid2cands[qid]]
 
-    qids = sorted(qid2cands.keys())
-    with open(args.output, "w", encoding="utf-8") as out:
-        for qid in tqdm(qids):
-            if qid not in qid2q:
-                continue
-            query = qid2q[qid]
-            cand_pids = [pid for pid in qid2cands[qid] if pid in pid2text]
-            if not cand_pids:
-                continue
-            cand_texts = [pid2text[pid] for pid in cand_pids]
+    # Every passage that is a candidate for at least one query, encoded once
+    cand_pids = sorted({pid for qid in qids for pid in qid2cands[qid]})
+    row_of = {pid: i for i, pid in enumerate(cand_pids)}
+    print(f"[rerank] {len(qids)} queries, {sum(len(c) for c in qid2cands.values())} candidates, "
+          f"{len(cand_pids)} unique passages")
+
+    print(f"[rerank] loading model: {args.model_name} ({args.encoder_backend})")
+    model = load_encoder_from_args(args.model_name, args)
 
-            # e5: query/passage prefix kullanmak istersen:
-            # q_emb = model.encode(["query: " + query], normalize_embeddings=True)[0]
-            # p_embs = model.encode(["passage: " + t for t in cand_texts], normalize_embeddings=True)
-            q_emb = model.encode([query], normalize_embeddings=True)[0]
-            p_embs = model.encode(cand_texts, normalize_embeddings=True)
+    def encode(texts):
+        return model.encode(
+            texts,
+            batch_size=args.batch_size,
+            show_progress_bar=len(texts) > args.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
 
-            scores = np.dot(p_embs, q_emb)
-            scored = list(zip(cand_pids, scores))
-            scored.sort(key=lambda x: x[1], reverse=True)
-            scored = scored[:args.k_output]
+    cand_texts = [pid2text[pid] for pid in cand_pids]
+    if args.no_emb_cache:
+        p_embs = encode([args.passage_prefix + t for t in cand_texts])
+    else:
+        store_key = store_model_key(args.model_name, args.encoder_backend, args.onnx_quant_config)
+        store = EmbeddingStore(args.emb_cache_dir, store_key, args.passage_prefix, dtype=args.emb_cache_dtype)
+        p_embs = store.get_or_encode(cand_pids, cand_texts, encode)
+    p_embs = np.asarray(p_embs, dtype=np.float32)
+
+    print(f"[rerank] encoding {len(qids)} queries...")
+    q_embs = np.asarray(encode([args.query_prefix + qid2q[qid] for qid in qids]), dtype=np.float32)
+
+    with open(args.output, "w", encoding="utf-8") as out:
+        for qi, qid in enumerate(tqdm(qids)):
+            pids = qid2cands[qid]
+            rows = np.fromiter((row_of[pid] for pid in pids), dtype=np.int64, count=len(pids))
+            scores = p_embs[rows] @ q_embs[qi]
+            # Stable sort: BM25 order breaks ties
+            order = np.argsort(-scores, kind="stable")[:args.k_output]
 
-            for rank, (pid, score) in enumerate(scored, start=1):
-                out.write(f"{qid} Q0 {pid} {rank} {float(score):.6f} bm25_e5_rerank\n")
+            for rank, i in enumerate(order, start=1):
+                out.write(f"{qid} Q0 {pids[i]} {rank} {float(scores[i]):.6f} bm25_e5_rerank\n")
 
     print("[rerank] done, wrote:", args.output)
 
@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/retrieval_service.py
+
+Long-lived retrieval server that keeps models and indexes warm.
+
+The server loads the passages once and builds each retriever from
+rag_step1_retrieve.py on first use (or at start-up with --preload), so
+SentenceTransformer weights, the JVM / Lucene searcher, passage embeddings
+and ANN indexes are paid for once per server, not once per command.
+
+Endpoints (JSON over HTTP, on 127.0.0.1:<port> or a Unix socket):
+
+  POST /search/<retriever>   {"queries": [...], "k": 50}
+        retriever: bm25, e5, bge, bm25_e5_rerank, hybrid_rrf_bm25_e5
+        -> {"hits": [[[pid, score], ...], ...], "latency_ms": ...}
+  POST /rerank               {"queries": [...], "candidates": [[pid, ...], ...], "k": 100}
+        e5 rerank of caller-supplied candidate lists (e.g. a BM25 run file)
+  GET  /health               loaded retrievers, passage count, corpus fingerprint,
+                             per dense model its prefixes / encoder backend / index
+                             kind, and the BM25 backend / parameters
+  GET  /metrics              per-endpoint request / query counts and latency
+                             (mean, p50, p95, max over the last 1000 requests)
+
+Start the server with the same retrieval flags as rag_step1_retrieve.py:
+
+  python srs/retrieval_service.py serve \
+    --passages data/passages_full.jsonl \
+    --bm25-index indexes/bm25_full \
+    --preload bm25,e5 \
+    --port 8765                      # or --socket /tmp/xrefrag-retrieval.sock
+
+Then point the CLIs at it with --server:
+
+  python srs/rag_step1_retrieve.py ... --server http://127.0.0.1:8765
+  python srs/run_dense_e5_sbert.py ... --server unix:///tmp/xrefrag-retrieval.sock
+  python srs/rerank_bm25_with_e5.py ... --server http://127.0.0.1:8765
+
+or inspect it with `python srs/retrieval_service.py metrics --server ...`.
+
+The clients check /health first (RetrievalClient.check) and refuse a server
+whose corpus (--passages file, by size and mtime) or retriever settings
+differ from their own flags, since its results would silently differ from
+the in-process run.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+DEFAULT_PORT = 8765
+LATENCY_WINDOW = 1000
+
+Hits = List[List[Tuple[str, float]]]
+
+
+# ------------------------------------------------------------------
+# Metrics
+# ------------------------------------------------------------------
+class LatencyStats:
+    """Thread-safe per-endpoint request / query counters and recent latencies."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._lat: Dict[str, deque] = {}
+        self._requests: Dict[str, int] = {}
+        self._queries: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, latency_s: float, n_queries: int, ok: bool = True) -> None:
+        with self._lock:
+            self._lat.setdefault(endpoint, deque(maxlen=self.window)).append(latency_s)
+            self._requests[endpoint] = self._requests.get(endpoint, 0) + 1
+            self._queries[endpoint] = self._queries.get(endpoint, 0) + n_queries
+            if not ok:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            out = {}
+            for endpoint, lat in self._lat.items():
+                xs = sorted(lat)
+                out[endpoint] = {
+                    "requests": self._requests[endpoint],
+                    "queries": self._queries[endpoint],
+                    "errors": self._errors.get(endpoint, 0),
+                    "mean_ms": round(1000 * sum(xs) / len(xs), 2),
+                    "p50_ms": round(1000 * xs[len(xs) // 2], 2),
+                    "p95_ms": round(1000 * xs[min(len(xs) - 1, int(0.95 * len(xs)))], 2),
+                    "max_ms": round(1000 * xs[-1], 2),
+                }
+            return out
+
+
+# ------------------------------------------------------------------
+# Settings reported by /health and checked by clients
+# ------------------------------------------------------------------
+def dense_settings(model_name: str, query_prefix: str, passage_prefix: str, args,
+                   with_index: bool = True) -> Dict[str, Any]:
+    """The /health "dense" entry of a retriever built with these settings."""
+    settings = {
+        "model": model_name,
+        "query_prefix": query_prefix,
+        "passage_prefix": passage_prefix,
+        "encoder_backend": args.encoder_backend,
+    }
+    if args.encoder_backend == "onnx-int8":
+        settings["onnx_quant_config"] = args.onnx_quant_config
+    if with_index:
+        settings["index"] = args.index
+    return settings
+
+
+def bm25_settings(args) -> Dict[str, Any]:
+    """The /health "bm25" entry for these BM25 flags (the Lucene index is not built from --passages)."""
+    settings = {"backend": args.bm25_backend, "k1": args.bm25_k1, "b": args.bm25_b}
+    if args.bm25_backend == "pyserini" and args.bm25_index:
+        settings["index"] = os.path.realpath(args.bm25_index)
+    return settings
+
+
+# ------------------------------------------------------------------
+# Warm retrievers
+# ------------------------------------------------------------------
+class RetrieverPool:
+    """
+    Lazily built, shared retrievers keyed by name.
+
+    Each retriever is built once under a lock and then guarded by its own
+    lock while searching, so concurrent requests never encode on the same
+    model at the same time.
+    """
+
+    def __init__(self, args):
+        # Imported here so the client side of this module needs no ML stack
+        import rag_step1_retrieve as r1
+        from corpus_registry import corpus_fingerprint
+
+        self.r1 = r1
+        self.args = args
+        self.passages = r1.load_passages(args.passages)
+        self.corpus = corpus_fingerprint(args.passages)
+        self._built: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._build_lock = threading.RLock()
+
+    def _build(self, name: str):
+        r1, args = self.r1, self.args
+        if name == "bm25":
+            if args.bm25_backend == "sparse":
+                return r1.SparseBM25Retriever(self.passages, args.bm25_sparse_index, k1=args.bm25_k1, b=args.bm25_b)
+            if not args.bm25_index:
+                raise ValueError("server was started without --bm25-index")
+            return r1.BM25Retriever(args.bm25_index, k1=args.bm25_k1, b=args.bm25_b, threads=args.bm25_threads)
+        if name in r1.DENSE_MODELS:
+            return r1.build_dense(self.passages, name, args)
+        if name == "bm25_e5_rerank":
+            return r1.BM25E5RerankRetriever(bm25=self.get("bm25"), dense=self.get("e5"))
+        if name == "e5_rerank":
+            # /rerank scores caller-supplied candidates, so no BM25 is needed
+            return r1.BM25E5RerankRetriever(bm25=None, dense=self.get("e5"))
+        if name == "hybrid_rrf_bm25_e5":
+            return r1.HybridRRFRetriever(bm25=self.get("bm25"), dense=self.get("e5"))
+        raise KeyError(name)
+
+    def get(self, name: str):
+        with self._build_lock:
+            if name not in self._built:
+                t0 = time.time()
+                print(f"[retrieval-service] loading {name}...")
+                self._built[name] = self._build(name)
+                self._locks[name] = threading.Lock()
+                print(f"[retrieval-service] {name} ready in {time.time() - t0:.1f}s")
+            return self._built[name]
+
+    def _locked(self, name: str):
+        self.get(name)
+        return self._locks[name]
+
+    def search(self, name: str, queries: List[str], k: int) -> Hits:
+        if name not in self.r1.RETRIEVER_NAMES:
+            raise KeyError(name)
+        retriever = self.get(name)
+        # Composites encode on e5 and search bm25, so take the base locks too
+        names = [name] if name in ("bm25", "e5", "bge") else ["bm25", "e5"]
+        locks = [self._locked(n) for n in names]
+        for lock in locks:
+            lock.acquire()
+        try:
+            if name == "bm25_e5_rerank":
+                # Same candidate depth as rag_step1_retrieve.py (BM25 top-k)
+                retriever.candidate_k = k
+            return retriever.retrieve_batch(queries, k)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def rerank(self, queries: List[str], candidates: List[List[str]], k: int) -> Hits:
+        e5 = self.get("e5")
+        reranker = self.get("e5_rerank")
+        with self._locked("e5"):
+            q_embs = e5.encode_queries(queries)
+        return reranker.rerank_batch([[(pid, 0.0) for pid in cands] for cands in candidates], q_embs, k)
+
+    def health(self) -> Dict[str, Any]:
+        models = {name: spec[0] for name, spec in self.r1.DENSE_MODELS.items()}
+        return {
+            "status": "ok",
+            "passages": self.args.passages,
+            "n_passages": len(self.passages),
+            "loaded": sorted(n for n in self._built if n in self.r1.RETRIEVER_NAMES),
+            "dense_models": models,
+            "bm25_backend": self.args.bm25_backend,
+            "encoder_backend": self.args.encoder_backend,
+            "corpus": self.corpus,
+            "dense": {name: dense_settings(*spec, self.args) for name, spec in self.r1.DENSE_MODELS.items()},
+            "bm25": bm25_settings(self.args),
+        }
+
+
+# ------------------------------------------------------------------
+# HTTP server
+# ------------------------------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "XRefRAGRetrieval/1.0"
+    pool: RetrieverPool = None
+    stats: LatencyStats = None
+
+    def log_message(self, fmt, *args):  # keep stdout for load / error lines
+        pass
+
+    def address_string(self):
+        # Unix-socket peers have no (host, port) tuple
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def _send(self, code: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, self.pool.health())
+        elif self.path == "/metrics":
+            self._send(200, self.stats.snapshot())
+        else:
+            self._send(404, {"error": f"unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        t0 = time.time()
+        endpoint = self.path.rstrip("/")
+        n_queries = 0
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            req = json.loads(self.rfile.read(length) or b"{}")
+            queries = [str(q) for q in req.get("queries", [])]
+            n_queries = len(queries)
+            k = int(req.get("k", 50))
+            if endpoint.startswith("/search/"):
+                hits = self.pool.search(endpoint[len("/search/"):], queries, k)
+            elif endpoint == "/rerank":
+                candidates = req.get("candidates", [])
+                if len(candidates) != len(queries):
+                    raise ValueError("'candidates' must have one list per query")
+                hits = self.pool.rerank(queries, candidates, k)
+            else:
+                self._send(404, {"error": f"unknown endpoint {self.path}"})
+                return
+        except KeyError as e:
+            self.stats.record(endpoint, time.time() - t0, n_queries, ok=False)
+            self._send(404, {"error": f"unknown retriever {e}"})
+            return
+        except Exception as e:
+            self.stats.record(endpoint, time.time() - t0, n_queries, ok=False)
+            print(f"[retrieval-service] {endpoint} failed: {e}", file=sys.stderr)
+            self._send(400 if isinstance(e, ValueError) else 500, {"error": str(e)})
+            return
+        latency = time.time() - t0
+        self.stats.record(endpoint, latency, n_queries)
+        self._send(200, {"hits": hits, "latency_ms": round(1000 * latency, 2)})
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+
+def serve(args) -> None:
+    pool = RetrieverPool(args)
+    for name in [n.strip() for n in (args.preload or "").split(",") if n.strip()]:
+        pool.get(name)
+
+    handler = type("Handler", (_Handler,), {"pool": pool, "stats": LatencyStats()})
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        httpd = _UnixHTTPServer(args.socket, handler)
+        where = f"unix://{args.socket}"
+    else:
+        httpd = ThreadingHTTPServer((args.host, args.port), handler)
+        where = f"http://{args.host}:{args.port}"
+    print(f"[retrieval-service] serving {len(pool.passages)} passages on {where}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+# ------------------------------------------------------------------
+# Client
+# ------------------------------------------------------------------
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class RetrievalClient:
+    """
+    Thin client for a running retrieval server.
+
+    `server` is http://host:port or unix:///path/to.sock. Large query lists
+    are sent in chunks of `batch_size`; each response's server-side latency
+    is kept in `self.latencies_ms`.
+    """
+
+    def __init__(self, server: str, timeout: float = 3600.0, batch_size: int = 1024):
+        self.server = server
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.latencies_ms: List[float] = []
+        url = urlparse(server)
+        if url.scheme == "unix":
+            self._conn = lambda: _UnixHTTPConnection(url.path, timeout)
+        elif url.scheme == "http":
+            self._conn = lambda: http.client.HTTPConnection(url.hostname, url.port or DEFAULT_PORT, timeout=timeout)
+        else:
+            raise ValueError(f"unsupported retrieval server address: {server} (use http://host:port or unix:///path)")
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        conn = self._conn()
+        try:
+            body = json.dumps(payload).encode("utf-8") if payload is not None else None
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = json.loads(resp.read() or b"{}")
+        finally:
+            conn.close()
+        if resp.status != 200:
+            raise RuntimeError(f"retrieval server {method} {path} -> {resp.status}: {data.get('error')}")
+        return data
+
+    def _post_chunks(self, path: str, queries: List[str], k: int, extra: Optional[List[Any]] = None) -> Hits:
+        hits: Hits = []
+        for start in range(0, len(queries), self.batch_size):
+            payload = {"queries": queries[start : start + self.batch_size], "k": k}
+            if extra is not None:
+                payload["candidates"] = extra[start : start + self.batch_size]
+            data = self._request("POST", path, payload)
+            self.latencies_ms.append(data.get("latency_ms", 0.0))
+            hits.extend([(pid, float(score)) for pid, score in row] for row in data["hits"])
+        return hits
+
+    def health(self) -> Dict[str, Any]:
+        return self._request("GET", "/health")
+
+    def metrics(self) -> Dict[str, Any]:
+        return self._request("GET", "/metrics")
+
+    def search(self, retriever: str, queries: List[str], k: int) -> Hits:
+        return self._post_chunks(f"/search/{retriever}", queries, k)
+
+    def rerank(self, queries: List[str], candidates: List[List[str]], k: int) -> Hits:
+        return self._post_chunks("/rerank", queries, k, extra=candidates)
+
+    def check(
+        self,
+        passages: Optional[str] = None,
+        dense: Optional[Dict[str, Dict[str, Any]]] = None,
+        bm25: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Raise ValueError unless the server was started on the same `passages`
+        file and its retrievers match the expected settings: `dense` maps a
+        served dense retriever name to its dense_settings(), `bm25` is a
+        bm25_settings(). Returns /health.
+        """
+        health = self.health()
+        problems = []
+        if passages is not None:
+            from corpus_registry import corpus_fingerprint
+
+            local = corpus_fingerprint(passages)
+            if health.get("corpus") != local:
+                problems.append(f"corpus: server {health.get('corpus')}, local {local}")
+        for name, expected in (dense or {}).items():
+            served = (health.get("dense") or {}).get(name)
+            if served is None:
+                problems.append(f"{name}: not served")
+                continue
+            problems.extend(f"{name} {key}: server {served.get(key)!r}, local {value!r}"
+                            for key, value in expected.items() if served.get(key) != value)
+        served_bm25 = health.get("bm25") or {}
+        problems.extend(f"bm25 {key}: server {served_bm25.get(key)!r}, local {value!r}"
+                        for key, value in (bm25 or {}).items() if served_bm25.get(key) != value)
+        if problems:
+            raise ValueError(f"server {self.server} does not match this run ({'; '.join(problems)}); "
+                             f"restart it with the same flags or drop --server")
+        return health
+
+    def dense_retriever_for(self, model_name: str) -> str:
+        """Name of the server's dense retriever running `model_name` (e.g. "e5")."""
+        served = self.health().get("dense_models", {})
+        for name, served_model in served.items():
+            if served_model == model_name:
+                return name
+        raise ValueError(f"server {self.server} does not serve {model_name} (serves {served})")
+
+    def report(self, tag: str) -> None:
+        if self.latencies_ms:
+            total = sum(self.latencies_ms)
+            print(f"[{tag}] server: {len(self.latencies_ms)} request(s), {total:.0f} ms total, "
+                  f"max {max(self.latencies_ms):.0f} ms")
+
+
+def add_server_arg(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument(
+        "--server",
+        default=None,
+        help="Use a running retrieval server (http://host:port or unix:///path.sock) "
+             "instead of loading models/indexes in this process; see srs/retrieval_service.py",
+    )
+
+
+# ------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Resident retrieval server with warm models and indexes.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("serve", help="Start the server")
+    s.add_argument("--passages", required=True, help="Path to passages_full.jsonl")
+    where = s.add_mutually_exclusive_group()
+    where.add_argument("--port", type=int, default=DEFAULT_PORT)
+    where.add_argument("--socket", default=None, help="Serve on this Unix socket instead of TCP")
+    s.add_argument("--host", default="127.0.0.1")
+    s.add_argument("--preload", default="", help="Comma-separated retrievers to load at start-up, e.g. 'bm25,e5'")
+    s.add_argument("--bm25-index", default=None)
+    s.add_argument("--bm25-backend", default="pyserini", choices=["pyserini", "sparse"])
+    s.add_argument("--bm25-sparse-index", default="indexes/bm25_sparse.npz",
+                   help="--bm25-backend sparse: .npz index built from --passages if missing or stale")
+    s.add_argument("--bm25-k1", type=float, default=0.9)
+    s.add_argument("--bm25-b", type=float, default=0.4)
+    s.add_argument("--bm25-threads", type=int, default=os.cpu_count() or 1)
+    s.add_argument("--emb-cache-dir", default="indexes/emb_cache")
+    s.add_argument("--emb-cache-dtype", default="float32", choices=["float32", "float16"])
+    s.add_argument("--no-emb-cache", action="store_true")
+    from ann_index import add_index_args
+    from encoder_backend import add_encoder_args
+
+    add_index_args(s)
+    add_encoder_args(s)
+
+    for name in ("health", "metrics"):
+        p = sub.add_parser(name, help=f"Print the server's /{name}")
+        p.add_argument("--server", default=f"http://127.0.0.1:{DEFAULT_PORT}")
+
+    args = ap.parse_args()
+    if args.cmd == "serve":
+        serve(args)
+        return
+    client = RetrievalClient(args.server)
+    print(json.dumps(client.health() if args.cmd == "health" else client.metrics(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
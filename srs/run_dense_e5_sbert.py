@@ -2,24 +2,19 @@
 # run_dense_e5_sbert.py
 # -*- coding: utf-8 -*-
 
-import argparse, json
+import argparse
 from collections import defaultdict
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
+from ann_index import add_index_args, index_params_from_args, load_or_build_index
+from corpus_registry import load_corpus
+from encoder_backend import add_encoder_args, load_encoder_from_args, store_model_key
+from retrieval_service import RetrievalClient, add_server_arg, dense_settings
+
 def load_passages(path="data/passages.jsonl"):
-    pids, texts = [], []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            row = json.loads(line)
-            pids.append(str(row["pid"]))
-            texts.append(str(row["text"]))
-    return pids, texts
+    corpus = load_corpus(path)
+    return corpus.pids, [corpus.text(i) for i in range(len(corpus))]
 
 def load_queries(path):
     qids, queries = [], []
@@ -40,33 +35,61 @@ def main():
     ap.add_argument("--output", required=True)
     ap.add_argument("--k", type=int, default=100)
     ap.add_argument("--model-name", default="intfloat/e5-base-v2")
+    ap.add_argument("--query-prefix", default="",
+                    help="Prepended to every query (e5 expects 'query: '; --server requires the server's)")
+    ap.add_argument("--passage-prefix", default="",
+                    help="Prepended to every passage (e5 expects 'passage: '; --server requires the server's)")
+    add_index_args(ap)
+    add_encoder_args(ap)
+    add_server_arg(ap)
     args = ap.parse_args()
 
+    if args.server:
+        # Only use a server whose corpus, prefixes, encoder and index match this run
+        client = RetrievalClient(args.server)
+        retriever = client.dense_retriever_for(args.model_name)
+        client.check(args.passages, dense={retriever: dense_settings(
+            args.model_name, args.query_prefix, args.passage_prefix, args)})
+        print("[e5] loading queries:", args.queries)
+        qids, qtexts = load_queries(args.queries)
+        print(f"[e5] searching {len(qids)} queries on {args.server} ({retriever})...")
+        hits = client.search(retriever, qtexts, args.k)
+        client.report("e5")
+        print("[e5] writing run to", args.output)
+        with open(args.output, "w", encoding="utf-8") as out:
+            for qid, row in zip(qids, hits):
+                for rank, (pid, score) in enumerate(row, start=1):
+                    out.write(f"{qid} Q0 {pid} {rank} {float(score):.6f} e5\n")
+        print("[e5] done.")
+        return
+
     print("[e5] loading passages...")
     pids, ptexts = load_passages(args.passages)
 
-    print("[e5] loading model:", args.model_name)
-    model = SentenceTransformer(args.model_name)
+    print(f"[e5] loading model: {args.model_name} ({args.encoder_backend})")
+    model = load_encoder_from_args(args.model_name, args)
 
     # Passage embeddings
     print("[e5] encoding passages...")
     p_embs = model.encode(
-        ptexts,
+        [args.passage_prefix + t for t in ptexts],
         batch_size=32,
         show_progress_bar=True,
         normalize_embeddings=True,
     )
     p_embs = np.asarray(p_embs, dtype="float32")
-    dim = p_embs.shape[1]
 
-    index = faiss.IndexFlatIP(dim)
-    index.add(p_embs)
+    print(f"[e5] building {args.index} index...")
+    index = load_or_build_index(
+        p_embs, args.index, index_params_from_args(args), args.index_dir,
+        store_model_key(args.model_name, args.encoder_backend, args.onnx_quant_config),
+    )
 
     print("[e5] loading queries:", args.queries)
     qids, qtexts = load_queries(args.queries)
     print("[e5] encoding queries...")
     q_embs = model.encode(
-        qtexts,
+        [args.query_prefix + q for q in qtexts],
         batch_size=32,
         show_progress_bar=True,
         normalize_embeddings=True,
@@ -80,6 +103,8 @@ def main():
     with open(args.output, "w", encoding="utf-8") as out:
         for qi, qid in enumerate(qids):
             for rank, (doc_idx, score) in enumerate(zip(I[qi], D[qi]), start=1):
+                if doc_idx < 0:
+                    continue
                 pid = pids[doc_idx]
                 out.write(f"{qid} Q0 {pid} {rank} {float(score):.6f} e5\n")
 
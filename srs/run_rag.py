@@ -29,6 +29,10 @@ import sys
 import time
 from collections import defaultdict
 
+from corpus_registry import load_corpus
+from llm_cache import add_cache_args, cached_chat, configure_from_args
+from run_store import BinaryRun, is_binary_run
+
 try:
     from openai import OpenAI
 except ImportError:
@@ -40,45 +44,30 @@ except ImportError:
 # -----------------------------
 
 def load_passages(path):
-    """pid -> passage dict."""
-    pid2passage = {}
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-            except Exception:
-                continue
-            pid = str(obj.get("pid") or obj.get("id") or "").strip()
-            if not pid:
-                continue
-            pid2passage[pid] = {
-                "pid": pid,
-                "text": obj.get("text") or obj.get("contents") or "",
-                "document_id": obj.get("document_id"),
-                "passage_id": obj.get("passage_id"),
-            }
-    return pid2passage
+    """pid -> passage dict (lazy view of the shared corpus registry)."""
+    return load_corpus(path).records()
 
 
 def load_runfile(path, k):
     """
-    TREC run file -> qid -> [pid,...] (top-k, deduped).
+    TREC run file (or .brun binary run) -> qid -> [pid,...] (top-k, deduped).
     """
     tmp = defaultdict(list)  # qid -> [(rank, pid)]
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) < 6:
-                continue
-            qid, _, pid, rank_str, score, tag = parts
-            try:
-                rank = int(rank_str)
-            except ValueError:
-                rank = 0
-            tmp[qid].append((rank, pid))
+    if is_binary_run(path):
+        for qid, pids, ranks, _ in BinaryRun.open(path).iter_queries():
+            tmp[qid].extend(zip(ranks, pids))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.strip().split()
+                if len(parts) < 6:
+                    continue
+                qid, _, pid, rank_str, score, tag = parts
+                try:
+                    rank = int(rank_str)
+                except ValueError:
+                    rank = 0
+                tmp[qid].append((rank, pid))
 
     runs = {}
     for qid, items in tmp.items():
@@ -156,26 +145,29 @@ def call_openai_chat(model_name, system_msg, user_msg,
     Thin wrapper around OpenAI chat completion.
     Requires OPENAI_API_KEY in your environment and `pip install openai`.
     """
-    if OpenAI is None:
-        raise RuntimeError(
-            "openai client not installed. Run `pip install openai` or adjust the code."
+    def _call():
+        if OpenAI is None:
+            raise RuntimeError(
+                "openai client not installed. Run `pip install openai` or adjust the code."
+            )
+        client = OpenAI()
+        extra = {}
+        if seed is not None:
+            extra["seed"] = seed
+
+        resp = client.chat.completions.create(
+            model=model_name,
+            messages=[
+                {"role": "system", "content": system_msg},
+                {"role": "user", "content": user_msg},
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **extra,
         )
-    client = OpenAI()
-    extra = {}
-    if seed is not None:
-        extra["seed"] = seed
-
-    resp = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {"role": "system", "content": system_msg},
-            {"role": "user", "content": user_msg},
-        ],
-        max_tokens=max_tokens,
-        temperature=temperature,
-        **extra,
-    )
-    return (resp.choices[0].message.content or "").strip()
+        return (resp.choices[0].message.content or "").strip()
+
+    return cached_chat("openai", model_name, system_msg, user_msg, temperature, seed, max_tokens, _call)
 
 
 def build_prompt(question, contexts):
@@ -310,7 +302,9 @@ def main():
         default=None,
         help="Optional seed for deterministic-ish decoding.",
     )
+    add_cache_args(ap)
     args = ap.parse_args()
+    configure_from_args(args)
 
     print(f"[info] mode: {args.mode}")
     print(f"[info] loading passages from: {args.passages}")
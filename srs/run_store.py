@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+srs/run_store.py
+
+Compact binary run format ("binary run directory", by convention *.brun):
+
+  <run>.brun/
+      docs.npy     # (n_queries, K) int32 index into pids.json, -1 = padding
+      scores.npy   # (n_queries, K) float32 (float64 if float32 would not be exact)
+      ranks.npy    # (n_queries, K) int32 rank as written in the source run
+      qids.json    # row -> qid
+      pids.json    # doc index -> pid (interned once per run)
+      run.json     # {"format": "xrefrag-binary-run", "version": 1, "k": K,
+                   #  "source": "trec" | "retrieval_jsonl", "tag": ...,
+                   #  "retriever": ..., "questions": [...]}
+
+K is the deepest query in the run; rows are in rank order. The .npy files
+are opened memory-mapped, so loading a run costs two small JSON reads.
+
+Conversions are lossless: TREC -> binary -> TREC reproduces the same
+lines (scores are written with 6 decimals like every run writer in srs/),
+and retrieval JSONL (rag_step1_retrieve.py) -> binary -> JSONL reproduces
+the same records. With --score-dtype auto (default) scores are stored as
+float32 unless that would change a written value, then as float64.
+
+Every run loader in srs/ accepts a .brun directory wherever it accepts a
+TREC run or retrieval JSONL.
+
+  python srs/run_store.py convert runs_full/kept/bm25.txt runs_full/kept/bm25.brun
+  python srs/run_store.py convert outputs/rag/DPEL_test_e5_retrieval.jsonl outputs/rag/DPEL_test_e5.brun
+  python srs/run_store.py convert runs_full/kept/bm25.brun runs_full/kept/bm25.txt
+  python srs/run_store.py convert outputs/rag/DPEL_test_e5.brun out.jsonl   # -> retrieval JSONL
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+FORMAT_NAME = "xrefrag-binary-run"
+FORMAT_VERSION = 1
+META_FILE = "run.json"
+SCORE_DTYPES = ("auto", "float32", "float64")
+
+
+def is_binary_run(path: str) -> bool:
+    return os.path.isdir(path) and os.path.isfile(os.path.join(path, META_FILE))
+
+
+def _fmt6(x: float) -> str:
+    return f"{x:.6f}"
+
+
+class BinaryRun:
+    """Fixed-k matrices of doc indices / scores / ranks for one run."""
+
+    def __init__(
+        self,
+        qids: List[str],
+        pids: List[str],
+        docs: np.ndarray,
+        scores: np.ndarray,
+        ranks: np.ndarray,
+        meta: Optional[Dict] = None,
+    ):
+        self.qids = qids
+        self.pids = pids
+        self.docs = docs
+        self.scores = scores
+        self.ranks = ranks
+        self.meta = meta or {}
+        self.row_of: Dict[str, int] = {q: i for i, q in enumerate(qids)}
+        self.lengths = (docs >= 0).sum(axis=1) if docs.size else np.zeros(len(qids), dtype=np.int64)
+
+    # ------------------------------------------------------------------
+    # Access
+    # ------------------------------------------------------------------
+    def query(self, row: int) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """(pids, ranks, scores) of one row, in stored (rank) order."""
+        n = int(self.lengths[row])
+        pids = self.pids
+        return [pids[d] for d in self.docs[row, :n].tolist()], self.ranks[row, :n], self.scores[row, :n]
+
+    def iter_queries(self) -> Iterator[Tuple[str, List[str], List[int], List[float]]]:
+        """Yield (qid, pids, ranks, scores) per query as plain Python lists."""
+        for row, qid in enumerate(self.qids):
+            pids, ranks, scores = self.query(row)
+            yield qid, pids, ranks.tolist(), scores.tolist()
+
+    # ------------------------------------------------------------------
+    # Build / persistence
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Dict[str, List[Tuple[str, int, float]]],
+        meta: Optional[Dict] = None,
+        score_dtype: str = "auto",
+        exact=None,
+    ) -> "BinaryRun":
+        """
+        `rows`: qid -> [(pid, rank, score), ...] in the order to store.
+
+        `exact(scores64, scores32) -> bool` decides whether float32 keeps the
+        scores lossless under score_dtype="auto" (default: bit-exact).
+        """
+        qids = list(rows)
+        k = max((len(r) for r in rows.values()), default=0)
+        pid_id: Dict[str, int] = {}
+        docs = np.full((len(qids), k), -1, dtype=np.int32)
+        ranks = np.zeros((len(qids), k), dtype=np.int32)
+        scores = np.zeros((len(qids), k), dtype=np.float64)
+        for i, qid in enumerate(qids):
+            r = rows[qid]
+            n = len(r)
+            docs[i, :n] = [pid_id.setdefault(pid, len(pid_id)) for pid, _, _ in r]
+            ranks[i, :n] = [rank for _, rank, _ in r]
+            scores[i, :n] = [score for _, _, score in r]
+
+        if score_dtype not in SCORE_DTYPES:
+            raise ValueError(f"score_dtype must be one of {SCORE_DTYPES}")
+        if score_dtype == "auto":
+            s32 = scores.astype(np.float32)
+            mask = docs >= 0
+            if exact is None:
+                ok = np.array_equal(s32[mask].astype(np.float64), scores[mask])
+            else:
+                ok = exact(scores[mask], s32[mask])
+            score_dtype = "float32" if ok else "float64"
+        pids = [""] * len(pid_id)
+        for pid, j in pid_id.items():
+            pids[j] = pid
+        return cls(qids, pids, docs, scores.astype(score_dtype), ranks, meta)
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "docs.npy"), np.ascontiguousarray(self.docs))
+        np.save(os.path.join(path, "scores.npy"), np.ascontiguousarray(self.scores))
+        np.save(os.path.join(path, "ranks.npy"), np.ascontiguousarray(self.ranks))
+        with open(os.path.join(path, "qids.json"), "w", encoding="utf-8") as f:
+            json.dump(self.qids, f)
+        with open(os.path.join(path, "pids.json"), "w", encoding="utf-8") as f:
+            json.dump(self.pids, f)
+        meta = dict(self.meta, format=FORMAT_NAME, version=FORMAT_VERSION, k=int(self.docs.shape[1]))
+        # Written last: a half-written directory is not recognized as a run
+        tmp = os.path.join(path, f"{META_FILE}.tmp{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, META_FILE))
+
+    @classmethod
+    def open(cls, path: str) -> "BinaryRun":
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_NAME or meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a {FORMAT_NAME} v{FORMAT_VERSION} directory")
+        with open(os.path.join(path, "qids.json"), "r", encoding="utf-8") as f:
+            qids = json.load(f)
+        with open(os.path.join(path, "pids.json"), "r", encoding="utf-8") as f:
+            pids = json.load(f)
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        return cls(qids, pids, load("docs.npy"), load("scores.npy"), load("ranks.npy"), meta)
+
+    # ------------------------------------------------------------------
+    # TREC
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_trec(cls, path: str, score_dtype: str = "auto") -> "BinaryRun":
+        """6-column TREC run; line order within each query is kept."""
+        rows: Dict[str, List[Tuple[str, int, float]]] = {}
+        tags = set()
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 6:
+                    continue
+                qid, _, docid, rank, score, tag = parts[:6]
+                rows.setdefault(qid, []).append((docid, int(rank), float(score)))
+                tags.add(tag)
+        meta = {"source": "trec", "tag": sorted(tags)[0] if len(tags) == 1 else None}
+        # TREC scores are compared as written (6 decimals)
+        exact = lambda s64, s32: all(
+            _fmt6(a) == _fmt6(b) for a, b in zip(s64.tolist(), s32.astype(np.float64).tolist())
+        )
+        return cls.from_rows(rows, meta, score_dtype, exact=exact)
+
+    def write_trec(self, path: str, tag: Optional[str] = None) -> None:
+        tag = tag or self.meta.get("tag") or "run"
+        with open(path, "w", encoding="utf-8") as out:
+            for qid, pids, ranks, scores in self.iter_queries():
+                out.write("".join(
+                    f"{qid} Q0 {pid} {rank} {score:.6f} {tag}\n"
+                    for pid, rank, score in zip(pids, ranks, scores)
+                ))
+
+    # ------------------------------------------------------------------
+    # Retrieval JSONL (rag_step1_retrieve.py)
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_retrieval_jsonl(cls, path: str, score_dtype: str = "auto") -> "BinaryRun":
+        rows: Dict[str, List[Tuple[str, int, float]]] = {}
+        questions: List[str] = []
+        retrievers = set()
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                obj = json.loads(line)
+                qid = str(obj["qa_id"])
+                if qid in rows:
+                    raise ValueError(f"{path}: duplicate qa_id {qid}")
+                rows[qid] = [(str(r["pid"]), int(r["rank"]), float(r["score"])) for r in obj.get("retrieved", [])]
+                questions.append(obj.get("question", ""))
+                retrievers.add(obj.get("retriever"))
+        meta = {
+            "source": "retrieval_jsonl",
+            "retriever": sorted(retrievers)[0] if len(retrievers) == 1 else None,
+            "questions": questions,
+        }
+        return cls.from_rows(rows, meta, score_dtype)
+
+    def write_retrieval_jsonl(self, path: str, retriever: Optional[str] = None) -> None:
+        retriever = retriever or self.meta.get("retriever") or self.meta.get("tag") or ""
+        questions = self.meta.get("questions") or [""] * len(self.qids)
+        with open(path, "w", encoding="utf-8") as out:
+            for (qid, pids, ranks, scores), question in zip(self.iter_queries(), questions):
+                record = {
+                    "qa_id": qid,
+                    "retriever": retriever,
+                    "question": question,
+                    "retrieved": [
+                        {"pid": pid, "rank": rank, "score": score}
+                        for pid, rank, score in zip(pids, ranks, scores)
+                    ],
+                }
+                out.write(json.dumps(record) + "\n")
+
+
+def _looks_like_jsonl(path: str) -> bool:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                return line.lstrip().startswith("{")
+    return False
+
+
+def load_binary_or_text(path: str, score_dtype: str = "auto") -> BinaryRun:
+    """Open a .brun directory, or convert a TREC run / retrieval JSONL in memory."""
+    if is_binary_run(path):
+        return BinaryRun.open(path)
+    if _looks_like_jsonl(path):
+        return BinaryRun.from_retrieval_jsonl(path, score_dtype)
+    return BinaryRun.from_trec(path, score_dtype)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert runs between TREC / retrieval JSONL and the binary format.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("convert", help="text -> .brun, or .brun -> TREC (.jsonl output -> retrieval JSONL)")
+    c.add_argument("src")
+    c.add_argument("dst")
+    c.add_argument("--score-dtype", default="auto", choices=SCORE_DTYPES)
+    c.add_argument("--tag", default=None, help="TREC tag / JSONL retriever name when writing text")
+    args = ap.parse_args()
+
+    t0 = time.time()
+    if is_binary_run(args.src):
+        run = BinaryRun.open(args.src)
+        if args.dst.endswith(".jsonl"):
+            run.write_retrieval_jsonl(args.dst, retriever=args.tag)
+        else:
+            run.write_trec(args.dst, tag=args.tag)
+    else:
+        run = load_binary_or_text(args.src, args.score_dtype)
+        run.save(args.dst)
+    print(f"[run-store] {args.src} -> {args.dst}: {len(run.qids)} queries, k={run.docs.shape[1]}, "
+          f"{len(run.pids)} docs, scores {run.scores.dtype} ({time.time() - t0:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ import random
 from pathlib import Path
 
 # Run as: python srs/sample_for_ADGM_spot_check.py  from repo root
+from corpus_registry import load_corpus
 from doc_manifest import DOCUMENTS
 
 # ------------------------------------------------------
@@ -56,31 +57,18 @@ def build_doc_title_index():
 
 def build_passage_index(passages_path: Path):
     """
-    Build index: pid -> {
+    Build index (a view of the shared corpus registry): pid -> {
         'document_id': int,
         'passage_id': str,
+        ...
     }
     where:
       - pid is the internal UUID used in QA generation
       - passage_id is the human-readable ID (e.g. '2.1.3.Guidance.1')
     """
-    idx = {}
     if not passages_path.exists():
         raise FileNotFoundError(f"passages_full.jsonl not found at: {passages_path}")
-    with passages_path.open("r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            rec = json.loads(line)
-            pid = rec.get("pid")
-            if not pid:
-                continue
-            idx[pid] = {
-                "document_id": rec.get("document_id"),
-                "passage_id": rec.get("passage_id"),
-            }
-    return idx
+    return load_corpus(str(passages_path)).records()
 
 
 # ------------------------------------------------------